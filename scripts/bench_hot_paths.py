@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""microbenchmarks of the pure-Python work done for every asset, with saved baselines
+
+Records come from scripts/fake_icloud.py, shaped like tests/vcr_cassettes. Timings are the
+best of several rounds, in microseconds per asset (per page for the listing query).
+
+    python scripts/bench_hot_paths.py --save baseline.json
+    python scripts/bench_hot_paths.py --compare baseline.json --threshold 0.15
+
+Baselines are only comparable on the same machine and Python version, and a busy or virtual
+machine easily adds 20% noise. With --compare, exits with 1 when a benchmark got slower than
+the baseline by more than the threshold.
+"""
+
+import argparse
+import base64
+import gc
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from foundation.core import compose
+from icloudpd.base import lp_filename_concatinator
+from icloudpd.paths import asset_download_dir, clean_filename, remove_unicode_chars
+from icloudpd.string_helpers import truncate_middle
+from pyicloud_ipd.file_match import FileMatchPolicy
+from pyicloud_ipd.raw_policy import RawTreatmentPolicy
+from pyicloud_ipd.services.photos import PhotoAlbum, PhotoAsset, PhotosService
+from pyicloud_ipd.utils import disambiguate_filenames
+from pyicloud_ipd.version_size import AssetVersionSize
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_icloud  # noqa: E402
+
+# every fourth filename needs cleaning, as names from other devices and apps do
+ODD_FILENAMES = ["Café au lait.JPG", "Screenshot 2024-06-01 at 10:15:00.PNG", "夏日 <1>.JPG"]
+PAGE_SIZE = 100
+FOLDER_STRUCTURE = "{:%Y/%m/%d}"
+DOWNLOAD_DIR = "/srv/photos/icloud/library/family archive/camera uploads"
+
+
+class CannedPage:
+    """Listing response with an already decoded body"""
+
+    def __init__(self, body: Dict[str, Any]) -> None:
+        self.body = body
+
+    def json(self) -> Dict[str, Any]:
+        return self.body
+
+
+class CannedAlbum(PhotoAlbum):
+    """Album listing pre-generated pages instead of querying iCloud"""
+
+    def __init__(self, service: PhotosService, pages: Dict[int, Dict[str, Any]]) -> None:
+        super().__init__(
+            service,
+            "All Photos",
+            fake_icloud.ALL_PHOTOS,
+            "CPLAssetByAssetDateWithoutHiddenOrDeleted",
+            "ASCENDING",
+            page_size=PAGE_SIZE,
+        )
+        self.pages = pages
+
+    def photos_request(self, offset: int) -> Any:
+        return CannedPage(self.pages.get(offset, {"records": []}))
+
+
+def library(assets: int) -> Tuple[PhotosService, Dict[int, Dict[str, Any]]]:
+    """Service as built for a default run and the listing pages of a synthetic library"""
+    service = PhotosService(
+        "https://p00-ckdatabasews.icloud.com:443",
+        None,  # type: ignore[arg-type]
+        {},
+        compose(remove_unicode_chars, clean_filename),
+        lp_filename_concatinator,
+        RawTreatmentPolicy.AS_IS,
+        FileMatchPolicy.NAME_SIZE_DEDUP_WITH_SUFFIX,
+    )
+    shape = fake_icloud.LibraryShape(assets=assets)
+    pages: Dict[int, Dict[str, Any]] = {}
+    for offset in range(0, assets, PAGE_SIZE):
+        query = {
+            "query": {"filterBy": [{"fieldName": "startRank", "fieldValue": {"value": offset}}]},
+            "resultsLimit": PAGE_SIZE * 2,
+        }
+        page = fake_icloud.page("https://cvws.icloud-content.com/", shape, query)
+        for record in page["records"][::8]:
+            if record["recordType"] == "CPLMaster":
+                name = ODD_FILENAMES[len(pages) % len(ODD_FILENAMES)]
+                record["fields"]["filenameEnc"]["value"] = base64.b64encode(name.encode()).decode()
+        pages[offset] = page
+    return service, pages
+
+
+def per_item(func: Callable[[], int], repeat: int, min_seconds: float) -> float:
+    """Best of `repeat` rounds of `func`, which returns how many items it processed; in us.
+
+    A round calls `func` until it took `min_seconds`, so fast benchmarks are not lost in timer
+    resolution and noise. Garbage collection is off while timing, as in timeit.
+    """
+    best = float("inf")
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            count = 0
+            started = time.perf_counter()
+            elapsed = 0.0
+            while elapsed < min_seconds:
+                count += func()
+                elapsed = time.perf_counter() - started
+            best = min(best, elapsed / count)
+    finally:
+        if collecting:
+            gc.enable()
+    return best * 1e6
+
+
+def benchmarks(assets: int) -> Dict[str, Callable[[], int]]:
+    service, pages = library(assets)
+    album = CannedAlbum(service, pages)
+    records = [
+        (master, asset)
+        for page in pages.values()
+        for master, asset in zip(page["records"][::2], page["records"][1::2])
+    ]
+    photos = [PhotoAsset(service, master, asset) for master, asset in records]
+    versions = [photo.versions for photo in photos]
+    raw_filenames = [
+        base64.b64decode(master["fields"]["filenameEnc"]["value"]).decode() for master, _ in records
+    ]
+    paths = [os.path.join(DOWNLOAD_DIR, "2024/06/01", photo.filename) for photo in photos]
+    sizes = [AssetVersionSize.ORIGINAL, AssetVersionSize.ADJUSTED, AssetVersionSize.ALTERNATIVE]
+    logger = logging.getLogger("bench")
+    offsets = list(pages)
+
+    def each(func: Callable[[Any], object], items: List[Any]) -> Callable[[], int]:
+        def run() -> int:
+            for item in items:
+                func(item)
+            return len(items)
+
+        return run
+
+    def listing() -> int:
+        return sum(1 for _ in album.photos)
+
+    return {
+        "PhotoAsset.filename": each(lambda photo: photo.filename, photos),
+        "PhotoAsset.item_type": each(lambda photo: photo.item_type, photos),
+        "PhotoAsset.versions": each(lambda record: PhotoAsset(service, *record).versions, records),
+        "disambiguate_filenames": each(
+            lambda photo_versions: disambiguate_filenames(photo_versions, sizes), versions
+        ),
+        "clean_filename": each(clean_filename, raw_filenames),
+        "remove_unicode_chars": each(remove_unicode_chars, raw_filenames),
+        "truncate_middle": each(lambda path: truncate_middle(path, 96), paths),
+        "folder_structure": each(
+            lambda photo: asset_download_dir(logger, photo, FOLDER_STRUCTURE, DOWNLOAD_DIR),
+            photos,
+        ),
+        "_list_query_gen (per page)": each(
+            lambda offset: json.dumps(
+                album._list_query_gen(offset, album.list_type, album.direction)
+            ),
+            offsets,
+        ),
+        "PhotoAlbum.photos pairing": listing,
+    }
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], threshold: float) -> bool:
+    """Prints results next to the baseline; returns whether any got slower than `threshold`"""
+    regressed = False
+    print(f"{'benchmark':30} {'baseline':>10} {'now':>10} {'change':>8}")
+    for name, now in results.items():
+        before: Optional[float] = baseline.get(name)
+        if before is None:
+            print(f"{name:30} {'-':>10} {now:10.2f}")
+            continue
+        change = now / before - 1
+        slower = change > threshold
+        regressed = regressed or slower
+        flag = "  slower" if slower else ""
+        print(f"{name:30} {before:10.2f} {now:10.2f} {change:+8.1%}{flag}")
+    return regressed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--assets", type=int, default=2000, help="assets per round")
+    parser.add_argument("--repeat", type=int, default=7, help="rounds, best is kept")
+    parser.add_argument("--min-time", type=float, default=0.1, help="seconds per round")
+    parser.add_argument("--only", action="append", help="benchmarks whose name contains this")
+    parser.add_argument("--save", metavar="PATH", help="write results as baseline to PATH")
+    parser.add_argument("--compare", metavar="PATH", help="compare with the baseline at PATH")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown, 0.1=10%%")
+    args = parser.parse_args()
+
+    results = {
+        name: round(per_item(func, args.repeat, args.min_time), 3)
+        for name, func in benchmarks(args.assets).items()
+        if not args.only or any(part in name for part in args.only)
+    }
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+            baseline_file.write("\n")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+        return
+    for name, microseconds in results.items():
+        print(f"{name:30} {microseconds:10.2f} us")
+
+
+if __name__ == "__main__":
+    main()
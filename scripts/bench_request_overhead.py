@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""measures overhead PyiCloudSession adds to each request, with and without debug logging"""
+
+import http.cookiejar as cookielib
+import inspect
+import io
+import logging
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict
+
+from pyicloud_ipd.session import PyiCloudPasswordFilter, PyiCloudSession
+from requests import PreparedRequest, Response, Session
+from requests.adapters import BaseAdapter
+
+BODY = b'{"success": true, "records": []}'
+
+
+class CannedAdapter(BaseAdapter):
+    """Answers every request with the same JSON, without touching the network"""
+
+    def send(self, request: PreparedRequest, **_kwargs: Any) -> Response:  # type: ignore[override]
+        response = Response()
+        response.status_code = 200
+        response.headers["Content-Type"] = "application/json"
+        response._content = BODY
+        response.url = request.url or ""
+        response.request = request
+        return response
+
+    def close(self) -> None:
+        pass
+
+
+class Service:
+    """Just enough of PyiCloudService for the session"""
+
+    def __init__(self, directory: str) -> None:
+        self.password_filter = PyiCloudPasswordFilter("password1")
+        self.session_data: Dict[str, Any] = {}
+        self.session_path = f"{directory}/session"
+        self.cookiejar_path = f"{directory}/cookies"
+        self.requires_2sa = False
+
+
+def per_call(func: Callable[[], Any], count: int, repeat: int = 5) -> float:
+    """Best of `repeat` rounds, in seconds per call"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(count):
+            func()
+        best = min(best, (time.perf_counter() - started) / count)
+    return best
+
+
+def per_request(session: Session, count: int) -> float:
+    return per_call(lambda: session.post("https://example.com/records/query", data="{}"), count)
+
+
+def main(count: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        plain = Session()
+        # proxy lookup in the environment would dominate the numbers
+        plain.trust_env = False
+        plain.mount("https://", CannedAdapter())
+        service = Service(directory)
+        icloud = PyiCloudSession(service)
+        icloud.cookies = cookielib.LWPCookieJar(filename=service.cookiejar_path)  # type: ignore[assignment]
+        icloud.trust_env = False
+        icloud.mount("https://", CannedAdapter())
+
+        root = logging.getLogger()
+        root.addHandler(logging.StreamHandler(io.StringIO()))
+
+        baseline = per_request(plain, count)
+        root.setLevel(logging.INFO)
+        quiet = per_request(icloud, count)
+        root.setLevel(logging.DEBUG)
+        debug = per_request(icloud, count)
+        root.setLevel(logging.WARNING)
+
+        print(f"requests.Session:               {baseline * 1e6:8.1f} us/request")
+        print(f"PyiCloudSession, info logging:  {(quiet - baseline) * 1e6:8.1f} us overhead")
+        print(f"PyiCloudSession, debug logging: {(debug - baseline) * 1e6:8.1f} us overhead")
+        # what logger attribution used to cost on every request
+        print(
+            f"inspect.stack() for reference:  "
+            f"{per_call(lambda: inspect.stack()[2], count) * 1e6:8.1f} us/call"
+        )
+        icloud.flush()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""end-to-end sync benchmark: runs icloudpd against a local fake iCloud (scripts/fake_icloud.py)
+
+    python scripts/bench_sync.py --assets 2000 --photo-bytes 200000 --video-bytes 2000000
+    python scripts/bench_sync.py --latency 0.05 --throttle-rate 0.02 -- --size original --size medium
+
+Arguments after `--` are passed to icloudpd. The server runs in its own process, so CPU time
+and peak RSS are those of icloudpd (plus this script).
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+from unittest import mock
+from urllib.parse import urlsplit
+
+from requests import PreparedRequest, Response
+from requests.adapters import HTTPAdapter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_icloud  # noqa: E402
+
+# hosts PyiCloudService talks to before the web services url comes from the (fake) server
+APPLE_HOSTS = ["https://idmsa.apple.com", "https://setup.icloud.com"]
+
+
+class RedirectAdapter(HTTPAdapter):
+    """Sends every request to `target` (scheme://host:port), keeping path and query"""
+
+    def __init__(self, target: str) -> None:
+        super().__init__()
+        self.target = target
+
+    def send(self, request: PreparedRequest, **kwargs: Any) -> Response:  # type: ignore[override]
+        url = urlsplit(request.url or "")
+        request.url = f"{self.target}{url.path}" + (f"?{url.query}" if url.query else "")
+        return super().send(request, **kwargs)
+
+
+def peak_rss_bytes() -> Any:
+    try:
+        import resource
+    except ImportError:
+        # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def directory_bytes(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def run_once(server: str, shape: fake_icloud.LibraryShape, extra: List[str]) -> Dict[str, Any]:
+    """Syncs the whole library into an empty directory and measures the run"""
+    from icloudpd.base import main
+    from pyicloud_ipd.session import PyiCloudSession
+
+    session_init = PyiCloudSession.__init__
+
+    def redirected_init(self: PyiCloudSession, *args: Any, **kwargs: Any) -> None:
+        session_init(self, *args, **kwargs)
+        self.trust_env = False
+        for host in APPLE_HOSTS:
+            self.mount(host, RedirectAdapter(server))
+
+    with tempfile.TemporaryDirectory() as directory:
+        data_dir = os.path.join(directory, "data")
+        os.mkdir(data_dir)
+        params = [
+            "--username",
+            "bench@example.com",
+            "--password",
+            "password1",
+            "-d",
+            data_dir,
+            "--cookie-directory",
+            os.path.join(directory, "cookies"),
+            "--no-progress-bar",
+            "--log-level",
+            "error",
+            *extra,
+        ]
+        cpu_started = os.times()
+        started = time.perf_counter()
+        exit_code: Any = 0
+        with mock.patch.object(PyiCloudSession, "__init__", redirected_init):
+            try:
+                main.main(params, prog_name="icloudpd", standalone_mode=False)
+            except SystemExit as error:
+                exit_code = error.code
+        seconds = time.perf_counter() - started
+        cpu_finished = os.times()
+        files = sum(len(names) for _, _, names in os.walk(data_dir))
+        written = directory_bytes(data_dir)
+    cpu = (cpu_finished.user - cpu_started.user) + (cpu_finished.system - cpu_started.system)
+    return {
+        "exit_code": exit_code,
+        "assets": shape.assets,
+        "files": files,
+        "bytes": written,
+        "seconds": round(seconds, 3),
+        "assets_per_second": round(shape.assets / seconds, 1),
+        "mb_per_second": round(written / seconds / 1e6, 2),
+        "cpu_seconds": round(cpu, 3),
+        "cpu_per_asset_ms": round(cpu / shape.assets * 1000, 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    fake_icloud.add_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=1, help="runs, each into an empty directory")
+    parser.add_argument(
+        "--wait-seconds", type=int, default=0, help="icloudpd back-off between retries"
+    )
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("extra", nargs="*", help="icloudpd options, after --")
+    args = parser.parse_args()
+    shape, faults = fake_icloud.shape_and_faults(args)
+
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    server = multiprocessing.Process(
+        target=fake_icloud.serve, args=(shape, faults, 0, sender), daemon=True
+    )
+    server.start()
+    try:
+        port = receiver.recv()
+        with mock.patch("icloudpd.constants.WAIT_SECONDS", args.wait_seconds):
+            runs = [
+                run_once(f"http://127.0.0.1:{port}", shape, args.extra) for _ in range(args.repeat)
+            ]
+    finally:
+        server.terminate()
+        server.join()
+
+    peak_rss = peak_rss_bytes()
+    if args.json:
+        print(json.dumps({"runs": runs, "peak_rss_bytes": peak_rss}, indent=2))
+        return
+    for number, run in enumerate(runs, 1):
+        print(
+            f"run {number}: exit {run['exit_code']}, {run['files']} files, "
+            f"{run['bytes'] / 1e6:.1f} MB in {run['seconds']:.2f} s"
+        )
+        print(f"  {run['assets_per_second']:10.1f} assets/s")
+        print(f"  {run['mb_per_second']:10.2f} MB/s")
+        print(f"  {run['cpu_seconds']:10.2f} s CPU ({run['cpu_per_asset_ms']:.3f} ms/asset)")
+    if peak_rss is not None:
+        print(f"peak RSS {peak_rss / 2**20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
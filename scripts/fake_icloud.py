@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""local stand-in for the iCloud endpoints icloudpd uses, serving a synthetic library
+
+Records are shaped like the ones in tests/vcr_cassettes and generated on demand from the
+asset index, so libraries of any size cost no memory. Downloads stream generated bytes.
+
+    python scripts/fake_icloud.py --assets 10000 --port 8081
+"""
+
+import argparse
+import base64
+import datetime
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from flask import Flask, Response, request
+
+DATABASE = "/database/1/com.apple.photos.cloud/production/private"
+# smart folder listed by default ("All Photos"), other folders are empty
+ALL_PHOTOS = "CPLAssetAndMasterByAssetDateWithoutHiddenOrDeleted"
+ZONE_ID = {
+    "zoneName": "PrimarySync",
+    "ownerRecordName": "_bench",
+    "zoneType": "REGULAR_CUSTOM_ZONE",
+}
+NEWEST = datetime.datetime(2024, 6, 1, tzinfo=datetime.timezone.utc)
+CHUNK = b"\x00icloudpd-bench\xff" * 4096
+
+
+class LibraryShape(NamedTuple):
+    """Size and mix of a synthetic library; file sizes are log-normal around the medians"""
+
+    assets: int = 1000
+    seed: int = 0
+    video_share: float = 0.1
+    live_share: float = 0.3
+    photo_bytes: int = 3_000_000
+    video_bytes: int = 40_000_000
+    spread: float = 0.6
+
+
+class Faults(NamedTuple):
+    """Delay of every response and share of listing pages and downloads that fail"""
+
+    latency: float = 0.0
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+
+
+def record_id(*parts: object) -> str:
+    """Stable id shaped like iCloud record names and checksums (28 base64 characters)"""
+    digest = hashlib.sha1("/".join(str(part) for part in parts).encode()).digest()
+    return base64.b64encode(b"\x01" + digest).decode("ascii")
+
+
+def resource(
+    base_url: str, shape: LibraryShape, index: int, prefix: str, size: int, file_type: str
+) -> Dict[str, Any]:
+    checksum = record_id(shape.seed, index, prefix)
+    return {
+        f"{prefix}Res": {
+            "value": {
+                "fileChecksum": checksum,
+                "size": size,
+                "wrappingKey": base64.b64encode(checksum[:16].encode()).decode("ascii"),
+                "referenceChecksum": record_id(shape.seed, index, prefix, "reference"),
+                "downloadURL": f"{base_url}content/{index}/{prefix}?s={size}",
+            },
+            "type": "ASSETID",
+        },
+        f"{prefix}FileType": {"value": file_type, "type": "STRING"},
+        f"{prefix}Fingerprint": {"value": checksum, "type": "STRING"},
+    }
+
+
+def asset_records(base_url: str, shape: LibraryShape, index: int) -> List[Dict[str, Any]]:
+    """Master and asset record of the asset at `index`, 0 being the newest"""
+    rng = random.Random(shape.seed * 1_000_003 + index)
+    video = rng.random() < shape.video_share
+    live = not video and rng.random() < shape.live_share
+    median = shape.video_bytes if video else shape.photo_bytes
+    size = max(1, round(median * math.exp(rng.gauss(0, shape.spread))))
+    master_name = record_id(shape.seed, index)
+    filename = f"IMG_{index + 1:05d}.{'MOV' if video else 'JPG'}"
+    created = NEWEST - datetime.timedelta(hours=index * 3)
+    timestamp = round(created.timestamp() * 1000)
+
+    fields: Dict[str, Any] = {
+        "itemType": {
+            "value": "com.apple.quicktime-movie" if video else "public.jpeg",
+            "type": "STRING",
+        },
+        "filenameEnc": {
+            "value": base64.b64encode(filename.encode()).decode(),
+            "type": "ENCRYPTED_BYTES",
+        },
+        "resOriginalWidth": {"value": 4032, "type": "INT64"},
+        "resOriginalHeight": {"value": 3024, "type": "INT64"},
+        "originalOrientation": {"value": 1, "type": "INT64"},
+        "dataClassType": {"value": 1, "type": "INT64"},
+    }
+    if video:
+        fields.update(
+            resource(base_url, shape, index, "resOriginal", size, "com.apple.quicktime-movie")
+        )
+        fields.update(
+            resource(base_url, shape, index, "resVidMed", size // 4, "com.apple.quicktime-movie")
+        )
+        fields.update(
+            resource(base_url, shape, index, "resVidSmall", size // 16, "com.apple.quicktime-movie")
+        )
+    else:
+        fields.update(resource(base_url, shape, index, "resOriginal", size, "public.jpeg"))
+        fields.update(resource(base_url, shape, index, "resJPEGMed", size // 3, "public.jpeg"))
+        fields.update(resource(base_url, shape, index, "resJPEGThumb", size // 30, "public.jpeg"))
+    if live:
+        fields.update(
+            resource(
+                base_url, shape, index, "resOriginalVidCompl", size * 2, "com.apple.quicktime-movie"
+            )
+        )
+    audit = {"timestamp": timestamp, "userRecordName": "_bench", "deviceID": "BENCH"}
+    master = {
+        "recordName": master_name,
+        "recordType": "CPLMaster",
+        "fields": fields,
+        "pluginFields": {},
+        "recordChangeTag": "1",
+        "created": audit,
+        "modified": audit,
+        "deleted": False,
+        "zoneID": ZONE_ID,
+    }
+    asset = {
+        "recordName": record_id(shape.seed, index, "asset"),
+        "recordType": "CPLAsset",
+        "fields": {
+            "assetDate": {"value": timestamp, "type": "TIMESTAMP"},
+            "addedDate": {"value": timestamp + 1000, "type": "TIMESTAMP"},
+            "orientation": {"value": 1, "type": "INT64"},
+            "assetSubtypeV2": {"value": 2 if live else 0, "type": "INT64"},
+            "timeZoneOffset": {"value": 0, "type": "INT64"},
+            "masterRef": {
+                "value": {"recordName": master_name, "action": "DELETE_SELF", "zoneID": ZONE_ID},
+                "type": "REFERENCE",
+            },
+            "duration": {"value": 30 if video else 0, "type": "INT64"},
+            "isHidden": {"value": 0, "type": "INT64"},
+            "isFavorite": {"value": 0, "type": "INT64"},
+        },
+        "pluginFields": {},
+        "recordChangeTag": "1",
+        "created": audit,
+        "modified": audit,
+        "deleted": False,
+        "zoneID": ZONE_ID,
+    }
+    return [master, asset]
+
+
+def page(base_url: str, shape: LibraryShape, query: Dict[str, Any]) -> Dict[str, Any]:
+    """Listing page for a records/query of the default smart folder"""
+    filters = {
+        entry["fieldName"]: entry["fieldValue"]["value"] for entry in query["query"]["filterBy"]
+    }
+    offset = int(filters.get("startRank", 0))
+    count = int(query.get("resultsLimit", 200)) // 2
+    if filters.get("direction") == "DESCENDING":
+        indexes = range(offset, max(offset - count, -1), -1)
+    else:
+        indexes = range(offset, min(offset + count, shape.assets))
+    records: List[Dict[str, Any]] = []
+    for index in indexes:
+        records.extend(asset_records(base_url, shape, index))
+    return {"records": records, "continuationMarker": str(offset + count), "syncToken": "bench"}
+
+
+def account(base_url: str) -> Dict[str, Any]:
+    return {
+        "dsInfo": {"dsid": "12345678901", "hsaVersion": 2, "hasICloudQualifyingDevice": True},
+        "hsaChallengeRequired": False,
+        "hsaTrustedBrowser": True,
+        "webservices": {"ckdatabasews": {"url": base_url.rstrip("/"), "status": "active"}},
+    }
+
+
+def make_app(shape: LibraryShape, faults: Faults) -> Flask:
+    """Flask app answering authentication, listing and download requests for `shape`"""
+    app = Flask(__name__)
+    rng = random.Random(shape.seed)
+    rng_lock = threading.Lock()
+
+    def injected_fault() -> Optional[Response]:
+        """Throttling (503) or error (500) response, as configured in `faults`"""
+        with rng_lock:
+            draw = rng.random()
+        if draw < faults.throttle_rate:
+            return Response("Service Unavailable", 503, mimetype="text/plain")
+        if draw < faults.throttle_rate + faults.error_rate:
+            return Response("Internal Server Error", 500, mimetype="text/plain")
+        return None
+
+    @app.before_request
+    def delay() -> None:
+        if faults.latency > 0:
+            time.sleep(faults.latency)
+
+    @app.route("/appleauth/auth/signin", methods=["POST"])
+    def signin() -> Response:
+        response = Response("{}", mimetype="application/json")
+        response.headers["X-Apple-Session-Token"] = "bench-session-token"
+        response.headers["X-Apple-ID-Session-Id"] = "bench-session-id"
+        response.headers["X-Apple-ID-Account-Country"] = "USA"
+        response.headers["scnt"] = "bench-scnt"
+        return response
+
+    @app.route("/setup/ws/1/accountLogin", methods=["POST"])
+    @app.route("/setup/ws/1/validate", methods=["POST"])
+    def validate() -> Response:
+        return Response(json.dumps(account(request.host_url)), mimetype="application/json")
+
+    @app.route(f"{DATABASE}/zones/list", methods=["POST"])
+    def zones() -> Response:
+        body = {"zones": [{"zoneID": ZONE_ID, "deleted": False}]}
+        return Response(json.dumps(body), mimetype="application/json")
+
+    @app.route(f"{DATABASE}/internal/records/query/batch", methods=["POST"])
+    def count() -> Response:
+        body = {"batch": [{"records": [{"fields": {"itemCount": {"value": shape.assets}}}]}]}
+        return Response(json.dumps(body), mimetype="application/json")
+
+    @app.route(f"{DATABASE}/records/query", methods=["POST"])
+    def query() -> Response:
+        payload = json.loads(request.get_data())
+        record_type = payload["query"]["recordType"]
+        if record_type == "CheckIndexingState":
+            body: Dict[str, Any] = {"records": [{"fields": {"state": {"value": "FINISHED"}}}]}
+        elif record_type == ALL_PHOTOS:
+            fault = injected_fault()
+            if fault is not None:
+                return fault
+            body = page(request.host_url, shape, payload)
+        else:
+            # albums, Recently Deleted, ...
+            body = {"records": []}
+        return Response(json.dumps(body), mimetype="application/json")
+
+    @app.route("/content/<int:index>/<prefix>", methods=["GET"])
+    def content(index: int, prefix: str) -> Response:
+        fault = injected_fault()
+        if fault is not None:
+            return fault
+        size = int(request.args["s"])
+
+        def chunks() -> Iterator[bytes]:
+            remaining = size
+            while remaining > 0:
+                chunk = CHUNK[:remaining]
+                remaining -= len(chunk)
+                yield chunk
+
+        response = Response(chunks(), mimetype="application/octet-stream")
+        response.headers["Content-Length"] = str(size)
+        return response
+
+    return app
+
+
+def serve(shape: LibraryShape, faults: Faults, port: int, ready: Any = None) -> None:
+    """Serves the library with waitress on localhost; sends the bound port to `ready`"""
+    from waitress.server import BaseWSGIServer, create_server
+
+    server = create_server(make_app(shape, faults), host="127.0.0.1", port=port, threads=8)
+    # one listen address gives a single socket server
+    assert isinstance(server, BaseWSGIServer)
+    if ready is not None:
+        ready.send(int(server.getsockname()[1]))
+    server.run()
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = LibraryShape()
+    parser.add_argument("--assets", type=int, default=defaults.assets, help="library size")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--video-share", type=float, default=defaults.video_share)
+    parser.add_argument("--live-share", type=float, default=defaults.live_share, help="of photos")
+    parser.add_argument("--photo-bytes", type=int, default=defaults.photo_bytes, help="median")
+    parser.add_argument("--video-bytes", type=int, default=defaults.video_bytes, help="median")
+    parser.add_argument(
+        "--spread", type=float, default=defaults.spread, help="sigma of the log-normal file sizes"
+    )
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="of pages and downloads")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="of pages and downloads")
+
+
+def shape_and_faults(args: argparse.Namespace) -> Tuple[LibraryShape, Faults]:
+    shape = LibraryShape(
+        args.assets,
+        args.seed,
+        args.video_share,
+        args.live_share,
+        args.photo_bytes,
+        args.video_bytes,
+        args.spread,
+    )
+    return shape, Faults(args.latency, args.error_rate, args.throttle_rate)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+    serve(*shape_and_faults(args), args.port)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""measures how long importing icloudpd takes, with a per module breakdown from `python -X importtime`"""
+
+import argparse
+import json
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+
+def measure(module: str) -> List[Tuple[str, int, int]]:
+    """Imports `module` in a fresh interpreter; returns (module, self us, cumulative us)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    timings: List[Tuple[str, int, int]] = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            # header line
+            continue
+        timings.append((name.strip(), int(self_us), int(cumulative_us)))
+    return timings
+
+
+def best_of(module: str, repeat: int) -> Dict[str, Tuple[int, int]]:
+    """Lowest timing of every module over `repeat` runs, to filter out noise"""
+    best: Dict[str, Tuple[int, int]] = {}
+    for _ in range(repeat):
+        for name, self_us, cumulative_us in measure(module):
+            previous = best.get(name)
+            if previous is None or cumulative_us < previous[1]:
+                best[name] = (self_us, cumulative_us)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--module", default="icloudpd.base", help="module to import")
+    parser.add_argument("--top", type=int, default=20, help="number of modules to list")
+    parser.add_argument("--repeat", type=int, default=5, help="runs to take the best of")
+    parser.add_argument("--json", action="store_true", help="print machine readable result")
+    args = parser.parse_args()
+
+    timings = best_of(args.module, args.repeat)
+    total_us = timings[args.module][1]
+    top = sorted(timings.items(), key=lambda item: item[1][1], reverse=True)[: args.top]
+
+    if args.json:
+        print(
+            json.dumps(
+                {
+                    "module": args.module,
+                    "total_ms": round(total_us / 1000, 1),
+                    "modules": {name: round(cumulative / 1000, 1) for name, (_, cumulative) in top},
+                },
+                indent=2,
+            )
+        )
+        return
+
+    print(f"import {args.module}: {total_us / 1000:.1f} ms (best of {args.repeat})")
+    print(f"{'cumulative ms':>14} {'self ms':>8}  module")
+    for name, (self_us, cumulative_us) in top:
+        print(f"{cumulative_us / 1000:14.1f} {self_us / 1000:8.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""In-process metrics in the Prometheus text format.
+
+Updating a metric takes one lock and a dict lookup, so it is fine in per-request and
+per-asset code. Values are only formatted when scraped.
+
+>>> registry = Registry()
+>>> requests = registry.counter("requests_total", "Requests sent", ["method"])
+>>> requests.inc("GET")
+>>> requests.inc("GET", amount=2)
+>>> print(registry.exposition(), end="")
+# HELP requests_total Requests sent
+# TYPE requests_total counter
+requests_total{method="GET"} 3.0
+"""
+
+import bisect
+import math
+import threading
+import typing
+from typing import Dict, List, Optional, Sequence, Tuple, TypeVar
+
+# seconds, from a local file check up to a large download
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[str, Sequence[Tuple[str, str]], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Sequence[str]) -> LabelValues:
+        if len(labels) != len(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(labels)
+
+    def samples(self) -> List[Sample]:
+        """(name suffix, label pairs, value) for every series"""
+        raise NotImplementedError
+
+    def exposition(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for suffix, pairs, value in self.samples():
+            rendered = ",".join(f'{label}="{_escape(text)}"' for label, text in pairs)
+            series = f"{self.name}{suffix}{{{rendered}}}" if rendered else f"{self.name}{suffix}"
+            lines.append(f"{series} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [("", list(zip(self.labels, key)), value) for key, value in values]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # per series: observations in each bucket (not cumulative, the last one is +Inf),
+        # then their sum
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = ([0] * (len(self.buckets) + 1), [0.0])
+                self._series[key] = series
+            series[0][index] += 1
+            series[1][0] += value
+
+    def count(self, *labels: str) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return 0 if series is None else sum(series[0])
+
+    def snapshot(self) -> Dict[LabelValues, Tuple[List[int], float]]:
+        """Bucket counts and sum of every series, to diff against later"""
+        with self._lock:
+            return {key: (list(counts), total[0]) for key, (counts, total) in self._series.items()}
+
+    def quantile(self, counts: Sequence[int], q: float) -> float:
+        """Estimates the q-quantile from bucket counts, interpolating inside the bucket
+        like Prometheus' histogram_quantile; observations above the last bound count as
+        the last bound"""
+        rank = q * sum(counts)
+        cumulative = 0
+        for index, count in enumerate(counts):
+            if count and cumulative + count >= rank:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return 0.0
+
+    def samples(self) -> List[Sample]:
+        all_series = sorted(self.snapshot().items())
+        samples: List[Sample] = []
+        for key, (counts, total) in all_series:
+            pairs = list(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                samples.append(("_bucket", [*pairs, ("le", _format_value(bound))], cumulative))
+            samples.append(("_sum", pairs, total))
+            samples.append(("_count", pairs, cumulative))
+        return samples
+
+
+MetricType = TypeVar("MetricType", bound=Metric)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Metric] = {}
+
+    def _register(self, metric: MetricType) -> MetricType:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labels != metric.labels:
+                    raise ValueError(f"{metric.name} is already registered differently")
+                return typing.cast(MetricType, existing)
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labels))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Optional[Sequence[float]] = None,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labels, buckets or DEFAULT_BUCKETS))
+
+    def exposition(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        return "".join(line + "\n" for _, metric in metrics for line in metric.exposition())
+
+
+# metrics of this process, served by the web UI at /metrics
+REGISTRY = Registry()
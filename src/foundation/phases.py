@@ -0,0 +1,120 @@
+"""Time spent per phase of a sync (listing, transfers, file checks, ...), kept in one
+histogram labeled by phase and summarized at the end of a run.
+
+>>> since = snapshot()
+>>> with phase("example"):
+...     pass
+>>> [(stats.phase, stats.calls) for stats in phase_stats(since)]
+[('example', 1)]
+"""
+
+import contextlib
+import time
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from foundation.metrics import REGISTRY, Histogram, LabelValues
+
+PHASE_SECONDS = REGISTRY.histogram(
+    "icloudpd_phase_duration_seconds",
+    "Time spent in each phase of a sync; phases can nest",
+    ["phase"],
+    # per-file phases take microseconds, transfers and listings seconds
+    [
+        0.0001,
+        0.00025,
+        0.0005,
+        0.001,
+        0.0025,
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1.0,
+        2.5,
+        5.0,
+        10.0,
+        30.0,
+        60.0,
+        300.0,
+    ],
+)
+
+Snapshot = Dict[LabelValues, Tuple[List[int], float]]
+
+
+class PhaseStats(NamedTuple):
+    phase: str
+    calls: int
+    total: float
+    mean: float
+    p95: float
+
+
+@contextlib.contextmanager
+def phase(name: str, also: Optional[Histogram] = None) -> Iterator[None]:
+    """Adds the time spent in the block to phase `name`, also when it raises; the same
+    duration goes to the unlabeled histogram `also` when given"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        PHASE_SECONDS.observe(elapsed, name)
+        if also is not None:
+            also.observe(elapsed)
+
+
+def snapshot() -> Snapshot:
+    """Phase timings so far, to report a run or cycle against"""
+    return PHASE_SECONDS.snapshot()
+
+
+def phase_stats(since: Optional[Snapshot] = None) -> List[PhaseStats]:
+    """Phases observed after `since`, the slowest in total first; p95 is estimated
+    from histogram buckets"""
+    stats = []
+    for key, (counts, total) in PHASE_SECONDS.snapshot().items():
+        if since is not None and key in since:
+            earlier_counts, earlier_total = since[key]
+            counts = [now - then for now, then in zip(counts, earlier_counts)]
+            total -= earlier_total
+        count = sum(counts)
+        if count:
+            stats.append(
+                PhaseStats(
+                    key[0], count, total, total / count, PHASE_SECONDS.quantile(counts, 0.95)
+                )
+            )
+    return sorted(stats, key=lambda stats: stats.total, reverse=True)
+
+
+def format_phase_table(stats: List[PhaseStats]) -> str:
+    """Phase statistics as a text table, times in seconds"""
+    width = max([len("phase")] + [len(entry.phase) for entry in stats])
+    lines = [f"{'phase':<{width}} {'total':>10} {'mean':>10} {'p95':>10} {'count':>8}"]
+    for entry in stats:
+        lines.append(
+            f"{entry.phase:<{width}} {entry.total:>10.3f} {entry.mean:>10.4f} "
+            f"{entry.p95:>10.4f} {entry.calls:>8}"
+        )
+    return "\n".join(lines)
+
+
+def phase_report(stats: List[PhaseStats], wall_seconds: float) -> Dict[str, Any]:
+    """Phase statistics for a JSON report"""
+    return {
+        "wall_seconds": round(wall_seconds, 3),
+        "phases": [
+            {
+                "phase": entry.phase,
+                "count": entry.calls,
+                "total_seconds": round(entry.total, 6),
+                "mean_seconds": round(entry.mean, 6),
+                "p95_seconds": round(entry.p95, 6),
+            }
+            for entry in stats
+        ],
+    }
@@ -0,0 +1,332 @@
+"""
+Compares the local mirror with the iCloud listing without downloading anything
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from pyicloud_ipd.asset_version import AssetVersion
+from pyicloud_ipd.base import PyiCloudService
+from pyicloud_ipd.file_match import FileMatchPolicy
+from pyicloud_ipd.item_type import AssetItemType
+from pyicloud_ipd.services.photos import PhotoAsset
+from pyicloud_ipd.utils import disambiguate_filenames
+from pyicloud_ipd.version_size import AssetVersionSize, LivePhotoVersionSize, VersionSize
+
+from icloudpd import constants
+from icloudpd.counter import Counter
+from icloudpd.paths import (
+    asset_download_dir,
+    existing_download_path,
+    live_photo_download_path,
+    local_download_path,
+    primary_download_sizes,
+)
+
+
+def build_local_index(directory: str, excluded: Sequence[str]) -> Tuple[Dict[str, int], List[str]]:
+    """Walks the mirror once and returns sizes of regular files and unfinished downloads.
+
+    Hidden files and folders (including the audit state) and `excluded` folders are skipped.
+    """
+    files: Dict[str, int] = {}
+    partials: List[str] = []
+    pending = [directory]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.name.startswith(".") or entry.path in excluded:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif entry.is_file():
+                    if entry.name.endswith(".part"):
+                        partials.append(entry.path)
+                    else:
+                        files[entry.path] = entry.stat().st_size
+    return (files, partials)
+
+
+def hash_file(path: str) -> str:
+    """SHA-256 of the file content. Runs in a worker process"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file_obj:
+        while True:
+            chunk = file_obj.read(constants.AUDIT_HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MirrorAudit:
+    """Checks each listed asset against a one-pass index of the download directory.
+
+    Expected paths are resolved with the same helpers the downloader uses, so an asset the
+    downloader would skip as existing is reported as present here.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        directory: str,
+        folder_structure: str,
+        primary_sizes: Sequence[AssetVersionSize],
+        force_size: bool,
+        skip_videos: bool,
+        skip_live_photos: bool,
+        live_photo_size: LivePhotoVersionSize,
+        file_match_policy: FileMatchPolicy,
+        content_store: Optional[str],
+    ) -> None:
+        self.logger = logger
+        self.directory = os.path.normpath(directory)
+        self.folder_structure = folder_structure
+        self.primary_sizes = primary_sizes
+        self.force_size = force_size
+        self.skip_videos = skip_videos
+        self.skip_live_photos = skip_live_photos
+        self.live_photo_size = live_photo_size
+        self.file_match_policy = file_match_policy
+        self.files, self.partials = build_local_index(
+            self.directory, [] if content_store is None else [os.path.normpath(content_store)]
+        )
+        self.present: Set[str] = set()
+        # files of versions the current options do not ask for, which are still no orphans
+        self.claimed: Set[str] = set()
+        self.missing: List[str] = []
+        self.size_mismatches: List[Tuple[str, int, int]] = []
+        self.corrupted: List[str] = []
+
+    def check(self, download_path: str, version_size: int, existing_path: Optional[str]) -> None:
+        """Records the outcome for one expected file"""
+        if existing_path is None:
+            self.missing.append(download_path)
+            return
+        self.present.add(existing_path)
+        local_size = self.files[existing_path]
+        if local_size != version_size:
+            self.size_mismatches.append((existing_path, version_size, local_size))
+
+    def claim(self, photo: PhotoAsset, download_dir: str) -> None:
+        """Records local files of every version the asset has, whatever the size and skip
+        options, so files downloaded by runs with other options are not orphans"""
+        try:
+            versions = disambiguate_filenames(photo.versions, list(AssetVersionSize))
+        except KeyError:
+            versions = {}
+        expected: List[Tuple[str, AssetVersion, VersionSize]] = [
+            (local_download_path(version.filename, download_dir), version, size)
+            for size, version in versions.items()
+        ]
+        for live_photo_size in LivePhotoVersionSize:
+            live_photo = live_photo_download_path(photo, live_photo_size, download_dir)
+            if live_photo is not None:
+                expected.append((live_photo[1], live_photo[0], live_photo_size))
+        for download_path, version, size in expected:
+            _, existing_path = existing_download_path(
+                self.logger, download_path, version, size, self.file_match_policy, self.files.get
+            )
+            if existing_path is not None:
+                self.claimed.add(existing_path)
+
+    def check_photo(self, photo: PhotoAsset) -> None:
+        """Checks all files the downloader would keep for the asset"""
+        _, download_dir = asset_download_dir(
+            self.logger, photo, self.folder_structure, self.directory
+        )
+        self.claim(photo, download_dir)
+        if self.skip_videos and photo.item_type != AssetItemType.IMAGE:
+            return
+        try:
+            versions = disambiguate_filenames(photo.versions, self.primary_sizes)
+        except KeyError as ex:
+            self.logger.error("Could not audit %s: %s attribute was not found", photo.filename, ex)
+            return
+
+        for download_size in primary_download_sizes(
+            self.logger, photo, versions, self.primary_sizes, self.force_size
+        ):
+            version = versions[download_size]
+            download_path, existing_path = existing_download_path(
+                self.logger,
+                local_download_path(version.filename, download_dir),
+                version,
+                download_size,
+                self.file_match_policy,
+                self.files.get,
+            )
+            self.check(download_path, version.size, existing_path)
+
+        if not self.skip_live_photos:
+            live_photo = live_photo_download_path(photo, self.live_photo_size, download_dir)
+            if live_photo is not None:
+                version, lp_download_path = live_photo
+                lp_download_path, lp_existing_path = existing_download_path(
+                    self.logger,
+                    lp_download_path,
+                    version,
+                    self.live_photo_size,
+                    self.file_match_policy,
+                    self.files.get,
+                )
+                self.check(lp_download_path, version.size, lp_existing_path)
+
+    def builder(self, _icloud: PyiCloudService) -> Callable[[Counter, PhotoAsset], bool]:
+        """Plugs the audit into the download loop in place of the downloader"""
+
+        def audit_photo_(_counter: Counter, photo: PhotoAsset) -> bool:
+            self.check_photo(photo)
+            return False
+
+        return audit_photo_
+
+    def orphans(self) -> List[str]:
+        """Local files that belong to no version of any listed asset"""
+        return sorted(set(self.files) - self.present - self.claimed)
+
+    def load_state(self) -> Dict[str, Any]:
+        """Reads hashes from previous audits; starts over if the state is unreadable"""
+        try:
+            with open(self.state_path(), encoding="utf-8") as state_file:
+                state: Dict[str, Any] = json.load(state_file)
+            if isinstance(state.get("files"), dict) and isinstance(state.get("pass"), int):
+                return state
+        except (OSError, ValueError):
+            pass
+        return {"pass": 0, "complete": True, "files": {}}
+
+    def save_state(self, state: Dict[str, Any]) -> None:
+        temp_path = self.state_path() + ".part"
+        with open(temp_path, "w", encoding="utf-8") as state_file:
+            json.dump(state, state_file)
+        os.replace(temp_path, self.state_path())
+
+    def state_path(self) -> str:
+        return os.path.join(self.directory, constants.AUDIT_STATE_FILENAME)
+
+    def verify_hashes(self, limit_bytes_per_second: Optional[int]) -> None:
+        """Hashes present files and flags those whose content changed since the last audit
+        while size and modification time stayed the same.
+
+        Progress is saved regularly, so an interrupted pass continues where it stopped.
+        """
+        state = self.load_state()
+        if state["complete"]:
+            state["pass"] += 1
+            state["complete"] = False
+        current_pass = state["pass"]
+        known: Dict[str, Dict[str, Any]] = state["files"]
+        for relative_path in list(known):
+            if os.path.join(self.directory, relative_path) not in self.present:
+                del known[relative_path]
+
+        candidates: List[Tuple[str, os.stat_result]] = []
+        for path in sorted(self.present):
+            entry = known.get(os.path.relpath(path, self.directory))
+            if entry is not None and entry["pass"] == current_pass:
+                continue
+            try:
+                candidates.append((path, os.stat(path)))
+            except OSError:
+                continue
+        if len(candidates) < len(self.present):
+            self.logger.info(
+                "Resuming hash verification, %d of %d files left",
+                len(candidates),
+                len(self.present),
+            )
+
+        completed = 0
+        started = time.monotonic()
+        submitted_bytes = 0
+        pending: Dict[Future[str], Tuple[str, os.stat_result]] = {}
+
+        def collect(done: "Set[Future[str]]") -> None:
+            nonlocal completed
+            for future in done:
+                path, stat = pending.pop(future)
+                relative_path = os.path.relpath(path, self.directory)
+                try:
+                    digest = future.result()
+                except OSError as err:
+                    self.logger.error("Could not hash %s: %s", path, err)
+                    continue
+                previous = known.get(relative_path)
+                if (
+                    previous is not None
+                    and previous["size"] == stat.st_size
+                    and previous["mtime_ns"] == stat.st_mtime_ns
+                    and previous["sha256"] != digest
+                ):
+                    self.corrupted.append(path)
+                known[relative_path] = {
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "sha256": digest,
+                    "pass": current_pass,
+                }
+                completed += 1
+                if completed % constants.AUDIT_STATE_SAVE_EVERY == 0:
+                    self.save_state(state)
+
+        try:
+            with ProcessPoolExecutor(max_workers=constants.AUDIT_HASH_WORKERS) as executor:
+                for path, stat in candidates:
+                    if limit_bytes_per_second is not None:
+                        delay = submitted_bytes / limit_bytes_per_second - (
+                            time.monotonic() - started
+                        )
+                        if delay > 0:
+                            time.sleep(delay)
+                    submitted_bytes += stat.st_size
+                    pending[executor.submit(hash_file, path)] = (path, stat)
+                    if len(pending) >= constants.AUDIT_HASH_WORKERS * 2:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(done)
+                done, _ = wait(pending)
+                collect(done)
+            state["complete"] = True
+        finally:
+            self.save_state(state)
+
+    def report(self, listing_complete: bool) -> int:
+        """Logs every finding and a summary; returns the exit code"""
+        for path in self.missing:
+            self.logger.warning("Missing %s", path)
+        for path in sorted(self.partials):
+            self.logger.warning("Unfinished download %s", path)
+        for path, expected, found in self.size_mismatches:
+            self.logger.warning(
+                "Size mismatch %s: expected %d bytes, found %d", path, expected, found
+            )
+        for path in sorted(self.corrupted):
+            self.logger.warning("Content changed %s", path)
+        orphans = self.orphans() if listing_complete else []
+        for path in orphans:
+            self.logger.warning("Not in iCloud %s", path)
+        if not listing_complete:
+            self.logger.info("Skipped looking for files not in iCloud, because --recent was used")
+        self.logger.info(
+            "Audited %d files: %d missing, %d unfinished, %d wrong size, %d changed, "
+            + "%d not in iCloud",
+            len(self.present) + len(self.missing),
+            len(self.missing),
+            len(self.partials),
+            len(self.size_mismatches),
+            len(self.corrupted),
+            len(orphans),
+        )
+        findings = (
+            len(self.missing)
+            + len(self.partials)
+            + len(self.size_mismatches)
+            + len(self.corrupted)
+            + len(orphans)
+        )
+        return 0 if findings == 0 else 1
@@ -2,7 +2,6 @@
 
 import logging
 import sys
-import time
 from typing import Callable, Dict, Optional, Tuple
 
 import click
@@ -13,6 +12,10 @@ from pyicloud_ipd.raw_policy import RawTreatmentPolicy
 from icloudpd.mfa_provider import MFAProvider
 from icloudpd.status import Status, StatusExchange
 
+# authenticated services kept by a long-lived process (see icloudpd.daemon),
+# keyed by username, cookie directory and domain
+ServiceCache = Dict[Tuple[str, Optional[str], str], PyiCloudService]
+
 
 class TwoStepAuthRequiredError(Exception):
     """
@@ -33,6 +36,8 @@ def authenticator(
     ],
     mfa_provider: MFAProvider,
     status_exchange: StatusExchange,
+    session_freshness: int = 0,
+    services: Optional[ServiceCache] = None,
 ) -> Callable[[str, Optional[str], bool, Optional[str]], PyiCloudService]:
     """Wraping authentication with domain context"""
 
@@ -43,6 +48,15 @@ def authenticator(
         client_id: Optional[str] = None,
     ) -> PyiCloudService:
         """Authenticate with iCloud username and password"""
+        cache_key = (username, cookie_directory, domain)
+        if services is not None and cache_key in services:
+            logger.debug("Reusing authenticated session for %s", username)
+            cached = services[cache_key]
+            cached.use_policies(
+                filename_cleaner, lp_filename_generator, raw_policy, file_match_policy
+            )
+            return cached
+
         logger.debug("Authenticating...")
         icloud: Optional[PyiCloudService] = None
         _valid_password: Optional[str] = None
@@ -60,6 +74,7 @@ def authenticator(
                     _password,
                     cookie_directory=cookie_directory,
                     client_id=client_id,
+                    session_freshness=session_freshness,
                 )
                 _valid_password = _password
                 break
@@ -88,6 +103,8 @@ def authenticator(
             logger.info("Two-step authentication is required (2sa)")
             request_2sa(icloud, logger)
 
+        if services is not None:
+            services[cache_key] = icloud
         return icloud
 
     return authenticate_
@@ -224,12 +241,7 @@ def request_2fa_web(
         return
 
     # wait for input
-    while True:
-        status = status_exchange.get_status()
-        if status == Status.NEED_MFA:
-            time.sleep(1)
-        else:
-            break
+    status_exchange.wait_for_status_change(Status.NEED_MFA)
 
     if status_exchange.replace_status(Status.SUPPLIED_MFA, Status.CHECKING_MFA):
         code = status_exchange.get_payload()
@@ -5,27 +5,75 @@ Delete any files found in "Recently Deleted"
 import datetime
 import logging
 import os
-from typing import Sequence, Set
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional, Sequence, Set
 
 from pyicloud_ipd.services.photos import PhotoLibrary
 from pyicloud_ipd.utils import disambiguate_filenames
 from pyicloud_ipd.version_size import AssetVersionSize, VersionSize
 from tzlocal import get_localzone
 
+from icloudpd import constants
+from icloudpd.download import content_store_path
+from icloudpd.event_log import EVENT_LOG
 from icloudpd.paths import local_download_path
 
 
 def delete_file(logger: logging.Logger, path: str) -> bool:
     """Actual deletion of files"""
-    os.remove(path)
-    logger.info("Deleted %s", path)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return False
+    except OSError as err:
+        logger.error("Could not delete %s: %s", path, err)
+        return False
     return True
 
 
-def delete_file_dry_run(logger: logging.Logger, path: str) -> bool:
+def delete_file_dry_run(_logger: logging.Logger, path: str) -> bool:
     """Dry run deletion of files"""
-    logger.info("[DRY RUN] Would delete %s", path)
-    return True
+    return os.path.exists(path)
+
+
+def prune_empty_dirs(logger: logging.Logger, directory: str, paths: Iterable[str]) -> int:
+    """Removes folders left empty after deleting paths, deepest first, never `directory` itself"""
+    root = os.path.normpath(directory)
+    candidates: Set[str] = set()
+    for path in paths:
+        parent = os.path.dirname(path)
+        while parent.startswith(root + os.sep) and parent not in candidates:
+            candidates.add(parent)
+            parent = os.path.dirname(parent)
+    pruned = 0
+    for folder in sorted(candidates, key=lambda _f: _f.count(os.sep), reverse=True):
+        try:
+            os.rmdir(folder)
+        except OSError:
+            # not empty or already gone
+            continue
+        logger.debug("Removed empty folder %s", folder)
+        pruned += 1
+    return pruned
+
+
+def prune_content_store(logger: logging.Logger, store_paths: Iterable[str]) -> List[str]:
+    """Removes content store files that no folder links to any more, i.e. whose only hardlink
+    is the store entry itself"""
+    removed: List[str] = []
+    for path in sorted(store_paths):
+        try:
+            if os.stat(path).st_nlink > 1:
+                continue
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        except OSError as err:
+            logger.error("Could not delete %s: %s", path, err)
+            continue
+        logger.debug("Removed %s from the content store", path)
+        removed.append(path)
+    return removed
 
 
 def autodelete_photos(
@@ -35,16 +83,21 @@ def autodelete_photos(
     folder_structure: str,
     directory: str,
     _sizes: Sequence[AssetVersionSize],
+    content_store: Optional[str],
 ) -> None:
     """
     Scans the "Recently Deleted" folder and deletes any matching files
     from the download directory.
     (I.e. If you delete a photo on your phone, it's also deleted on your computer.)
+    Files of a hardlinked `content_store` are deleted too once nothing links to them.
     """
     logger.info("Deleting any files found in 'Recently Deleted'...")
 
     recently_deleted = library_object.albums["Recently Deleted"]
 
+    paths_to_delete: List[str] = []
+    store_paths: Set[str] = set()
+
     for media in recently_deleted:
         try:
             created_date = media.created.astimezone(get_localzone())
@@ -76,8 +129,42 @@ def autodelete_photos(
         for _size, _version in media.versions.items():
             if _size not in [AssetVersionSize.ALTERNATIVE, AssetVersionSize.ADJUSTED]:
                 paths.add(os.path.normpath(local_download_path(_version.filename, download_dir)))
-        for path in paths:
-            if os.path.exists(path):
-                logger.debug("Deleting %s...", path)
-                delete_local = delete_file_dry_run if dry_run else delete_file
-                delete_local(logger, path)
+        paths_to_delete.extend(sorted(paths))
+        if content_store is not None:
+            for _version in media.versions.values():
+                store_path = content_store_path(content_store, _version)
+                if store_path is not None:
+                    store_paths.add(store_path)
+
+    delete_local = delete_file_dry_run if dry_run else delete_file
+    with ThreadPoolExecutor(max_workers=constants.AUTODELETE_WORKERS) as executor:
+        results = list(executor.map(lambda _p: delete_local(logger, _p), paths_to_delete))
+    deleted = [_p for _p, _r in zip(paths_to_delete, results) if _r]
+    for path in deleted:
+        EVENT_LOG.emit("deleted", target="local", path=path)
+
+    pruned = 0 if dry_run else prune_empty_dirs(logger, directory, deleted)
+    # other albums and libraries sharing the store still link what they contain
+    unlinked = [] if dry_run else prune_content_store(logger, store_paths)
+    for path in unlinked:
+        EVENT_LOG.emit("deleted", target="store", path=path)
+    if content_store is not None:
+        prune_empty_dirs(logger, content_store, unlinked)
+
+    # per-file logging is only useful for small purges
+    verbose = len(deleted) <= constants.AUTODELETE_VERBOSE_LIMIT
+    for path in deleted:
+        logger.log(
+            logging.INFO if verbose else logging.DEBUG,
+            "[DRY RUN] Would delete %s" if dry_run else "Deleted %s",
+            path,
+        )
+    if not verbose:
+        logger.info(
+            "%s %d files found in 'Recently Deleted' and removed %d empty folders",
+            "[DRY RUN] Would delete" if dry_run else "Deleted",
+            len(deleted),
+            pruned,
+        )
+    if unlinked:
+        logger.info("Removed %d files no longer linked from the content store", len(unlinked))
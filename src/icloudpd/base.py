@@ -31,40 +31,65 @@ from typing import (
     NoReturn,
     Optional,
     Sequence,
+    Set,
     Tuple,
     TypeVar,
     cast,
 )
 
 import click
+from foundation.metrics import REGISTRY
+from foundation.phases import Snapshot, format_phase_table, phase, phase_report, phase_stats
+from foundation.phases import snapshot as phase_snapshot
+from pyicloud_ipd.asset_version import AssetVersion
 from pyicloud_ipd.base import PyiCloudService
 from pyicloud_ipd.exceptions import PyiCloudAPIResponseException
 from pyicloud_ipd.file_match import FileMatchPolicy
 from pyicloud_ipd.raw_policy import RawTreatmentPolicy
 from pyicloud_ipd.services.photos import PhotoAsset, PhotoLibrary, PhotosService
+from pyicloud_ipd.session import WIRE_LOG
 from pyicloud_ipd.utils import (
-    add_suffix_to_filename,
     disambiguate_filenames,
     get_password_from_keyring,
-    size_to_suffix,
     store_password_in_keyring,
 )
-from pyicloud_ipd.version_size import AssetVersionSize, LivePhotoVersionSize
+from pyicloud_ipd.version_size import AssetVersionSize, LivePhotoVersionSize, VersionSize
 from tqdm import tqdm
 from tqdm.contrib.logging import logging_redirect_tqdm
-from tzlocal import get_localzone
 
 from icloudpd import constants, download, exif_datetime
-from icloudpd.authentication import TwoStepAuthRequiredError, authenticator
+from icloudpd.audit import MirrorAudit
+from icloudpd.authentication import ServiceCache, TwoStepAuthRequiredError, authenticator
 from icloudpd.autodelete import autodelete_photos
 from icloudpd.config import Config
 from icloudpd.counter import Counter
+from icloudpd.deletion_queue import QUEUE_DEPTH, DeletionQueue
 from icloudpd.email_notifications import send_2sa_notification
-from icloudpd.paths import clean_filename, local_download_path, remove_unicode_chars
-from icloudpd.server import serve_app
+from icloudpd.event_log import EVENT_LOG, emit_version
+from icloudpd.paths import (
+    asset_download_dir,
+    clean_filename,
+    existing_download_path,
+    live_photo_download_path,
+    local_download_path,
+    primary_download_sizes,
+    remove_unicode_chars,
+)
+from icloudpd.profiling import profiled, write_profile
+from icloudpd.progress import TransferSnapshot
 from icloudpd.status import Status, StatusExchange
 from icloudpd.string_helpers import truncate_middle
 
+EXISTENCE_CHECK_SECONDS = REGISTRY.histogram(
+    "icloudpd_existence_check_duration_seconds", "Time to look up a version on local disk"
+)
+LAST_SUCCESSFUL_SYNC = REGISTRY.gauge(
+    "icloudpd_last_successful_sync_timestamp_seconds",
+    "End of the last sync that was neither cancelled nor had failed files",
+)
+# records iCloud did not confirm as deleted; already downloaded, so queued again by recordName
+UNCONFIRMED_DELETES: Set[str] = set()
+
 
 def build_filename_cleaner(
     _ctx: click.Context, _param: click.Parameter, is_keep_unicode: bool
@@ -162,12 +187,7 @@ def get_password_from_webui(
             return None
 
         # wait for input
-        while True:
-            status = status_exchange.get_status()
-            if status == Status.NEED_PASSWORD:
-                time.sleep(1)
-            else:
-                break
+        status_exchange.wait_for_status_change(Status.NEED_PASSWORD)
         if status_exchange.replace_status(Status.SUPPLIED_PASSWORD, Status.CHECKING_PASSWORD):
             password = status_exchange.get_payload()
             if not password:
@@ -304,6 +324,14 @@ CONTEXT_SETTINGS = {"help_option_names": ["-h", "--help"]}
     metavar="<password>",
     # is_eager=True,
 )
+@click.option(
+    "--session-freshness",
+    help="Trust a session validated by a previous run less than this many seconds ago "
+    + "and skip validating it again on start (default: always validate)",
+    type=click.IntRange(0),
+    default=0,
+    metavar="<seconds>",
+)
 @click.option(
     "--auth-only",
     help="Create/Update cookie and session tokens only.",
@@ -463,6 +491,61 @@ CONTEXT_SETTINGS = {"help_option_names": ["-h", "--help"]}
     type=click.Choice(["debug", "info", "error"]),
     default="debug",
 )
+@click.option(
+    "--log-http",
+    help="Log bodies and headers of HTTP requests and responses, truncated, "
+    + "for troubleshooting (default: only method and URL at debug level)",
+    is_flag=True,
+)
+@click.option(
+    "--log-http-sample",
+    help="With --log-http, log only every N-th HTTP request",
+    type=click.IntRange(1),
+    default=1,
+    show_default=True,
+    metavar="<n>",
+)
+@click.option(
+    "--event-log",
+    help="Append one JSON line per downloaded, existing, linked, failed or deleted file "
+    + "to this file",
+    type=click.Path(dir_okay=False, writable=True),
+    metavar="<filename>",
+)
+@click.option(
+    "--timing-report",
+    help="Write the time spent per phase (listing, transfers, file checks, ...) of the run, "
+    + "or of the last --watch-with-interval cycle, to this file as JSON",
+    type=click.Path(dir_okay=False, writable=True),
+    metavar="<filename>",
+)
+@click.option(
+    "--profile",
+    help="Profile the run and write the result to this file, as --profile-format",
+    type=click.Path(dir_okay=False, writable=True),
+    metavar="<filename>",
+)
+@click.option(
+    "--profile-format",
+    help="pstats: every call, recorded with cProfile; "
+    + "collapsed: sampled stacks, for flame graph tools, with less overhead",
+    type=click.Choice(["pstats", "collapsed"], case_sensitive=False),
+    default="pstats",
+    show_default=True,
+)
+@click.option(
+    "--profile-memory",
+    help="Trace memory allocations during the run and write the top allocation sites "
+    + "at peak usage to this file",
+    type=click.Path(dir_okay=False, writable=True),
+    metavar="<filename>",
+)
+@click.option(
+    "--profile-time-limit",
+    help="Stop --profile and --profile-memory after this many seconds, the run continues",
+    type=click.IntRange(1),
+    metavar="<seconds>",
+)
 @click.option(
     "--no-progress-bar",
     help="Disables the one-line progress bar and prints log messages on separate lines "
@@ -551,6 +634,12 @@ CONTEXT_SETTINGS = {"help_option_names": ["-h", "--help"]}
     show_default=True,
     callback=mfa_provider_generator,
 )
+@click.option(
+    "--web-ui",
+    help="Start the web server (status, progress and /metrics on port 8080) "
+    + "even if MFA codes are not read from it",
+    is_flag=True,
+)
 @click.option(
     "--use-os-locale",
     help="Use locale of the host OS to format dates",
@@ -559,6 +648,38 @@ CONTEXT_SETTINGS = {"help_option_names": ["-h", "--help"]}
     is_eager=True,
     callback=locale_setter,
 )
+@click.option(
+    "--content-store",
+    help="Store each asset version once in this directory, addressed by its iCloud checksum, "
+    + "and link it into --directory. Share it between runs for several albums and libraries",
+    type=click.Path(exists=True, file_okay=False),
+    metavar="<directory>",
+)
+@click.option(
+    "--content-store-link",
+    help="How files in --directory refer to the --content-store",
+    type=click.Choice(["hardlink", "symlink"], case_sensitive=False),
+    default="hardlink",
+    show_default=True,
+)
+@click.option(
+    "--audit",
+    help="Compare --directory with iCloud instead of downloading: report missing files, "
+    + "unfinished downloads, wrong sizes and files no longer in iCloud. Exits with 1 on findings",
+    is_flag=True,
+)
+@click.option(
+    "--audit-hash",
+    help="During --audit, also hash local files and report content that changed since the "
+    + "previous audit. Progress is kept in --directory, so an interrupted run resumes",
+    is_flag=True,
+)
+@click.option(
+    "--audit-hash-limit",
+    help="Maximum MB per second read by --audit-hash (default: no limit)",
+    type=click.IntRange(1),
+    metavar="<mb_per_second>",
+)
 @click.option(
     "--version",
     help="Show the version, commit hash and timestamp",
@@ -611,7 +732,22 @@ def main(
     ],
     file_match_policy: FileMatchPolicy,
     mfa_provider: MFAProvider,
+    web_ui: bool,
     use_os_locale: bool,
+    content_store: Optional[str],
+    content_store_link: str,
+    audit: bool,
+    audit_hash: bool,
+    audit_hash_limit: Optional[int],
+    log_http: bool,
+    log_http_sample: int,
+    session_freshness: int,
+    event_log: Optional[str],
+    timing_report: Optional[str],
+    profile: Optional[str],
+    profile_format: str,
+    profile_memory: Optional[str],
+    profile_time_limit: Optional[int],
 ) -> NoReturn:
     """Download all iCloud photos to a local directory"""
 
@@ -633,6 +769,8 @@ def main(
             logger.setLevel(logging.INFO)
         elif log_level == "error":
             logger.setLevel(logging.ERROR)
+    # wire log goes to stdout too, keep it out of printed filenames
+    WIRE_LOG.configure(log_http and not only_print_filenames, log_http_sample)
 
     with logging_redirect_tqdm():
         # check required directory param only if not list albums
@@ -644,6 +782,19 @@ def main(
             print("--auto-delete and --delete-after-download are mutually exclusive")
             sys.exit(2)
 
+        if audit and (
+            watch_with_interval
+            or only_print_filenames
+            or until_found is not None
+            or auto_delete
+            or delete_after_download
+        ):
+            print(
+                "--audit is not compatible with --watch-with-interval, --only-print-filenames, "
+                "--until-found, --auto-delete, --delete-after-download"
+            )
+            sys.exit(2)
+
         if watch_with_interval and (list_albums or only_print_filenames):  # pragma: no cover
             print(
                 "--watch_with_interval is not compatible with --list_albums, --only_print_filenames"
@@ -718,6 +869,20 @@ def main(
             file_match_policy=file_match_policy,
             mfa_provider=mfa_provider,
             use_os_locale=use_os_locale,
+            content_store=content_store,
+            content_store_link=content_store_link,
+            audit=audit,
+            audit_hash=audit_hash,
+            audit_hash_limit=audit_hash_limit,
+            log_http=log_http,
+            log_http_sample=log_http_sample,
+            session_freshness=session_freshness,
+            event_log=event_log,
+            timing_report=timing_report,
+            profile=profile,
+            profile_format=profile_format,
+            profile_memory=profile_memory,
+            profile_time_limit=profile_time_limit,
         )
         status_exchange.set_config(config)
 
@@ -738,64 +903,103 @@ def main(
             )
 
         # start web server
-        if mfa_provider == MFAProvider.WEBUI:
+        if mfa_provider == MFAProvider.WEBUI or web_ui:
+            # Flask and waitress are only loaded when the web UI is used
+            from icloudpd.server import serve_app
+
             server_thread = Thread(target=serve_app, daemon=True, args=[logger, status_exchange])
             server_thread.start()
 
-        result = core(
-            download_builder(
+        mirror_audit = (
+            MirrorAudit(
                 logger,
-                skip_videos,
-                folder_structure,
                 directory,
+                folder_structure,
                 size,
                 force_size,
-                only_print_filenames,
-                set_exif_datetime,
+                skip_videos,
                 skip_live_photos,
                 live_photo_size,
-                dry_run,
                 file_match_policy,
+                content_store,
             )
-            if directory is not None
-            else (lambda _s: lambda _c, _p: False),
-            directory,
-            username,
-            auth_only,
-            cookie_directory,
-            size,
-            recent,
-            until_found,
-            album,
-            list_albums,
-            library,
-            list_libraries,
-            skip_videos,
-            auto_delete,
-            only_print_filenames,
-            folder_structure,
-            smtp_username,
-            smtp_password,
-            smtp_host,
-            smtp_port,
-            smtp_no_tls,
-            notification_email,
-            notification_email_from,
-            no_progress_bar,
-            notification_script,
-            delete_after_download,
-            domain,
-            logger,
-            watch_with_interval,
-            dry_run,
-            filename_cleaner,
-            lp_filename_generator,
-            raw_policy,
-            file_match_policy,
-            password_providers,
-            mfa_provider,
-            status_exchange,
+            if audit and directory is not None and not list_albums and not list_libraries
+            else None
         )
+
+        with EVENT_LOG.recording(logger, event_log, dry_run=dry_run), profiled(
+            logger, profile, profile_format, profile_memory, profile_time_limit
+        ):
+            result = core(
+                mirror_audit.builder
+                if mirror_audit is not None
+                else download_builder(
+                    logger,
+                    skip_videos,
+                    folder_structure,
+                    directory,
+                    size,
+                    force_size,
+                    only_print_filenames,
+                    set_exif_datetime,
+                    skip_live_photos,
+                    live_photo_size,
+                    dry_run,
+                    file_match_policy,
+                    content_store,
+                    content_store_link,
+                )
+                if directory is not None
+                else (lambda _s: lambda _c, _p: False),
+                directory,
+                username,
+                auth_only,
+                cookie_directory,
+                size,
+                recent,
+                until_found,
+                album,
+                list_albums,
+                library,
+                list_libraries,
+                skip_videos,
+                auto_delete,
+                only_print_filenames,
+                folder_structure,
+                smtp_username,
+                smtp_password,
+                smtp_host,
+                smtp_port,
+                smtp_no_tls,
+                notification_email,
+                notification_email_from,
+                no_progress_bar,
+                notification_script,
+                delete_after_download,
+                domain,
+                logger,
+                watch_with_interval,
+                dry_run,
+                filename_cleaner,
+                lp_filename_generator,
+                raw_policy,
+                file_match_policy,
+                password_providers,
+                mfa_provider,
+                status_exchange,
+                session_freshness,
+                timing_report,
+                # symlinks do not count as links, so --auto-delete cannot tell unused store files
+                content_store if content_store_link == "hardlink" else None,
+                # set by icloudpd.daemon to keep authenticated services between runs
+                typing.cast(Optional[ServiceCache], click.get_current_context().find_object(dict)),
+            )
+            if result == 0 and mirror_audit is not None and not auth_only:
+                if audit_hash:
+                    mirror_audit.verify_hashes(
+                        None if audit_hash_limit is None else audit_hash_limit * 1024 * 1024
+                    )
+                result = mirror_audit.report(recent is None)
         sys.exit(result)
 
 
@@ -812,10 +1016,92 @@ def download_builder(
     live_photo_size: LivePhotoVersionSize,
     dry_run: bool,
     file_match_policy: FileMatchPolicy,
+    content_store: Optional[str],
+    content_store_link: str,
 ) -> Callable[[PyiCloudService], Callable[[Counter, PhotoAsset], bool]]:
     """factory for downloader"""
 
     def state_(icloud: PyiCloudService) -> Callable[[Counter, PhotoAsset], bool]:
+        # content already present locally in this run: checksum (or url) -> path and the
+        # created date `finish` was applied with, None if nothing was written to it
+        local_content: Dict[str, Tuple[str, Optional[datetime.datetime]]] = {}
+
+        def remember_content(
+            version: AssetVersion, path: str, finished_as: Optional[datetime.datetime]
+        ) -> None:
+            local_content[version.checksum or version.url] = (path, finished_as)
+
+        def materialize_media(
+            photo: PhotoAsset,
+            download_path: str,
+            version: AssetVersion,
+            size: VersionSize,
+            finish: Optional[Callable[[str], None]],
+            created_date: datetime.datetime,
+        ) -> bool:
+            """Link identical content written before or download it.
+
+            `finish` writes to the new file (EXIF, file times) from `created_date`. Linked files
+            share content with another file, so it is applied to content store files before they
+            are linked, and shares a hardlink only with a file it was applied to with the same
+            date, as it then writes what is there already.
+            """
+            started = time.monotonic()
+            if content_store is not None:
+                store_path = download.content_store_path(content_store, version)
+                if store_path is not None:
+                    stored = os.path.isfile(store_path)
+                    if not stored:
+                        if not download.download_media(
+                            logger, dry_run, icloud, photo, store_path, version, size
+                        ):
+                            return False
+                        if not dry_run:
+                            if finish is not None:
+                                finish(store_path)
+                            download.seal_stored_file(logger, store_path)
+                    linked = download.link_media(
+                        logger,
+                        dry_run,
+                        store_path,
+                        download_path,
+                        content_store_link == "symlink",
+                    )
+                    if not linked:
+                        download.FAILURES.inc()
+                        emit_version(
+                            "failed", photo, version, size, download_path, started, reason="link"
+                        )
+                    elif stored:
+                        emit_version(
+                            "deduplicated",
+                            photo,
+                            version,
+                            size,
+                            download_path,
+                            started,
+                            source=store_path,
+                        )
+                    return linked
+            source = local_content.get(version.checksum or version.url)
+            if source is not None and download.clone_media(
+                logger,
+                dry_run,
+                source[0],
+                download_path,
+                may_share=source[1] == (None if finish is None else created_date),
+            ):
+                emit_version(
+                    "deduplicated", photo, version, size, download_path, started, source=source[0]
+                )
+            elif not download.download_media(
+                logger, dry_run, icloud, photo, download_path, version, size
+            ):
+                return False
+            if finish is not None and not dry_run:
+                finish(download_path)
+            return True
+
         def download_photo_(counter: Counter, photo: PhotoAsset) -> bool:
             """internal function for actually downloading the photos"""
 
@@ -834,27 +1120,9 @@ def download_builder(
             #         photo.item_type,
             #     )
             #     return False
-            try:
-                created_date = photo.created.astimezone(get_localzone())
-            except (ValueError, OSError):
-                logger.error(
-                    "Could not convert photo created date to local timezone (%s)", photo.created
-                )
-                created_date = photo.created
-
-            if folder_structure.lower() == "none":
-                date_path = ""
-            else:
-                try:
-                    date_path = folder_structure.format(created_date)
-                except ValueError:  # pragma: no cover
-                    # This error only seems to happen in Python 2
-                    logger.error("Photo created date was not valid (%s)", photo.created)
-                    # e.g. ValueError: year=5 is before 1900
-                    # (https://github.com/icloud-photos-downloader/icloud_photos_downloader/issues/122)
-                    # Just use the Unix epoch
-                    created_date = datetime.datetime.fromtimestamp(0)
-                    date_path = folder_structure.format(created_date)
+            created_date, download_dir = asset_download_dir(
+                logger, photo, folder_structure, directory
+            )
 
             try:
                 versions = disambiguate_filenames(photo.versions, primary_sizes)
@@ -883,48 +1151,56 @@ def download_builder(
                 )
                 return False
 
-            download_dir = os.path.normpath(os.path.join(directory, date_path))
-            success = False
+            def finish(path: str) -> None:
+                """Sets EXIF date and file times of a new primary version file"""
+                if set_exif_datetime and path.lower().endswith((".jpg", ".jpeg")):
+                    with phase("exif"):
+                        if not exif_datetime.get_photo_exif(logger, path):
+                            # %Y:%m:%d looks wrong, but it's the correct format
+                            date_str = created_date.strftime("%Y-%m-%d %H:%M:%S%z")
+                            logger.debug(
+                                "Setting EXIF timestamp for %s: %s",
+                                path,
+                                date_str,
+                            )
+                            exif_datetime.set_photo_exif(
+                                logger,
+                                path,
+                                created_date.strftime("%Y:%m:%d %H:%M:%S"),
+                            )
+                with phase("set_utime"):
+                    download.set_utime(path, created_date)
 
-            for download_size in primary_sizes:
-                if download_size not in versions and download_size != AssetVersionSize.ORIGINAL:
-                    if force_size:
-                        logger.error(
-                            "%s size does not exist for %s. Skipping...",
-                            download_size.value,
-                            photo.filename,
-                        )
-                        continue
-                    if AssetVersionSize.ORIGINAL in primary_sizes:
-                        continue  # that should avoid double download for original
-                    download_size = AssetVersionSize.ORIGINAL
+            success = False
 
+            for download_size in primary_download_sizes(
+                logger, photo, versions, primary_sizes, force_size
+            ):
                 version = versions[download_size]
                 filename = version.filename
 
-                download_path = local_download_path(filename, download_dir)
-
-                original_download_path = None
-                file_exists = os.path.isfile(download_path)
-                if not file_exists and download_size == AssetVersionSize.ORIGINAL:
-                    # Deprecation - We used to download files like IMG_1234-original.jpg,
-                    # so we need to check for these.
-                    # Now we match the behavior of iCloud for Windows: IMG_1234.jpg
-                    original_download_path = add_suffix_to_filename("-original", download_path)
-                    file_exists = os.path.isfile(original_download_path)
-
-                if file_exists:
-                    if file_match_policy == FileMatchPolicy.NAME_SIZE_DEDUP_WITH_SUFFIX:
-                        # for later: this crashes if download-size medium is specified
-                        file_size = os.stat(original_download_path or download_path).st_size
-                        photo_size = version.size
-                        if file_size != photo_size:
-                            download_path = (f"-{photo_size}.").join(download_path.rsplit(".", 1))
-                            logger.debug("%s deduplicated", truncate_middle(download_path, 96))
-                            file_exists = os.path.isfile(download_path)
-                    if file_exists:
-                        counter.increment()
-                        logger.debug("%s already exists", truncate_middle(download_path, 96))
+                check_started = time.monotonic()
+                with phase("existence_check", EXISTENCE_CHECK_SECONDS):
+                    download_path, existing_path = existing_download_path(
+                        logger,
+                        local_download_path(filename, download_dir),
+                        version,
+                        download_size,
+                        file_match_policy,
+                    )
+                file_exists = existing_path is not None
+                if existing_path is not None:
+                    counter.increment()
+                    logger.debug("%s already exists", truncate_middle(download_path, 96))
+                    remember_content(version, existing_path, None)
+                    emit_version(
+                        "skipped_existing",
+                        photo,
+                        version,
+                        download_size,
+                        existing_path,
+                        check_started,
+                    )
 
                 if not file_exists:
                     counter.reset()
@@ -934,78 +1210,47 @@ def download_builder(
                         truncated_path = truncate_middle(download_path, 96)
                         logger.debug("Downloading %s...", truncated_path)
 
-                        download_result = download.download_media(
-                            logger, dry_run, icloud, photo, download_path, version, download_size
+                        download_result = materialize_media(
+                            photo, download_path, version, download_size, finish, created_date
                         )
                         success = download_result
 
                         if download_result:
-                            if (
-                                not dry_run
-                                and set_exif_datetime
-                                and filename.lower().endswith((".jpg", ".jpeg"))
-                                and not exif_datetime.get_photo_exif(logger, download_path)
-                            ):
-                                # %Y:%m:%d looks wrong, but it's the correct format
-                                date_str = created_date.strftime("%Y-%m-%d %H:%M:%S%z")
-                                logger.debug(
-                                    "Setting EXIF timestamp for %s: %s", download_path, date_str
-                                )
-                                exif_datetime.set_photo_exif(
-                                    logger,
-                                    download_path,
-                                    created_date.strftime("%Y:%m:%d %H:%M:%S"),
-                                )
-                            if not dry_run:
-                                download.set_utime(download_path, created_date)
+                            remember_content(version, download_path, created_date)
                             logger.info("Downloaded %s", truncated_path)
 
             # Also download the live photo if present
             if not skip_live_photos:
-                lp_size = live_photo_size
-                if lp_size in photo.versions:
-                    version = photo.versions[lp_size]
-                    lp_filename = version.filename
-                    if live_photo_size != LivePhotoVersionSize.ORIGINAL:
-                        # Add size to filename if not original
-                        lp_filename = add_suffix_to_filename(
-                            size_to_suffix(live_photo_size),
-                            lp_filename,
+                live_photo = live_photo_download_path(photo, live_photo_size, download_dir)
+                if live_photo is not None:
+                    version, lp_download_path = live_photo
+                    check_started = time.monotonic()
+                    lp_download_path, lp_existing_path = existing_download_path(
+                        logger, lp_download_path, version, live_photo_size, file_match_policy
+                    )
+                    if lp_existing_path is not None:
+                        logger.debug("%s already exists", truncate_middle(lp_download_path, 96))
+                        remember_content(version, lp_existing_path, None)
+                        emit_version(
+                            "skipped_existing",
+                            photo,
+                            version,
+                            live_photo_size,
+                            lp_existing_path,
+                            check_started,
                         )
-                    else:
-                        pass
-                    lp_download_path = os.path.join(download_dir, lp_filename)
-
-                    lp_file_exists = os.path.isfile(lp_download_path)
-
-                    if only_print_filenames and not lp_file_exists:
+                    elif only_print_filenames:
                         print(lp_download_path)
                     else:
-                        if lp_file_exists:
-                            if file_match_policy == FileMatchPolicy.NAME_SIZE_DEDUP_WITH_SUFFIX:
-                                lp_file_size = os.stat(lp_download_path).st_size
-                                lp_photo_size = version.size
-                                if lp_file_size != lp_photo_size:
-                                    lp_download_path = (f"-{lp_photo_size}.").join(
-                                        lp_download_path.rsplit(".", 1)
-                                    )
-                                    logger.debug(
-                                        "%s deduplicated", truncate_middle(lp_download_path, 96)
-                                    )
-                                    lp_file_exists = os.path.isfile(lp_download_path)
-                            if lp_file_exists:
-                                logger.debug(
-                                    "%s already exists", truncate_middle(lp_download_path, 96)
-                                )
-                        if not lp_file_exists:
-                            truncated_path = truncate_middle(lp_download_path, 96)
-                            logger.debug("Downloading %s...", truncated_path)
-                            download_result = download.download_media(
-                                logger, dry_run, icloud, photo, lp_download_path, version, lp_size
-                            )
-                            success = download_result and success
-                            if download_result:
-                                logger.info("Downloaded %s", truncated_path)
+                        truncated_path = truncate_middle(lp_download_path, 96)
+                        logger.debug("Downloading %s...", truncated_path)
+                        download_result = materialize_media(
+                            photo, lp_download_path, version, live_photo_size, None, created_date
+                        )
+                        success = download_result and success
+                        if download_result:
+                            remember_content(version, lp_download_path, None)
+                            logger.info("Downloaded %s", truncated_path)
             return success
 
         return download_photo_
@@ -1013,22 +1258,25 @@ def download_builder(
     return state_
 
 
-def delete_photo(
+def delete_photos(
     logger: logging.Logger,
     photo_service: PhotosService,
     library_object: PhotoLibrary,
-    photo: PhotoAsset,
+    photos: Sequence[PhotoAsset],
 ) -> None:
-    """Delete a photo from the iCloud account."""
-    clean_filename_local = photo.filename
-    logger.debug("Deleting %s in iCloud...", clean_filename_local)
+    """Delete a batch of photos from the iCloud account with a single request."""
+    if len(photos) == 0:
+        return
+    for photo in photos:
+        logger.debug("Deleting %s in iCloud...", photo.filename)
     url = (
         f"{photo_service._service_endpoint}/records/modify?"
         f"{urllib.parse.urlencode(photo_service.params)}"
     )
     post_data = json.dumps(
         {
-            "atomic": True,
+            # non-atomic, so one stale record does not fail the whole batch
+            "atomic": False,
             "desiredKeys": ["isDeleted"],
             "operations": [
                 {
@@ -1040,12 +1288,60 @@ def delete_photo(
                         "recordType": "CPLAsset",
                     },
                 }
+                for photo in photos
             ],
             "zoneID": library_object.zone_id,
         }
     )
-    photo_service.session.post(url, data=post_data, headers={"Content-type": "application/json"})
-    logger.info("Deleted %s in iCloud", clean_filename_local)
+    response = photo_service.session.post(
+        url, data=post_data, headers={"Content-type": "application/json"}
+    )
+    # only records iCloud confirms count as deleted, anything else is tried again next cycle
+    deleted: Set[str] = set()
+    failed: Dict[str, str] = {}
+    missing = "not in the response"
+    try:
+        body = response.json()
+        records = body.get("records", []) if isinstance(body, dict) else []
+    except ValueError:
+        records = []
+        missing = "unreadable response"
+    for record in records:
+        record_name = record.get("recordName", "")
+        if "serverErrorCode" in record:
+            failed[record_name] = f"{record['serverErrorCode']} {record.get('reason', '')}".strip()
+        else:
+            deleted.add(record_name)
+    for photo in photos:
+        record_name = photo._asset_record["recordName"]
+        if record_name in deleted:
+            UNCONFIRMED_DELETES.discard(record_name)
+            logger.info("Deleted %s in iCloud", photo.filename)
+            EVENT_LOG.emit("deleted", target="icloud", asset=photo.id, filename=photo.filename)
+        else:
+            error = failed.get(record_name, missing)
+            UNCONFIRMED_DELETES.add(record_name)
+            logger.error("Could not delete %s in iCloud: %s", photo.filename, error)
+            download.FAILURES.inc()
+            EVENT_LOG.emit(
+                "failed",
+                target="icloud",
+                asset=photo.id,
+                filename=photo.filename,
+                reason="delete",
+                error=error,
+            )
+
+
+def delete_photos_dry_run(
+    logger: logging.Logger,
+    _photo_service: PhotosService,
+    library_object: PhotoLibrary,
+    photos: Sequence[PhotoAsset],
+) -> None:
+    """Dry run for deleting a batch of photos from the iCloud"""
+    for photo in photos:
+        delete_photo_dry_run(logger, _photo_service, library_object, photo)
 
 
 def delete_photo_dry_run(
@@ -1060,6 +1356,7 @@ def delete_photo_dry_run(
         photo.filename,
         library_object.zone_id["zoneName"],
     )
+    EVENT_LOG.emit("deleted", target="icloud", asset=photo.id, filename=photo.filename)
 
 
 RetrierT = TypeVar("RetrierT")
@@ -1119,6 +1416,72 @@ def internal_error_handle_builder(logger: logging.Logger) -> Callable[[Exception
     return internal_error_handler
 
 
+def remote_delete_builder(
+    logger: logging.Logger,
+    dry_run: bool,
+    photo_service: PhotosService,
+    library_object: PhotoLibrary,
+    error_handler: Callable[[Exception, int], None],
+) -> Callable[[Sequence[PhotoAsset]], None]:
+    """Build batch deleter for iCloud that retries on session and internal errors"""
+
+    def remote_delete(photos: Sequence[PhotoAsset]) -> None:
+        delete_local = partial(
+            delete_photos_dry_run if dry_run else delete_photos,
+            logger,
+            photo_service,
+            library_object,
+            photos,
+        )
+
+        with phase("remote_delete"):
+            retrier(delete_local, error_handler)
+
+    return remote_delete
+
+
+def report_phases(
+    logger: logging.Logger, since: Snapshot, wall_seconds: float, timing_report: Optional[str]
+) -> None:
+    """Logs the time per phase since `since` and writes it to `timing_report` as JSON"""
+    stats = phase_stats(since)
+    logger.debug(
+        "Time per phase in %.1f sec (phases can nest):\n%s",
+        wall_seconds,
+        format_phase_table(stats),
+    )
+    if timing_report is not None:
+        try:
+            with open(timing_report, "w", encoding="utf-8") as report_file:
+                json.dump(phase_report(stats, wall_seconds), report_file, indent=2)
+        except OSError as error:
+            logger.warning("Could not write timing report %s: %s", timing_report, error)
+
+
+def download_urls(photo: PhotoAsset) -> Sequence[str]:
+    """Urls of all versions of the asset, empty if the record is incomplete"""
+    try:
+        return [version.url for version in photo.versions.values()]
+    except KeyError:
+        # reported by the downloader
+        return []
+
+
+def transfer_listener_builder(
+    status_exchange: StatusExchange, progress_bar: "Optional[tqdm[NoReturn]]"
+) -> Callable[[TransferSnapshot], None]:
+    """Build listener showing bytes transferred in the web UI and the progress bar"""
+
+    def show_transfer(transfer: TransferSnapshot) -> None:
+        status_exchange.get_progress().transfer = transfer
+        if progress_bar is not None:
+            if transfer.bytes_remaining is not None:
+                progress_bar.total = transfer.bytes_done + transfer.bytes_remaining
+            progress_bar.update(transfer.bytes_done - progress_bar.n)
+
+    return show_transfer
+
+
 def compose_handlers(
     handlers: Sequence[Callable[[Exception, int], None]],
 ) -> Callable[[Exception, int], None]:
@@ -1171,31 +1534,42 @@ def core(
     ],
     mfa_provider: MFAProvider,
     status_exchange: StatusExchange,
+    session_freshness: int,
+    timing_report: Optional[str],
+    content_store: Optional[str],
+    services: Optional[ServiceCache],
 ) -> int:
     """Download all iCloud photos to a local directory"""
 
+    # time per phase is reported for each cycle, the first one includes authentication
+    phases_since = phase_snapshot()
+    cycle_started = time.monotonic()
+
     raise_error_on_2sa = (
         smtp_username is not None
         or notification_email is not None
         or notification_script is not None
     )
     try:
-        icloud = authenticator(
-            logger,
-            domain,
-            filename_cleaner,
-            lp_filename_generator,
-            raw_policy,
-            file_match_policy,
-            password_providers,
-            mfa_provider,
-            status_exchange,
-        )(
-            username,
-            cookie_directory,
-            raise_error_on_2sa,
-            os.environ.get("CLIENT_ID"),
-        )
+        with phase("authenticate"):
+            icloud = authenticator(
+                logger,
+                domain,
+                filename_cleaner,
+                lp_filename_generator,
+                raw_policy,
+                file_match_policy,
+                password_providers,
+                mfa_provider,
+                status_exchange,
+                session_freshness,
+                services,
+            )(
+                username,
+                cookie_directory,
+                raise_error_on_2sa,
+                os.environ.get("CLIENT_ID"),
+            )
     except TwoStepAuthRequiredError:
         if notification_script is not None:
             subprocess.call([notification_script])
@@ -1220,6 +1594,62 @@ def core(
 
     # Access to the selected library. Defaults to the primary photos object.
     library_object: PhotoLibrary = icloud.photos
+    # one download url per content host seen in the last cycle
+    warm_up_urls: Sequence[str] = []
+    # album signature when the last complete cycle started (--watch-with-interval)
+    last_probe: Optional[Tuple[int, Sequence[Tuple[str, str]]]] = None
+    cycles_since_scan = 0
+
+    def wait_for_next_cycle(watch_interval: int, skip_bar: bool) -> None:  # pragma: no cover
+        # persist session changes before idling, they would wait for the next request
+        icloud.session.flush()
+        logger.info(f"Waiting for {watch_interval} sec...")
+        progress = status_exchange.get_progress()
+        # published once, the web UI counts down to it
+        progress.waiting = watch_interval
+        deadline = time.monotonic() + watch_interval
+        warm_up = watch_interval > constants.WARM_UP_LEAD_SECONDS
+        # the terminal counts down to the same deadline, without publishing every second
+        countdown = (
+            None
+            if skip_bar
+            else tqdm(
+                total=watch_interval,
+                desc="Waiting...",
+                ascii=True,
+                leave=False,
+                dynamic_ncols=True,
+            )
+        )
+
+        def wait_until(until: float) -> bool:
+            # returns as soon as resume is requested from the web UI
+            while True:
+                left = until - time.monotonic()
+                if countdown is not None:
+                    countdown.update(watch_interval - progress.waiting - countdown.n)
+                if left <= 0:
+                    return False
+                if progress.wait_for_resume(
+                    left
+                    if countdown is None
+                    else min(left, constants.WAIT_COUNTDOWN_REFRESH_SECONDS)
+                ):
+                    return True
+
+        try:
+            resumed = wait_until(deadline - constants.WARM_UP_LEAD_SECONDS if warm_up else deadline)
+            if not resumed and warm_up:
+                # pooled connections are likely dropped after a long wait
+                icloud.session.warm_up(warm_up_urls)
+                resumed = wait_until(deadline)
+        finally:
+            if countdown is not None:
+                countdown.close()
+        if resumed:
+            progress.reset()
+        else:
+            progress.waiting = 0
 
     if list_libraries:
         libraries_dict = icloud.photos.libraries
@@ -1239,7 +1669,12 @@ def core(
                     except KeyError:
                         logger.error("Unknown library: %s", library)
                         return 1
-                photos = library_object.albums[album]
+                albums_by_name = library_object.albums
+                try:
+                    photos = albums_by_name[album]
+                except KeyError:
+                    logger.error("Unknown album: %s", album)
+                    return 1
             except PyiCloudAPIResponseException as err:
                 # For later: come up with a nicer message to the user. For now take the
                 # exception text
@@ -1267,6 +1702,33 @@ def core(
 
             photos.exception_handler = error_handler
 
+            # Skip the one-line progress bar if we're only printing the filenames,
+            # or if the progress bar is explicitly disabled,
+            # or if this is not a terminal (e.g. cron or piping output to file)
+            skip_bar = not os.environ.get("FORCE_TQDM") and (
+                only_print_filenames or no_progress_bar or not sys.stdout.isatty()
+            )
+
+            probe: Optional[Tuple[int, Sequence[Tuple[str, str]]]] = None
+            if watch_interval:  # pragma: no cover
+                try:
+                    # also refreshes the item count used below
+                    probe = photos.change_probe(constants.WATCH_PROBE_ASSETS)
+                except (PyiCloudAPIResponseException, KeyError, IndexError) as err:
+                    logger.debug("Could not probe for changes, listing everything: %s", err)
+                if (
+                    probe is not None
+                    and probe == last_probe
+                    and cycles_since_scan < constants.WATCH_FULL_SCAN_EVERY
+                ):
+                    logger.info("No changes in iCloud since the last check")
+                    cycles_since_scan += 1
+                    wait_for_next_cycle(watch_interval, skip_bar)
+                    # nothing to report, but the next cycle is timed from here
+                    phases_since = phase_snapshot()
+                    cycle_started = time.monotonic()
+                    continue
+
             photos_count: Optional[int] = len(photos)
 
             photos_enumerator: Iterable[PhotoAsset] = photos
@@ -1281,24 +1743,22 @@ def core(
                 # ensure photos iterator doesn't have a known length
                 photos_enumerator = (p for p in photos_enumerator)
 
-            # Skip the one-line progress bar if we're only printing the filenames,
-            # or if the progress bar is explicitly disabled,
-            # or if this is not a terminal (e.g. cron or piping output to file)
-            skip_bar = not os.environ.get("FORCE_TQDM") and (
-                only_print_filenames or no_progress_bar or not sys.stdout.isatty()
-            )
-            if skip_bar:
-                photos_enumerator = photos_enumerator
-                # logger.set_tqdm(None)
-            else:
-                photos_enumerator = tqdm(
-                    iterable=photos_enumerator,
-                    total=photos_count,
+            # counts bytes, so a large video weighs more than a screenshot
+            progress_bar = (
+                None
+                if skip_bar
+                else tqdm(
+                    unit="B",
+                    unit_scale=True,
+                    unit_divisor=1024,
                     leave=False,
                     dynamic_ncols=True,
                     ascii=True,
                 )
-                # logger.set_tqdm(photos_enumerator)
+            )
+
+            download.TRANSFER.start(photos_count)
+            download.TRANSFER.listener = transfer_listener_builder(status_exchange, progress_bar)
 
             if photos_count is not None:
                 plural_suffix = "" if photos_count == 1 else "s"
@@ -1330,41 +1790,70 @@ def core(
                 0 if photos_count is None else photos_count
             )
             photos_counter = 0
+            failures_before = download.FAILURES.value()
 
             photos_iterator = iter(photos_enumerator)
-            while True:
-                try:
-                    if should_break(consecutive_files_found):
-                        logger.info(
-                            "Found %s consecutive previously downloaded photos. Exiting",
-                            until_found,
-                        )
-                        break
-                    item = next(photos_iterator)
-                    if download_photo(consecutive_files_found, item) and delete_after_download:
-                        delete_local = partial(
-                            delete_photo_dry_run if dry_run else delete_photo,
-                            logger,
-                            icloud.photos,
-                            library_object,
-                            item,
-                        )
-
-                        retrier(delete_local, error_handler)
+            with DeletionQueue(
+                remote_delete_builder(
+                    logger, dry_run, icloud.photos, library_object, error_handler
+                ),
+                logger=logger,
+            ) as deletion_queue:
+                while True:
+                    try:
+                        if should_break(consecutive_files_found):
+                            logger.info(
+                                "Found %s consecutive previously downloaded photos. Exiting",
+                                until_found,
+                            )
+                            break
+                        item = next(photos_iterator)
+                        if photos_counter == 0 and not dry_run and not only_print_filenames:
+                            # content host is known now, connect while the first asset is checked
+                            warm_up_urls = download_urls(item)
+                            icloud.session.warm_up(warm_up_urls)
+                        status_exchange.get_progress().current_file = item.filename
+                        downloaded = download_photo(consecutive_files_found, item)
+                        if delete_after_download and (
+                            downloaded or item._asset_record["recordName"] in UNCONFIRMED_DELETES
+                        ):
+                            deletion_queue.add(item)
+                        else:
+                            deletion_queue.flush_if_due()
+
+                        photos_counter += 1
+                        with status_exchange.lock:
+                            # updated together, so a snapshot never mixes them
+                            status_exchange.get_progress().photos_counter = photos_counter
+                            download.TRANSFER.asset_done()
+                        # the listener updates the progress bar, not to be done under the lock
+                        download.TRANSFER.notify()
+                        if progress_bar is not None:
+                            progress_bar.set_postfix_str(
+                                f"{photos_counter}/{photos_count or '?'}", refresh=False
+                            )
+                        if photos_count is not None:
+                            QUEUE_DEPTH.set(max(photos_count - photos_counter, 0), "assets")
 
-                    photos_counter += 1
-                    status_exchange.get_progress().photos_counter = photos_counter
+                        if status_exchange.get_progress().cancel:
+                            break
 
-                    if status_exchange.get_progress().cancel:
+                    except StopIteration:
                         break
+            # warm-ups end with their cycle
+            icloud.session.join_warm_ups()
 
-                except StopIteration:
-                    break
+            download.TRANSFER.listener = None
+            if progress_bar is not None:
+                progress_bar.close()
 
             if only_print_filenames:
                 return 0
 
-            if status_exchange.get_progress().cancel:
+            QUEUE_DEPTH.set(0, "assets")
+            cancelled = status_exchange.get_progress().cancel
+            failed = download.FAILURES.value() != failures_before
+            if cancelled:
                 logger.info("Iteration was cancelled")
                 status_exchange.get_progress().photos_last_message = "Iteration was cancelled"
             else:
@@ -1372,36 +1861,33 @@ def core(
                 status_exchange.get_progress().photos_last_message = (
                     "All photos have been downloaded"
                 )
+                if not failed:
+                    LAST_SUCCESSFUL_SYNC.set(time.time())
             status_exchange.get_progress().reset()
 
             if auto_delete:
-                autodelete_photos(
-                    logger, dry_run, library_object, folder_structure, directory, primary_sizes
-                )
+                with phase("autodelete"):
+                    autodelete_photos(
+                        logger,
+                        dry_run,
+                        library_object,
+                        folder_structure,
+                        directory,
+                        primary_sizes,
+                        content_store,
+                    )
+
+            report_phases(logger, phases_since, time.monotonic() - cycle_started, timing_report)
+            phases_since = phase_snapshot()
+            cycle_started = time.monotonic()
+            write_profile()
 
             if watch_interval:  # pragma: no cover
-                logger.info(f"Waiting for {watch_interval} sec...")
-                interval: Sequence[int] = range(1, watch_interval)
-                iterable: Sequence[int] = (
-                    interval
-                    if skip_bar
-                    else typing.cast(
-                        Sequence[int],
-                        tqdm(
-                            iterable=interval,
-                            desc="Waiting...",
-                            ascii=True,
-                            leave=False,
-                            dynamic_ncols=True,
-                        ),
-                    )
-                )
-                for counter in iterable:
-                    status_exchange.get_progress().waiting = watch_interval - counter
-                    if status_exchange.get_progress().resume:
-                        status_exchange.get_progress().reset()
-                        break
-                    time.sleep(1)
+                # a failed file has to be tried again, even if nothing changed in iCloud
+                if not cancelled and not failed:
+                    last_probe = probe
+                    cycles_since_scan = 0
+                wait_for_next_cycle(watch_interval, skip_bar)
             else:
                 break  # pragma: no cover
 
@@ -50,6 +50,20 @@ class Config:
         file_match_policy: FileMatchPolicy,
         mfa_provider: MFAProvider,
         use_os_locale: bool,
+        content_store: Optional[str],
+        content_store_link: str,
+        audit: bool,
+        audit_hash: bool,
+        audit_hash_limit: Optional[int],
+        log_http: bool,
+        log_http_sample: int,
+        session_freshness: int,
+        event_log: Optional[str],
+        timing_report: Optional[str],
+        profile: Optional[str],
+        profile_format: str,
+        profile_memory: Optional[str],
+        profile_time_limit: Optional[int],
     ):
         self.directory = directory
         self.username = username
@@ -89,3 +103,17 @@ class Config:
         self.file_match_policy = file_match_policy
         self.mfa_provider = mfa_provider
         self.use_os_locale = use_os_locale
+        self.content_store = content_store
+        self.content_store_link = content_store_link
+        self.audit = audit
+        self.audit_hash = audit_hash
+        self.audit_hash_limit = audit_hash_limit
+        self.log_http = log_http
+        self.log_http_sample = log_http_sample
+        self.session_freshness = session_freshness
+        self.event_log = event_log
+        self.timing_report = timing_report
+        self.profile = profile
+        self.profile_format = profile_format
+        self.profile_memory = profile_memory
+        self.profile_time_limit = profile_time_limit
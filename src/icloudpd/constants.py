@@ -5,3 +5,58 @@ from typing import Final
 # For retrying connection after timeouts and errors
 MAX_RETRIES: Final[int] = 5
 WAIT_SECONDS: Final[int] = 5
+
+# For batching remote deletions (--delete-after-download)
+DELETE_BATCH_SIZE: Final[int] = 100
+DELETE_FLUSH_SECONDS: Final[int] = 30
+
+# For deleting local files found in "Recently Deleted" (--auto-delete)
+AUTODELETE_WORKERS: Final[int] = 8
+AUTODELETE_VERBOSE_LIMIT: Final[int] = 100
+
+# For hashing files during the mirror audit (--audit-hash)
+AUDIT_HASH_WORKERS: Final[int] = 4
+AUDIT_HASH_CHUNK_SIZE: Final[int] = 1024 * 1024
+AUDIT_STATE_FILENAME: Final[str] = ".icloudpd-audit.json"
+AUDIT_STATE_SAVE_EVERY: Final[int] = 100
+
+# Seconds before the end of --watch-with-interval wait to reconnect to content hosts
+WARM_UP_LEAD_SECONDS: Final[int] = 15
+
+# Seconds between refreshes of the terminal countdown of the --watch-with-interval wait
+WAIT_COUNTDOWN_REFRESH_SECONDS: Final[int] = 1
+
+# Newest assets compared before each --watch-with-interval cycle, and how many cycles
+# in a row may be skipped as unchanged before everything is listed again
+WATCH_PROBE_ASSETS: Final[int] = 10
+WATCH_FULL_SCAN_EVERY: Final[int] = 24
+
+# Unix socket of the daemon (icloudpd_ex daemon/client), relative to home
+DAEMON_SOCKET_PATH: Final[str] = "~/.pyicloud/icloudpd.sock"
+
+# Web UI progress stream: least seconds between two events, and seconds between
+# keep-alive comments when nothing changes
+PROGRESS_STREAM_INTERVAL_SECONDS: Final[float] = 0.5
+PROGRESS_STREAM_KEEPALIVE_SECONDS: Final[float] = 15
+
+# Seconds a progress stream stays open; the browser reconnects and gets all fields again
+PROGRESS_STREAM_MAX_SECONDS: Final[float] = 300
+
+# Web server threads; each open progress stream holds one, so form posts need spare ones
+WEB_SERVER_THREADS: Final[int] = 16
+
+# Profiling (--profile, --profile-memory): seconds between stack samples, seconds between
+# memory checks, growth of traced memory that triggers a new snapshot, and sites reported
+PROFILE_SAMPLE_INTERVAL_SECONDS: Final[float] = 0.005
+PROFILE_MEMORY_CHECK_SECONDS: Final[float] = 0.5
+PROFILE_MEMORY_GROWTH: Final[float] = 1.05
+PROFILE_MEMORY_TOP: Final[int] = 25
+
+# Most events written at once by the --event-log writer
+EVENT_LOG_BATCH_SIZE: Final[int] = 1000
+
+# Byte progress of downloads: bytes written before a download reports them, least seconds
+# between updates of the progress bar and web UI, and seconds the transfer rate covers
+TRANSFER_REPORT_BYTES: Final[int] = 1024 * 1024
+TRANSFER_NOTIFY_SECONDS: Final[float] = 0.25
+TRANSFER_RATE_WINDOW_SECONDS: Final[float] = 10
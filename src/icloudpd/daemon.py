@@ -0,0 +1,326 @@
+"""
+Long-lived process that keeps authenticated iCloud services and runs icloudpd commands
+sent over a Unix socket, so frequent runs skip start-up, imports and session validation
+"""
+
+import contextlib
+import io
+import json
+import logging
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+import click
+
+from icloudpd.authentication import ServiceCache
+from icloudpd.status import StatusExchange
+
+# commands a client can send
+COMMANDS = ["sync", "list", "status", "stop"]
+
+
+class Account(NamedTuple):
+    """One account synced on schedule: a name for status and output, and icloudpd options"""
+
+    name: str
+    args: List[str]
+
+
+def load_accounts(path: str) -> List[Account]:
+    """Reads `[{"name": ..., "args": [...]}, ...]`; each account needs its own
+    --username, --cookie-directory and --directory in args"""
+    with open(path, encoding="utf-8") as accounts_file:
+        entries = json.load(accounts_file)
+    if not isinstance(entries, list):
+        raise ValueError(f"{path} must contain a list of accounts")
+    accounts = []
+    for entry in entries:
+        if (
+            not isinstance(entry, dict)
+            or not isinstance(entry.get("name"), str)
+            or not isinstance(entry.get("args"), list)
+        ):
+            raise ValueError(f"Every account in {path} needs a name and a list of args")
+        accounts.append(Account(entry["name"], [str(arg) for arg in entry["args"]]))
+    names = [account.name for account in accounts]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Account names in {path} must be unique")
+    return accounts
+
+
+class ClientStream(io.StringIO):
+    """Sends everything written to it to the client, one line at a time"""
+
+    def __init__(self, send: Callable[[Dict[str, Any]], None]) -> None:
+        super().__init__()
+        self.send = send
+        self.pending = ""
+
+    def write(self, text: str) -> int:
+        self.pending += text
+        *lines, self.pending = self.pending.split("\n")
+        for line in lines:
+            self.send({"output": line})
+        return len(text)
+
+    def flush(self) -> None:
+        if self.pending:
+            self.send({"output": self.pending})
+            self.pending = ""
+
+
+class DaemonRunningError(Exception):
+    """
+    Raised when another daemon is listening on the socket. Taking the socket over would
+    leave both scheduling syncs of the same accounts.
+    """
+
+
+def socket_in_use(socket_path: str) -> bool:
+    """Whether a process accepts connections on `socket_path`; False for a stale socket"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            return False
+    return True
+
+
+class Daemon:
+    """Runs `command` (icloudpd main) for clients, one run at a time, sharing authenticated
+    services, their photo catalogs and connection pools between runs.
+
+    Runs must stay serialized (`run_lock`): the root logger handlers, redirected stdout,
+    the wire log and the event log a run configures are process-global, so concurrent runs
+    would write into each other's output and logs.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        command: click.Command,
+        socket_path: str,
+        accounts: Sequence[Account] = (),
+        interval: Optional[int] = None,
+    ) -> None:
+        self.logger = logger
+        self.command = command
+        self.socket_path = os.path.expanduser(socket_path)
+        self.accounts = accounts
+        self.interval = interval
+        self.services: ServiceCache = {}
+        self.run_lock = threading.Lock()
+        self.started = time.time()
+        self.runs = 0
+        self.running: Optional[List[str]] = None
+        self.server: Optional[socketserver.UnixStreamServer] = None
+        self.stopping = threading.Event()
+        # per-account state, also served by the web UI
+        self.status_exchange = StatusExchange()
+        for account in accounts:
+            self.status_exchange.update_account(
+                account.name,
+                running=False,
+                runs=0,
+                last_exit=None,
+                last_started=None,
+                duration=None,
+            )
+        self.console = sys.stdout
+
+    def run(self, args: List[str], send: Callable[[Dict[str, Any]], None]) -> int:
+        """Runs icloudpd with `args`, streaming its output and log to the client"""
+        if "--watch-with-interval" in args:
+            send({"output": "--watch-with-interval is not supported by the daemon"})
+            return 2
+        # not only for the shared services: logging and stdout are swapped for the whole process
+        with self.run_lock:
+            self.running = args
+            # albums, libraries and counts may have changed in iCloud since the last run
+            for icloud in self.services.values():
+                icloud.refresh_photos()
+            stream = ClientStream(send)
+            handler = logging.StreamHandler(stream)
+            handler.setFormatter(
+                logging.Formatter("%(asctime)s %(levelname)-8s %(message)s", "%Y-%m-%d %H:%M:%S")
+            )
+            # the run's log goes to its requester only
+            root = logging.getLogger()
+            console_handlers = root.handlers[:]
+            for console_handler in console_handlers:
+                root.removeHandler(console_handler)
+            root.addHandler(handler)
+            try:
+                with contextlib.redirect_stdout(stream):
+                    try:
+                        result = self.command.main(
+                            args, prog_name="icloudpd", standalone_mode=False, obj=self.services
+                        )
+                        exit_code = result if isinstance(result, int) else 0
+                    except SystemExit as error:
+                        exit_code = error.code if isinstance(error.code, int) else 1
+                    except click.ClickException as error:
+                        print(error.format_message())
+                        exit_code = error.exit_code
+                    except Exception as error:
+                        self.logger.exception("Run failed")
+                        print(f"Run failed: {error}")
+                        exit_code = 1
+                    stream.flush()
+            finally:
+                root.removeHandler(handler)
+                for console_handler in console_handlers:
+                    root.addHandler(console_handler)
+                self.running = None
+                self.runs += 1
+            return exit_code
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "uptime_seconds": round(time.time() - self.started),
+            "runs": self.runs,
+            "running": self.running,
+            "accounts": sorted({username for username, _, _ in self.services}),
+            "schedule": self.status_exchange.get_accounts(),
+        }
+
+    def run_scheduled(self) -> None:
+        """Syncs every account in turn, every `interval` seconds, until the daemon stops.
+
+        Runs share the daemon's single run slot with client commands, so accounts never
+        download at the same time. The account that went first goes last in the next
+        cycle, so a slow or failing account cannot keep delaying the same others.
+        """
+        order = list(self.accounts)
+        while not self.stopping.is_set():
+            for account in order:
+                if self.stopping.is_set():
+                    return
+                runs = self.status_exchange.get_accounts()[account.name]["runs"]
+                self.status_exchange.update_account(
+                    account.name, running=True, last_started=round(time.time())
+                )
+                started = time.monotonic()
+
+                def send(message: Dict[str, Any], name: str = account.name) -> None:
+                    if "output" in message:
+                        self.console.write(f"{name}: {message['output']}\n")
+                        self.console.flush()
+
+                exit_code = self.run(account.args, send)
+                self.status_exchange.update_account(
+                    account.name,
+                    running=False,
+                    runs=runs + 1,
+                    last_exit=exit_code,
+                    duration=round(time.monotonic() - started, 1),
+                )
+            order = order[1:] + order[:1]
+            if self.interval is None:
+                return
+            self.stopping.wait(self.interval)
+
+    def handle(self, request: Dict[str, Any], send: Callable[[Dict[str, Any]], None]) -> None:
+        command = request.get("command")
+        args = [str(arg) for arg in request.get("args", [])]
+        if command == "sync":
+            send({"exit": self.run(args, send)})
+        elif command == "list":
+            send({"exit": self.run(args + ["--list-albums"], send)})
+        elif command == "status":
+            send({"status": self.status()})
+            send({"exit": 0})
+        elif command == "stop":
+            send({"exit": 0})
+            if self.server is not None:
+                # shutdown() waits for serve_forever(), which is busy with this request
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+        else:
+            send({"output": f"Unknown command {command}, expected one of {', '.join(COMMANDS)}"})
+            send({"exit": 2})
+
+    def serve_forever(self) -> None:
+        daemon = self
+        # configured before the first run, so runs do not set up logging into a client stream
+        logging.basicConfig(
+            format="%(asctime)s %(levelname)-8s %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S",
+            stream=sys.stdout,
+        )
+
+        class RequestHandler(socketserver.StreamRequestHandler):
+            def handle(self) -> None:
+                def send(message: Dict[str, Any]) -> None:
+                    try:
+                        self.wfile.write(json.dumps(message).encode("utf-8") + b"\n")
+                        self.wfile.flush()
+                    except OSError:
+                        # client went away, the run itself continues
+                        pass
+
+                try:
+                    request = json.loads(self.rfile.readline())
+                except ValueError:
+                    send({"output": "Malformed request"})
+                    send({"exit": 2})
+                    return
+                daemon.handle(request, send)
+
+        if os.path.exists(self.socket_path):
+            if socket_in_use(self.socket_path):
+                raise DaemonRunningError(f"A daemon is already running on {self.socket_path}")
+            # left over from a daemon that did not stop cleanly
+            os.remove(self.socket_path)
+        os.makedirs(os.path.dirname(self.socket_path) or ".", exist_ok=True)
+        # the socket gives full control over the stored sessions, so it is created accessible
+        # to the owner only; a chmod after bind would leave it open to others for a moment
+        previous_umask = os.umask(0o177)
+        try:
+            server = socketserver.ThreadingUnixStreamServer(self.socket_path, RequestHandler)
+        finally:
+            os.umask(previous_umask)
+        server.daemon_threads = True
+        self.server = server
+        self.console = sys.stdout
+        scheduler = threading.Thread(target=self.run_scheduled, name="scheduler", daemon=True)
+        try:
+            self.logger.info("Listening on %s", self.socket_path)
+            if self.accounts:
+                scheduler.start()
+            server.serve_forever()
+        finally:
+            self.stopping.set()
+            if scheduler.is_alive():
+                # lets a run in progress finish
+                scheduler.join()
+            server.server_close()
+            os.remove(self.socket_path)
+            for icloud in self.services.values():
+                icloud.session.flush()
+            self.logger.info("Stopped")
+
+
+def send_command(
+    socket_path: str, command: str, args: List[str], output: Callable[[str], None]
+) -> int:
+    """Sends a command to the daemon and passes its output on; returns the exit code"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(os.path.expanduser(socket_path))
+        client.sendall(json.dumps({"command": command, "args": args}).encode("utf-8") + b"\n")
+        with client.makefile("rb") as responses:
+            for line in responses:
+                message = json.loads(line)
+                if "output" in message:
+                    output(message["output"])
+                if "status" in message:
+                    output(json.dumps(message["status"], indent=2))
+                if "exit" in message:
+                    return int(message["exit"])
+    output("Daemon closed the connection")
+    return 1
@@ -0,0 +1,88 @@
+"""Collects assets to be deleted in iCloud and flushes them in batches"""
+
+import logging
+import time
+from types import TracebackType
+from typing import Callable, List, Optional, Sequence, Type
+
+from foundation.metrics import REGISTRY
+from pyicloud_ipd.services.photos import PhotoAsset
+
+from icloudpd import constants
+
+QUEUE_DEPTH = REGISTRY.gauge(
+    "icloudpd_queue_depth", "Assets waiting to be processed or deleted", ["queue"]
+)
+
+
+class DeletionQueue:
+    """Accumulates assets and flushes them when the batch is full or old enough.
+
+    Callers must flush once more when they are done (or use the queue as a context
+    manager) so that a partially filled batch is not lost on exit or cancel.
+    """
+
+    def __init__(
+        self,
+        flusher: Callable[[Sequence[PhotoAsset]], None],
+        batch_size: int = constants.DELETE_BATCH_SIZE,
+        max_age_seconds: float = constants.DELETE_FLUSH_SECONDS,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.flusher = flusher
+        self.batch_size = batch_size
+        self.max_age_seconds = max_age_seconds
+        self.logger = logger or logging.getLogger("icloudpd")
+        self._pending: List[PhotoAsset] = []
+        self._oldest: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, photo: PhotoAsset) -> None:
+        """Queue asset for deletion and flush if policy says so"""
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        self._pending.append(photo)
+        QUEUE_DEPTH.set(len(self._pending), "deletions")
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self) -> None:
+        """Flush if the oldest pending asset is old enough. Callers check this for assets
+        they do not queue too, so a partial batch does not wait for the next deletion"""
+        if self._oldest is not None and time.monotonic() - self._oldest >= self.max_age_seconds:
+            self.flush()
+
+    def flush(self) -> None:
+        """Send all pending assets to the flusher"""
+        if len(self._pending) == 0:
+            return
+        batch = self._pending
+        # reset before flushing, so a failed batch is not retried again on exit
+        self._pending = []
+        self._oldest = None
+        QUEUE_DEPTH.set(0, "deletions")
+        self.flusher(batch)
+
+    def __enter__(self) -> "DeletionQueue":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        # assets that were already downloaded still get deleted when the loop fails,
+        # but not when the user interrupts the process
+        if exc_type is None:
+            self.flush()
+        elif issubclass(exc_type, Exception):
+            try:
+                self.flush()
+            except Exception as error:
+                # do not mask the error that ended the loop
+                self.logger.error("Could not delete queued assets: %s", error)
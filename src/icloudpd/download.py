@@ -3,9 +3,14 @@
 import datetime
 import logging
 import os
+import shutil
 import socket
+import stat
 import time
+from typing import Optional
 
+from foundation.metrics import REGISTRY
+from foundation.phases import phase
 from pyicloud_ipd.asset_version import AssetVersion
 from pyicloud_ipd.base import PyiCloudService
 from pyicloud_ipd.exceptions import PyiCloudAPIResponseException
@@ -17,6 +22,26 @@ from tzlocal import get_localzone
 
 # Import the constants object so that we can mock WAIT_SECONDS in tests
 from icloudpd import constants
+from icloudpd.event_log import emit_version
+from icloudpd.progress import TransferProgress
+
+ASSETS_DOWNLOADED = REGISTRY.counter("icloudpd_assets_downloaded_total", "Files downloaded")
+BYTES_DOWNLOADED = REGISTRY.counter("icloudpd_downloaded_bytes_total", "Bytes written by downloads")
+DOWNLOADS_IN_FLIGHT = REGISTRY.gauge("icloudpd_downloads_in_flight", "Downloads in progress")
+DOWNLOAD_RETRIES = REGISTRY.counter(
+    "icloudpd_download_retries_total", "Downloads retried after an error", ["reason"]
+)
+FAILURES = REGISTRY.counter(
+    "icloudpd_failures_total", "Files that could not be downloaded, linked or deleted in iCloud"
+)
+# one download, not the overall rate: a small file is dominated by its request latency
+LAST_DOWNLOAD_THROUGHPUT = REGISTRY.gauge(
+    "icloudpd_last_download_bytes_per_second", "Transfer rate of the last completed download"
+)
+# bytes of the current cycle, shown by the progress bar and the web UI
+TRANSFER = TransferProgress(
+    constants.TRANSFER_RATE_WINDOW_SECONDS, constants.TRANSFER_NOTIFY_SECONDS
+)
 
 
 def update_mtime(created: datetime.datetime, download_path: str) -> None:
@@ -71,12 +96,33 @@ def download_response_to_path(
 ) -> bool:
     """Saves response content into file with desired created date"""
     temp_download_path = download_path + ".part"
-    with open(temp_download_path, "wb") as file_obj:
-        for chunk in response.iter_content(chunk_size=1024):
-            if chunk:
-                file_obj.write(chunk)
+    started = time.monotonic()
+    written = 0
+    # reported to TRANSFER in batches, not per chunk
+    unreported = 0
+    try:
+        with open(temp_download_path, "wb") as file_obj:
+            for chunk in response.iter_content(chunk_size=1024):
+                if chunk:
+                    file_obj.write(chunk)
+                    written += len(chunk)
+                    unreported += len(chunk)
+                    if unreported >= constants.TRANSFER_REPORT_BYTES:
+                        TRANSFER.add(unreported)
+                        unreported = 0
+    except Exception:
+        # a retry starts over, so progress must not count this attempt
+        TRANSFER.undo(written - unreported)
+        raise
+    TRANSFER.add(unreported)
+    # counted once per file, not per chunk
+    BYTES_DOWNLOADED.inc(amount=written)
+    elapsed = time.monotonic() - started
+    if elapsed > 0:
+        LAST_DOWNLOAD_THROUGHPUT.set(written / elapsed)
     os.rename(temp_download_path, download_path)
-    update_mtime(created_date, download_path)
+    with phase("set_utime"):
+        update_mtime(created_date, download_path)
     return True
 
 
@@ -94,6 +140,135 @@ def download_response_to_path_dry_run(
     return True
 
 
+# ioctl request code for FICLONE on Linux (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+
+def reflink_file(source_path: str, target_path: str) -> bool:
+    """Clones file content with copy-on-write if OS and filesystem support it"""
+    try:
+        import fcntl
+    except ImportError:  # pragma: no cover
+        # not available on Windows
+        return False
+    temp_target_path = target_path + ".part"
+    try:
+        with open(source_path, "rb") as src, open(temp_target_path, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    except OSError:
+        if os.path.exists(temp_target_path):
+            os.remove(temp_target_path)
+        return False
+    os.rename(temp_target_path, target_path)
+    return True
+
+
+def hardlink_file(source_path: str, target_path: str) -> bool:
+    """Links file if filesystem supports hardlinks"""
+    try:
+        os.link(source_path, target_path)
+        return True
+    except OSError:
+        return False
+
+
+def copy_file(source_path: str, target_path: str) -> bool:
+    """Copies file content through a temp file"""
+    temp_target_path = target_path + ".part"
+    try:
+        shutil.copyfile(source_path, temp_target_path)
+    except OSError:
+        if os.path.exists(temp_target_path):
+            os.remove(temp_target_path)
+        return False
+    os.rename(temp_target_path, target_path)
+    return True
+
+
+def clone_media(
+    logger: logging.Logger,
+    dry_run: bool,
+    source_path: str,
+    download_path: str,
+    may_share: bool,
+) -> bool:
+    """Materializes already downloaded content at another path without transferring it again.
+
+    A hardlink shares its inode with the source, so it is only used if `may_share`, i.e. when
+    nothing (EXIF, file times) is written to the new file afterwards that the source does not
+    have already; a copy is made otherwise.
+    """
+    if dry_run:
+        logger.info("[DRY RUN] Would link %s to %s", download_path, source_path)
+        return True
+    if not os.path.isfile(source_path) or not mkdirs_for_path(logger, download_path):
+        return False
+    if reflink_file(source_path, download_path) or (
+        may_share and hardlink_file(source_path, download_path)
+    ):
+        logger.debug("Linked %s to %s", download_path, source_path)
+        return True
+    if copy_file(source_path, download_path):
+        logger.debug("Copied %s to %s", download_path, source_path)
+        return True
+    return False
+
+
+def content_store_path(store_directory: str, version: AssetVersion) -> Optional[str]:
+    """Path of the version in the content store, None if iCloud did not report a checksum"""
+    if not version.checksum:
+        return None
+    # checksum is base64, so make it filename safe
+    key = version.checksum.replace("/", "_").replace("+", "-")
+    _, ext = os.path.splitext(version.filename)
+    return os.path.join(store_directory, key[-2:], key + ext)
+
+
+def seal_stored_file(logger: logging.Logger, store_path: str) -> bool:
+    """Makes a finished content store file read-only. Folders link to it, so a write through
+    any of them would change them all and the file would no longer match its checksum.
+
+    Left writable on Windows, which refuses to delete read-only files and would break
+    --auto-delete and downloading them again.
+    """
+    if os.name == "nt":
+        return True
+    try:
+        os.chmod(store_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+    except OSError:
+        logger.error("Could not make %s read-only", store_path)
+        return False
+    return True
+
+
+def link_media(
+    logger: logging.Logger,
+    dry_run: bool,
+    store_path: str,
+    download_path: str,
+    symlink: bool,
+) -> bool:
+    """Creates a hardlink or relative symlink at download path pointing into the content store.
+
+    Nothing may be written to the linked path afterwards, it is the store file.
+    """
+    if dry_run:
+        logger.info("[DRY RUN] Would link %s to %s", download_path, store_path)
+        return True
+    if not mkdirs_for_path(logger, download_path):
+        return False
+    try:
+        if symlink:
+            os.symlink(os.path.relpath(store_path, os.path.dirname(download_path)), download_path)
+        else:
+            os.link(store_path, download_path)
+    except OSError:
+        logger.error("Could not link %s to %s", download_path, store_path)
+        return False
+    logger.debug("Linked %s to %s", download_path, store_path)
+    return True
+
+
 def download_media(
     logger: logging.Logger,
     dry_run: bool,
@@ -107,24 +282,52 @@ def download_media(
 
     mkdirs_local = mkdirs_for_path_dry_run if dry_run else mkdirs_for_path
     download_local = download_response_to_path_dry_run if dry_run else download_response_to_path
+    started = time.monotonic()
+
+    def record(event: str, retries: int, **fields: str) -> None:
+        if event == "failed":
+            FAILURES.inc()
+        emit_version(event, photo, version, size, download_path, started, retries, **fields)
 
     if not mkdirs_local(logger, download_path):
+        record("failed", 0, reason="mkdir")
         return False
 
+    if not dry_run:
+        TRANSFER.plan(version.size)
+
     for retries in range(constants.MAX_RETRIES):
         try:
-            photo_response = photo.download(version.url)
-            if photo_response:
-                return download_local(logger, photo_response, download_path, photo.created)
+            DOWNLOADS_IN_FLIGHT.inc()
+            try:
+                with phase("transfer"):
+                    photo_response = photo.download(version.url)
+                    downloaded = bool(photo_response) and download_local(
+                        logger, photo_response, download_path, photo.created
+                    )
+                if photo_response:
+                    if downloaded and not dry_run:
+                        ASSETS_DOWNLOADED.inc()
+                    if downloaded:
+                        record("downloaded", retries)
+                    else:
+                        record("failed", retries, reason="write")
+                        if not dry_run:
+                            TRANSFER.unplan(version.size)
+                    return downloaded
+            finally:
+                DOWNLOADS_IN_FLIGHT.dec()
 
             logger.error(
                 "Could not find URL to download %s for size %s", version.filename, size.value
             )
+            record("failed", retries, reason="no_url")
             break
 
         except (ConnectionError, socket.timeout, PyiCloudAPIResponseException) as ex:
             if "Invalid global session" in str(ex):
                 logger.error("Session error, re-authenticating...")
+                DOWNLOAD_RETRIES.inc("session")
                 if retries > 0:
                     # If the first re-authentication attempt failed,
                     # start waiting a few seconds before retrying in case
@@ -135,6 +338,7 @@ def download_media(
             else:
                 # you end up here when p.e. throttling by Apple happens
                 wait_time = (retries + 1) * constants.WAIT_SECONDS
+                DOWNLOAD_RETRIES.inc("error")
                 logger.error(
                     "Error downloading %s, retrying after %s seconds...", photo.filename, wait_time
                 )
@@ -148,11 +352,16 @@ def download_media(
                 + "Skipping this file...",
                 download_path,
             )
+            record("failed", retries, reason="write")
             break
     else:
         logger.error(
             "Could not download %s. Please try again later.",
             photo.filename,
         )
+        record("failed", constants.MAX_RETRIES, reason="retries")
 
+    if not dry_run:
+        # given up, its bytes are not coming
+        TRANSFER.unplan(version.size)
     return False
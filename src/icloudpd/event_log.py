@@ -0,0 +1,147 @@
+"""
+JSON lines record of what happened to each asset version (--event-log)
+"""
+
+import contextlib
+import datetime
+import json
+import logging
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pyicloud_ipd.asset_version import AssetVersion
+from pyicloud_ipd.services.photos import PhotoAsset
+from pyicloud_ipd.version_size import VersionSize
+
+from icloudpd import constants
+
+# queued event: time, name, fields
+Event = Tuple[float, str, Dict[str, Any]]
+
+
+class EventLog:
+    """Appends one JSON object per line for every decision about an asset version.
+
+    `emit` only queues the event. A writer thread encodes queued events and writes them in
+    batches, so callers never wait for the disk. Events are dropped while no log is open.
+    """
+
+    def __init__(self) -> None:
+        self._queue: queue.SimpleQueue[Optional[Event]] = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+        self._common: Dict[str, Any] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self._writer is not None
+
+    def emit(self, event: str, **fields: Any) -> None:
+        """Queues `event` with `fields`; values must be JSON serializable"""
+        if self._writer is not None:
+            self._queue.put((time.time(), event, fields))
+
+    def open(self, logger: logging.Logger, path: str, **common: Any) -> None:
+        """Starts appending events to `path`, each with the `common` fields"""
+        self.close()
+        self._common = common
+        self._writer = threading.Thread(
+            target=self._write, args=[logger, path], name="event-log", daemon=True
+        )
+        self._writer.start()
+
+    def close(self) -> None:
+        """Writes all queued events and closes the file"""
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+
+    @contextlib.contextmanager
+    def recording(
+        self, logger: logging.Logger, path: Optional[str], **common: Any
+    ) -> Iterator[None]:
+        """Records events to `path` while in the block, nothing if `path` is None"""
+        if path is None:
+            yield
+            return
+        self.open(logger, path, **common)
+        try:
+            yield
+        finally:
+            self.close()
+
+    def _encode(self, event: Event) -> str:
+        timestamp, name, fields = event
+        return json.dumps(
+            {
+                "time": datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat(
+                    timespec="milliseconds"
+                ),
+                "event": name,
+                **self._common,
+                **fields,
+            },
+            ensure_ascii=False,
+        )
+
+    def _write(self, logger: logging.Logger, path: str) -> None:
+        log_file = None
+        try:
+            log_file = open(path, "a", encoding="utf-8")  # noqa: SIM115
+        except OSError as error:
+            logger.warning("Could not open event log %s: %s", path, error)
+        closing = False
+        while not closing:
+            # block for the first event, then take whatever else is queued
+            batch: List[Event] = []
+            item = self._queue.get()
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= constants.EVENT_LOG_BATCH_SIZE:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            closing = item is None
+            if log_file is None or not batch:
+                continue
+            try:
+                log_file.write("".join(self._encode(event) + "\n" for event in batch))
+                log_file.flush()
+            except OSError as error:
+                logger.warning("Could not write event log %s: %s", path, error)
+                log_file.close()
+                log_file = None
+        if log_file is not None:
+            log_file.close()
+
+
+EVENT_LOG = EventLog()
+
+
+def emit_version(
+    event: str,
+    photo: PhotoAsset,
+    version: AssetVersion,
+    size: VersionSize,
+    path: str,
+    started: float,
+    retries: int = 0,
+    **fields: str,
+) -> None:
+    """Queues an event about one version of an asset, timed from `started` (time.monotonic)"""
+    if EVENT_LOG.enabled:
+        EVENT_LOG.emit(
+            event,
+            asset=photo.id,
+            filename=version.filename,
+            size=size.value,
+            path=path,
+            bytes=version.size,
+            seconds=round(time.monotonic() - started, 3),
+            retries=retries,
+            **fields,
+        )
@@ -3,12 +3,13 @@
 import logging
 import typing
 
-import piexif
-from piexif._exceptions import InvalidImageDataError
-
 
 def get_photo_exif(logger: logging.Logger, path: str) -> typing.Optional[str]:
     """Get EXIF date for a photo, return nothing if there is an error"""
+    # piexif is only needed with --set-exif-datetime, so it is loaded on first use
+    import piexif
+    from piexif._exceptions import InvalidImageDataError
+
     try:
         exif_dict: piexif.ExifIFD = piexif.load(path)
         return typing.cast(typing.Optional[str], exif_dict.get("Exif").get(36867))
@@ -19,6 +20,9 @@ def get_photo_exif(logger: logging.Logger, path: str) -> typing.Optional[str]:
 
 def set_photo_exif(logger: logging.Logger, path: str, date: str) -> None:
     """Set EXIF date on a photo, do nothing if there is an error"""
+    import piexif
+    from piexif._exceptions import InvalidImageDataError
+
     try:
         exif_dict = piexif.load(path)
         exif_dict.get("1st")[306] = date
@@ -1,6 +1,19 @@
 """Path functions"""
 
+import datetime
+import logging
 import os
+import stat
+from typing import Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+from pyicloud_ipd.asset_version import AssetVersion
+from pyicloud_ipd.file_match import FileMatchPolicy
+from pyicloud_ipd.services.photos import PhotoAsset
+from pyicloud_ipd.utils import add_suffix_to_filename, size_to_suffix
+from pyicloud_ipd.version_size import AssetVersionSize, LivePhotoVersionSize, VersionSize
+from tzlocal import get_localzone
+
+from icloudpd.string_helpers import truncate_middle
 
 
 def remove_unicode_chars(value: str) -> str:
@@ -24,3 +37,114 @@ def local_download_path(filename: str, download_dir: str) -> str:
     """Returns the full download path, including size"""
     download_path = os.path.join(download_dir, filename)
     return download_path
+
+
+def regular_file_size(path: str) -> Optional[int]:
+    """Returns the size of a regular file or None if there is no such file"""
+    try:
+        result = os.stat(path)
+    except OSError:
+        return None
+    if not stat.S_ISREG(result.st_mode):
+        return None
+    return result.st_size
+
+
+def asset_download_dir(
+    logger: logging.Logger, photo: PhotoAsset, folder_structure: str, directory: str
+) -> Tuple[datetime.datetime, str]:
+    """Returns the local creation date of the asset and the folder it is downloaded into"""
+    try:
+        created_date = photo.created.astimezone(get_localzone())
+    except (ValueError, OSError):
+        logger.error("Could not convert photo created date to local timezone (%s)", photo.created)
+        created_date = photo.created
+
+    if folder_structure.lower() == "none":
+        date_path = ""
+    else:
+        try:
+            date_path = folder_structure.format(created_date)
+        except ValueError:  # pragma: no cover
+            # This error only seems to happen in Python 2
+            logger.error("Photo created date was not valid (%s)", photo.created)
+            # e.g. ValueError: year=5 is before 1900
+            # (https://github.com/icloud-photos-downloader/icloud_photos_downloader/issues/122)
+            # Just use the Unix epoch
+            created_date = datetime.datetime.fromtimestamp(0)
+            date_path = folder_structure.format(created_date)
+
+    return (created_date, os.path.normpath(os.path.join(directory, date_path)))
+
+
+def primary_download_sizes(
+    logger: logging.Logger,
+    photo: PhotoAsset,
+    versions: Dict[AssetVersionSize, AssetVersion],
+    primary_sizes: Sequence[AssetVersionSize],
+    force_size: bool,
+) -> Iterator[AssetVersionSize]:
+    """Yields the sizes of the asset to keep locally, falling back to original if allowed"""
+    for download_size in primary_sizes:
+        if download_size not in versions and download_size != AssetVersionSize.ORIGINAL:
+            if force_size:
+                logger.error(
+                    "%s size does not exist for %s. Skipping...",
+                    download_size.value,
+                    photo.filename,
+                )
+                continue
+            if AssetVersionSize.ORIGINAL in primary_sizes:
+                continue  # that should avoid double download for original
+            download_size = AssetVersionSize.ORIGINAL
+        yield download_size
+
+
+def live_photo_download_path(
+    photo: PhotoAsset, live_photo_size: LivePhotoVersionSize, download_dir: str
+) -> Optional[Tuple[AssetVersion, str]]:
+    """Returns the video version of a live photo and its local path, if the asset has one"""
+    if live_photo_size not in photo.versions:
+        return None
+    version = photo.versions[live_photo_size]
+    lp_filename = version.filename
+    if live_photo_size != LivePhotoVersionSize.ORIGINAL:
+        # Add size to filename if not original
+        lp_filename = add_suffix_to_filename(size_to_suffix(live_photo_size), lp_filename)
+    return (version, os.path.join(download_dir, lp_filename))
+
+
+def existing_download_path(
+    logger: logging.Logger,
+    download_path: str,
+    version: AssetVersion,
+    size: VersionSize,
+    file_match_policy: FileMatchPolicy,
+    local_size: Callable[[str], Optional[int]] = regular_file_size,
+) -> Tuple[str, Optional[str]]:
+    """Resolves where a version lives locally.
+
+    Returns the path the version belongs to (with the size suffix when it collides with a
+    different file of the same name) and the path of the file already holding it, if any.
+    `local_size` lets callers answer from an index instead of the file system.
+    """
+    existing_path = download_path
+    file_size = local_size(download_path)
+    if file_size is None and size == AssetVersionSize.ORIGINAL:
+        # Deprecation - We used to download files like IMG_1234-original.jpg,
+        # so we need to check for these.
+        # Now we match the behavior of iCloud for Windows: IMG_1234.jpg
+        existing_path = add_suffix_to_filename("-original", download_path)
+        file_size = local_size(existing_path)
+
+    if (
+        file_size is not None
+        and file_match_policy == FileMatchPolicy.NAME_SIZE_DEDUP_WITH_SUFFIX
+        and file_size != version.size
+    ):
+        download_path = (f"-{version.size}.").join(download_path.rsplit(".", 1))
+        logger.debug("%s deduplicated", truncate_middle(download_path, 96))
+        existing_path = download_path
+        file_size = local_size(download_path)
+
+    return (download_path, existing_path if file_size is not None else None)
@@ -0,0 +1,266 @@
+"""
+Profiles a run for --profile and --profile-memory
+"""
+
+import collections
+import contextlib
+import cProfile
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+import typing
+from types import FrameType
+from typing import Callable, Iterator, List, Optional
+
+from icloudpd import constants
+
+
+def collapse_stack(frame: Optional[FrameType]) -> str:
+    """Stack of `frame` in collapsed (folded) format: outermost call first, separated by `;`"""
+    labels: List[str] = []
+    while frame is not None:
+        labels.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class StackSampler:
+    """Samples the stack of one thread at a fixed interval and counts identical stacks.
+
+    Overhead depends on the interval only, not on how many calls the thread makes.
+    """
+
+    def __init__(self, thread_id: int, interval: float) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: typing.Counter[str] = collections.Counter()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                # sampled thread is gone
+                return
+            stack = collapse_stack(frame)
+            with self._lock:
+                self.stacks[stack] += 1
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def write(self, path: str) -> None:
+        """Writes one `stack count` line per distinct stack, as read by flame graph tools"""
+        with self._lock:
+            stacks = sorted(self.stacks.items())
+        with open(path, "w", encoding="utf-8") as collapsed_file:
+            for stack, count in stacks:
+                collapsed_file.write(f"{stack} {count}\n")
+
+
+class PeakMemoryTracer:
+    """Traces allocations with tracemalloc and keeps a snapshot taken near the peak.
+
+    Traced memory is checked at a fixed interval; a new snapshot is only taken when it grew
+    by more than `growth` since the last one, so snapshots stay rare.
+    """
+
+    def __init__(self, interval: float, growth: float) -> None:
+        self.interval = interval
+        self.growth = growth
+        self.snapshot: Optional[tracemalloc.Snapshot] = None
+        self.snapshot_size = 0
+        self.peak_size = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-memory", daemon=True)
+
+    def start(self) -> None:
+        tracemalloc.start()
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.check()
+
+    def check(self) -> None:
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                return
+            current, peak = tracemalloc.get_traced_memory()
+            self.peak_size = max(self.peak_size, peak)
+            if current > self.snapshot_size * self.growth:
+                self.snapshot = tracemalloc.take_snapshot()
+                self.snapshot_size = current
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join()
+        self.check()
+        with self._lock:
+            tracemalloc.stop()
+
+    def write(self, path: str, top: int) -> None:
+        """Writes the allocation sites holding the most memory in the snapshot"""
+        with self._lock:
+            snapshot, snapshot_size, peak_size = self.snapshot, self.snapshot_size, self.peak_size
+        with open(path, "w", encoding="utf-8") as report_file:
+            report_file.write(
+                f"Peak traced memory {peak_size / 1024:.1f} KiB, "
+                f"top {top} allocation sites at {snapshot_size / 1024:.1f} KiB:\n"
+            )
+            if snapshot is None:
+                return
+            statistics = snapshot.filter_traces(
+                [
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+                    tracemalloc.Filter(False, "<unknown>"),
+                ]
+            ).statistics("lineno")
+            for statistic in statistics[:top]:
+                frame = statistic.traceback[0]
+                report_file.write(
+                    f"{statistic.size / 1024:12.1f} KiB {statistic.count:9d} "
+                    f"{frame.filename}:{frame.lineno}\n"
+                )
+
+
+# writes the results so far of the profile in progress, see `write_profile`
+_write_so_far: Optional[Callable[[], None]] = None
+
+
+def write_profile() -> None:
+    """Writes the results so far of the profile in progress, which goes on; nothing if none is.
+
+    Watch mode never leaves `profiled` and a stopped container may not either, so each cycle
+    writes the profile up to then.
+    """
+    if _write_so_far is not None:
+        _write_so_far()
+
+
+def _replace(path: str, write: Callable[[str], None]) -> None:
+    """Writes with `write` next to `path` and then replaces it, so it is never read half written"""
+    temp_path = path + ".part"
+    write(temp_path)
+    os.replace(temp_path, path)
+
+
+def _stop_at(time_limit: float, stop: Callable[[], None]) -> Callable[[], None]:
+    """Runs `stop` after `time_limit` seconds unless cancelled by the returned function.
+
+    cProfile only profiles the thread that enabled it, so it can only be disabled from that
+    thread: the main thread gets an alarm signal, other threads are profiled to the end.
+    """
+    if threading.current_thread() is threading.main_thread() and hasattr(signal, "SIGALRM"):
+        previous = signal.signal(signal.SIGALRM, lambda _signum, _frame: stop())
+        signal.setitimer(signal.ITIMER_REAL, time_limit)
+
+        def cancel_alarm() -> None:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+        return cancel_alarm
+    return lambda: None
+
+
+@contextlib.contextmanager
+def profiled(
+    logger: logging.Logger,
+    profile: Optional[str],
+    profile_format: str,
+    profile_memory: Optional[str],
+    time_limit: Optional[float],
+) -> Iterator[None]:
+    """Profiles the calling thread while in the block and writes the results on exit.
+
+    `profile_format` "pstats" records every call with cProfile, "collapsed" samples the stack.
+    Profiling stops after `time_limit` seconds, the block runs on.
+    """
+    if profile is None and profile_memory is None:
+        yield
+        return
+
+    global _write_so_far
+    started = time.monotonic()
+    stops: List[Callable[[], None]] = []
+    cancels: List[Callable[[], None]] = []
+    profiler: Optional[cProfile.Profile] = None
+    profiler_stopped = threading.Event()
+    sampler: Optional[StackSampler] = None
+    tracer: Optional[PeakMemoryTracer] = None
+    if profile is not None and profile_format == "collapsed":
+        sampler = StackSampler(threading.get_ident(), constants.PROFILE_SAMPLE_INTERVAL_SECONDS)
+        sampler.start()
+        stops.append(sampler.stop)
+    elif profile is not None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        if time_limit is not None:
+
+            def stop_profiler() -> None:
+                profiler_stopped.set()
+                if profiler is not None:
+                    profiler.disable()
+
+            cancels.append(_stop_at(time_limit, stop_profiler))
+    if profile_memory is not None:
+        tracer = PeakMemoryTracer(
+            constants.PROFILE_MEMORY_CHECK_SECONDS, constants.PROFILE_MEMORY_GROWTH
+        )
+        tracer.start()
+        stops.append(tracer.stop)
+    if time_limit is not None and stops:
+
+        def stop_all() -> None:
+            for stop in stops:
+                stop()
+
+        timer = threading.Timer(time_limit, stop_all)
+        timer.daemon = True
+        timer.start()
+        cancels.append(timer.cancel)
+
+    def write() -> None:
+        try:
+            if profile is not None and profiler is not None:
+                # collecting the stats disables the profiler, until the rest is written too
+                _replace(profile, profiler.dump_stats)
+            if profile is not None and sampler is not None:
+                _replace(profile, sampler.write)
+            if profile_memory is not None and tracer is not None:
+                _replace(
+                    profile_memory, lambda path: tracer.write(path, constants.PROFILE_MEMORY_TOP)
+                )
+        except OSError as error:
+            logger.warning("Could not write profile: %s", error)
+        if profiler is not None and not profiler_stopped.is_set():
+            profiler.enable()
+
+    _write_so_far = write
+    try:
+        yield
+    finally:
+        _write_so_far = None
+        for cancel in cancels:
+            cancel()
+        profiler_stopped.set()
+        if profiler is not None:
+            profiler.disable()
+        for stop in stops:
+            stop()
+        logger.debug("Profiled %.1f sec", time.monotonic() - started)
+        write()
@@ -1,25 +1,217 @@
 import datetime
+import math
+import time
+from collections import deque
+from threading import Condition, Lock
+from typing import Any, Callable, Deque, Dict, NamedTuple, Optional, Tuple
+
+
+class TransferSnapshot(NamedTuple):
+    bytes_done: int
+    # None while nothing is known about the size of the cycle
+    bytes_remaining: Optional[int]
+    bytes_per_second: float
+    eta_seconds: Optional[int]
+
+
+class TransferProgress:
+    """Bytes transferred in the current cycle, across all downloads.
+
+    Downloads announce the size of each version they start (`plan`) and report written bytes
+    in batches (`add`); a failed attempt takes its bytes back (`undo`) and an abandoned version
+    its size (`unplan`). Bytes remaining are those of started versions plus, when the number of
+    assets is known, the average planned per asset so far for every asset not seen yet. The
+    rate covers the last `window` seconds, failed attempts included. `listener` is called with
+    a snapshot at most every `notify_interval` seconds while bytes come in and on `notify`.
+    """
+
+    def __init__(self, window: float, notify_interval: float) -> None:
+        self.window = window
+        self.notify_interval = notify_interval
+        self.listener: Optional[Callable[[TransferSnapshot], None]] = None
+        self._lock = Lock()
+        self.start(None)
+
+    def start(self, assets_total: Optional[int]) -> None:
+        """Begins a cycle of `assets_total` assets, None if unknown"""
+        with self._lock:
+            self._assets_total = assets_total
+            self._assets_seen = 0
+            self._planned = 0
+            self._done = 0
+            # bytes received, also those of failed attempts; the rate is measured on these
+            self._transferred = 0
+            now = time.monotonic()
+            self._samples: Deque[Tuple[float, int]] = deque([(now, 0)])
+            self._notified = now
+
+    def plan(self, size: int) -> None:
+        """Announces a version of `size` bytes about to be transferred"""
+        with self._lock:
+            self._planned += size
+
+    def unplan(self, size: int) -> None:
+        """Withdraws a version of `size` bytes that will not be transferred after all"""
+        with self._lock:
+            self._planned -= size
+
+    def add(self, written: int) -> None:
+        """Reports `written` more bytes"""
+        now = time.monotonic()
+        with self._lock:
+            self._done += written
+            self._transferred += written
+            self._samples.append((now, self._transferred))
+            due = now - self._notified >= self.notify_interval
+            if due:
+                self._notified = now
+        if due:
+            self.notify()
+
+    def undo(self, written: int) -> None:
+        """Takes back `written` bytes reported by an attempt that failed"""
+        with self._lock:
+            self._done -= written
+
+    def asset_done(self) -> None:
+        """Counts an asset as handled, whether anything was transferred or not. Callers
+        `notify` afterwards, outside of any lock of theirs, as the listener may take it"""
+        with self._lock:
+            self._assets_seen += 1
+
+    def notify(self) -> None:
+        """Calls the listener with a snapshot now"""
+        with self._lock:
+            self._notified = time.monotonic()
+        listener = self.listener
+        if listener is not None:
+            listener(self.snapshot())
+
+    def snapshot(self) -> TransferSnapshot:
+        now = time.monotonic()
+        with self._lock:
+            # keep the newest sample so an idle transfer measures as 0 B/s
+            while len(self._samples) > 1 and now - self._samples[0][0] > self.window:
+                self._samples.popleft()
+            since, transferred_since = self._samples[0]
+            bytes_per_second = (
+                (self._transferred - transferred_since) / (now - since) if now > since else 0.0
+            )
+            bytes_remaining: Optional[int] = None
+            if self._assets_total is not None or self._planned > 0:
+                bytes_remaining = max(self._planned - self._done, 0)
+                if self._assets_total is not None and self._assets_seen > 0:
+                    unseen = max(self._assets_total - self._assets_seen, 0)
+                    bytes_remaining += round(unseen * self._planned / self._assets_seen)
+            eta_seconds = (
+                round(bytes_remaining / bytes_per_second)
+                if bytes_remaining is not None and bytes_per_second > 0
+                else None
+            )
+            return TransferSnapshot(self._done, bytes_remaining, bytes_per_second, eta_seconds)
 
 
 class Progress:
-    def __init__(self) -> None:
+    """Progress of the current cycle, written by the sync and read by the web UI.
+
+    Every change happens under `changed` and bumps `version`, so readers take consistent
+    snapshots and can wait for the next change instead of polling.
+    """
+
+    def __init__(self, changed: Optional[Condition] = None) -> None:
+        self.changed = changed or Condition()
+        self.version = 0
         self._photos_count = 0
         self._photos_counter = 0
         self.photos_percent = 0
-        self.photos_last_message = ""
-        self.waiting_readable = ""
-        self.resume = False
-        self.cancel = False
-        self._waiting = 0
+        self._photos_last_message = ""
+        self._resume = False
+        self._cancel = False
+        # end of the wait for the next cycle, seconds since the epoch; clients count down
+        self._waiting_until: Optional[float] = None
+        self._current_file = ""
+        self._transfer = TransferSnapshot(0, None, 0.0, None)
+        self._started: Optional[float] = None
+
+    def mark_changed(self) -> None:
+        """Records a change and wakes waiters; the caller holds `changed`"""
+        self.version += 1
+        self.changed.notify_all()
+
+    @property
+    def resume(self) -> bool:
+        return self._resume
+
+    @resume.setter
+    def resume(self, resume: bool) -> None:
+        with self.changed:
+            self._resume = resume
+            self.mark_changed()
+
+    @property
+    def cancel(self) -> bool:
+        return self._cancel
+
+    @cancel.setter
+    def cancel(self, cancel: bool) -> None:
+        with self.changed:
+            self._cancel = cancel
+            self.mark_changed()
+
+    def wait_for_resume(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until resume is requested, at most `timeout` seconds; returns whether it was"""
+        with self.changed:
+            return self.changed.wait_for(lambda: self._resume, timeout)
 
     @property
     def waiting(self) -> int:
-        return self._waiting
+        """Seconds left until the next cycle, 0 when not waiting"""
+        waiting_until = self._waiting_until
+        if waiting_until is None:
+            return 0
+        return max(math.ceil(waiting_until - time.time()), 0)
 
     @waiting.setter
     def waiting(self, waiting: int) -> None:
-        self._waiting = waiting
-        self.waiting_readable = str(datetime.timedelta(seconds=waiting))
+        """Publishes the end of a wait of `waiting` seconds once, not every second"""
+        with self.changed:
+            self._waiting_until = time.time() + waiting if waiting > 0 else None
+            self.mark_changed()
+
+    @property
+    def waiting_readable(self) -> str:
+        waiting = self.waiting
+        return str(datetime.timedelta(seconds=waiting)) if waiting > 0 else ""
+
+    @property
+    def photos_last_message(self) -> str:
+        return self._photos_last_message
+
+    @photos_last_message.setter
+    def photos_last_message(self, message: str) -> None:
+        with self.changed:
+            self._photos_last_message = message
+            self.mark_changed()
+
+    @property
+    def current_file(self) -> str:
+        return self._current_file
+
+    @current_file.setter
+    def current_file(self, current_file: str) -> None:
+        with self.changed:
+            self._current_file = current_file
+            self.mark_changed()
+
+    @property
+    def transfer(self) -> TransferSnapshot:
+        return self._transfer
+
+    @transfer.setter
+    def transfer(self, transfer: TransferSnapshot) -> None:
+        with self.changed:
+            self._transfer = transfer
+            self.mark_changed()
 
     @property
     def photos_count(self) -> int:
@@ -27,11 +219,12 @@ class Progress:
 
     @photos_count.setter
     def photos_count(self, photos_count: int) -> None:
-        self._photos_count = photos_count
-        if self.photos_count != 0:
-            self.photos_percent = round(100 / self.photos_count * self.photos_counter)
-        else:
-            self.photos_percent = 0
+        with self.changed:
+            # a cycle starts by announcing its size
+            self._started = time.monotonic()
+            self._photos_count = photos_count
+            self._update_percent()
+            self.mark_changed()
 
     @property
     def photos_counter(self) -> int:
@@ -39,17 +232,53 @@ class Progress:
 
     @photos_counter.setter
     def photos_counter(self, photos_counter: int) -> None:
-        self._photos_counter = photos_counter
-        if self.photos_count != 0:
-            self.photos_percent = round(100 / self.photos_count * self.photos_counter)
+        with self.changed:
+            self._photos_counter = photos_counter
+            self._update_percent()
+            self.mark_changed()
+
+    def _update_percent(self) -> None:
+        if self._photos_count != 0:
+            self.photos_percent = round(100 / self._photos_count * self._photos_counter)
         else:
             self.photos_percent = 0
 
+    def snapshot(self) -> Dict[str, Any]:
+        """Consistent copy of the progress, with throughput and ETA of the current cycle"""
+        with self.changed:
+            eta_seconds = self._transfer.eta_seconds
+            if eta_seconds is None and self._started is not None:
+                # nothing to transfer, estimate by assets handled
+                elapsed = time.monotonic() - self._started
+                if 0 < self._photos_counter < self._photos_count:
+                    remaining = self._photos_count - self._photos_counter
+                    eta_seconds = round(elapsed / self._photos_counter * remaining)
+            return {
+                "photos_count": self._photos_count,
+                "photos_counter": self._photos_counter,
+                "photos_percent": self.photos_percent,
+                "photos_last_message": self._photos_last_message,
+                "current_file": self._current_file,
+                "bytes_downloaded": self._transfer.bytes_done,
+                "bytes_remaining": self._transfer.bytes_remaining,
+                "bytes_per_second": round(self._transfer.bytes_per_second),
+                "eta_seconds": eta_seconds,
+                "waiting": self.waiting,
+                "waiting_readable": self.waiting_readable,
+                "waiting_until": self._waiting_until,
+                "resume": self._resume,
+                "cancel": self._cancel,
+            }
+
     def reset(self) -> None:
-        self._photos_count = 0
-        self._photos_counter = 0
-        self.photos_percent = 0
-        self._waiting = 0
-        self.waiting_readable = ""
-        self.resume = False
-        self.cancel = False
+        with self.changed:
+            self._photos_count = 0
+            self._photos_counter = 0
+            self.photos_percent = 0
+            self._waiting_until = None
+            self._resume = False
+            self._cancel = False
+            self._current_file = ""
+            self._transfer = TransferSnapshot(0, None, 0.0, None)
+            self._started = None
+            self.mark_changed()
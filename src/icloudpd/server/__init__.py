@@ -1,15 +1,54 @@
+import json
 import os
 import sys
+import time
+import uuid
 from logging import Logger
-from typing import Union
+from typing import Any, Dict, Iterator, Optional, Union
 
-import waitress
-from flask import Flask, Response, make_response, render_template, request
+from flask import Flask, Response, jsonify, make_response, render_template, request
+from foundation.metrics import REGISTRY
+from waitress.server import BaseWSGIServer, MultiSocketServer, create_server
 
+from icloudpd import constants
 from icloudpd.status import Status, StatusExchange
 
 
-def serve_app(logger: Logger, _status_exchange: StatusExchange) -> None:
+def progress_events(status_exchange: StatusExchange) -> Iterator[str]:
+    """Server-sent events with the fields that changed since the previous event; the
+    first event has all of them. The web UI updates the progress in place from these and
+    renders /status again only when the status or the accounts change.
+
+    Ends after PROGRESS_STREAM_MAX_SECONDS, so streams left open by browsers do not hold
+    web server threads forever. EventSource reconnects on its own and gets all fields again.
+    """
+    sent: Dict[str, Any] = {}
+    version = -1
+    ends = time.monotonic() + constants.PROGRESS_STREAM_MAX_SECONDS
+    while version == -1 or time.monotonic() < ends:
+        if (
+            status_exchange.wait_for_change(version, constants.PROGRESS_STREAM_KEEPALIVE_SECONDS)
+            == version
+        ):
+            # keeps proxies from closing an idle connection
+            yield ": keep-alive\n\n"
+            continue
+        snapshot = status_exchange.snapshot()
+        version = snapshot["version"]
+        current = {
+            "status": snapshot["status"],
+            "accounts": snapshot["accounts"],
+            **snapshot["progress"],
+        }
+        delta = {key: value for key, value in current.items() if sent.get(key, ...) != value}
+        sent = current
+        if delta:
+            yield f"id: {version}\ndata: {json.dumps(delta)}\n\n"
+        # per-asset updates are coalesced
+        time.sleep(constants.PROGRESS_STREAM_INTERVAL_SECONDS)
+
+
+def make_app(logger: Logger, _status_exchange: StatusExchange) -> Flask:
     app = Flask(__name__)
     app.logger = logger
     # for running in pyinstaller
@@ -22,20 +61,62 @@ def serve_app(logger: Logger, _status_exchange: StatusExchange) -> None:
     def index() -> Union[Response, str]:
         return render_template("index.html")
 
+    # versions restart with the process, ETags must not match across restarts
+    etag_prefix = uuid.uuid4().hex[:8]
+
+    def not_modified(version: int) -> Optional[Response]:
+        etag = f"{etag_prefix}-{version}"
+        if request.if_none_match.contains(etag):
+            response = make_response("", 304)
+            response.set_etag(etag)
+            return response
+        return None
+
     @app.route("/status", methods=["GET"])
     def get_status() -> Union[Response, str]:
-        _status = _status_exchange.get_status()
-        _config = _status_exchange.get_config()
-        _progress = _status_exchange.get_progress()
+        unchanged = not_modified(_status_exchange.version)
+        if unchanged is not None:
+            return unchanged
+        with _status_exchange.lock:
+            snapshot = _status_exchange.snapshot()
+            _config = _status_exchange.get_config()
+        _status = Status(snapshot["status"])
         if _status == Status.NO_INPUT_NEEDED:
-            return render_template(
-                "no_input.html", status=_status, progress=_progress, config=vars(_config)
+            rendered = render_template(
+                "no_input.html",
+                status=_status,
+                progress=snapshot["progress"],
+                accounts=snapshot["accounts"],
+                # the daemon serves account state outside of any run
+                config=vars(_config) if _config is not None else {},
             )
-        if _status == Status.NEED_MFA:
-            return render_template("code.html")
-        if _status == Status.NEED_PASSWORD:
-            return render_template("password.html", config=_config)
-        return render_template("status.html", status=_status)
+        elif _status == Status.NEED_MFA:
+            rendered = render_template("code.html")
+        elif _status == Status.NEED_PASSWORD:
+            rendered = render_template("password.html", config=_config)
+        else:
+            rendered = render_template("status.html", status=_status)
+        response = make_response(rendered)
+        response.set_etag(f"{etag_prefix}-{snapshot['version']}")
+        return response
+
+    @app.route("/status.json", methods=["GET"])
+    def get_status_json() -> Union[Response, str]:
+        unchanged = not_modified(_status_exchange.version)
+        if unchanged is not None:
+            return unchanged
+        snapshot = _status_exchange.snapshot()
+        response = jsonify(snapshot)
+        response.set_etag(f"{etag_prefix}-{snapshot['version']}")
+        return response
+
+    @app.route("/progress/stream", methods=["GET"])
+    def progress_stream() -> Union[Response, str]:
+        return Response(
+            progress_events(_status_exchange),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
 
     @app.route("/code", methods=["POST"])
     def set_code() -> Union[Response, str]:
@@ -73,5 +154,29 @@ def serve_app(logger: Logger, _status_exchange: StatusExchange) -> None:
         _status_exchange.get_progress().cancel = True
         return make_response("Ok", 200)
 
+    @app.route("/metrics", methods=["GET"])
+    def metrics() -> Union[Response, str]:
+        response = make_response(REGISTRY.exposition(), 200)
+        response.headers["Content-Type"] = "text/plain; version=0.0.4; charset=utf-8"
+        return response
+
+    return app
+
+
+def make_server(
+    logger: Logger, _status_exchange: StatusExchange, host: str = "0.0.0.0", port: int = 8080
+) -> Union[MultiSocketServer, BaseWSGIServer]:
+    """Web server for the app, not yet serving"""
+    return create_server(
+        make_app(logger, _status_exchange),
+        host=host,
+        port=port,
+        threads=constants.WEB_SERVER_THREADS,
+    )
+
+
+def serve_app(logger: Logger, _status_exchange: StatusExchange) -> None:
     logger.debug("Starting web server...")
-    return waitress.serve(app)
+    server = make_server(logger, _status_exchange)
+    server.print_listen("Serving on http://{}:{}")
+    server.run()
@@ -0,0 +1,10 @@
+// counts down to data-deadline (seconds since the epoch), so the server publishes the end of
+// a wait once instead of the time left every second
+setInterval(function() {
+    document.querySelectorAll("[data-deadline]").forEach(function(element) {
+        const left = Math.max(0, Math.ceil(Number(element.dataset.deadline) - Date.now() / 1000));
+        const minutes = String(Math.floor(left / 60) % 60).padStart(2, "0");
+        const seconds = String(left % 60).padStart(2, "0");
+        element.textContent = `${Math.floor(left / 3600)}:${minutes}:${seconds}`;
+    });
+}, 1000);
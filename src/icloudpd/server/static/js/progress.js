@@ -0,0 +1,99 @@
+// keeps the progress card current from the deltas of /progress/stream, so a sync does not
+// render /status for every asset; /status is fetched again only when the status or the
+// accounts change, as they decide what the page shows
+(function() {
+    const state = {};
+    let reloading = false;
+
+    function bytes(value) {
+        const units = ["B", "KB", "MB", "GB", "TB"];
+        let unit = 0;
+        while (value >= 1000 && unit < units.length - 1) {
+            value /= 1000;
+            unit += 1;
+        }
+        return `${value.toFixed(unit === 0 ? 0 : 1)} ${units[unit]}`;
+    }
+
+    function duration(seconds) {
+        const minutes = String(Math.floor(seconds / 60) % 60).padStart(2, "0");
+        return `${Math.floor(seconds / 3600)}:${minutes}:${String(seconds % 60).padStart(2, "0")}`;
+    }
+
+    function setField(name, text) {
+        document.querySelectorAll(`#status [data-field="${name}"]`).forEach(function(element) {
+            element.textContent = text;
+        });
+    }
+
+    function show(name, visible) {
+        document.querySelectorAll(`#status [data-show="${name}"]`).forEach(function(element) {
+            element.hidden = !visible;
+        });
+    }
+
+    function render() {
+        show("downloading", state.photos_count !== 0);
+        show("last_message", state.photos_last_message !== null && state.photos_count === 0);
+        show("waiting", state.waiting !== 0);
+        setField("photos_counter", state.photos_counter);
+        setField("photos_count", state.photos_count);
+        setField("current_file", state.current_file || "");
+        setField("photos_last_message", state.photos_last_message || "");
+        document.querySelectorAll('#status [data-field="photos_percent"]').forEach(function(bar) {
+            bar.style.width = `${state.photos_percent}%`;
+            bar.textContent = `${state.photos_percent} %`;
+            bar.parentElement.setAttribute("aria-valuenow", state.photos_percent);
+        });
+        setField(
+            "bytes",
+            state.bytes_remaining === null
+                ? bytes(state.bytes_downloaded)
+                : `${bytes(state.bytes_downloaded)} of ${bytes(state.bytes_downloaded + state.bytes_remaining)}`
+        );
+        setField("rate", state.bytes_per_second ? `${bytes(state.bytes_per_second)}/s` : "");
+        setField("eta", state.eta_seconds === null ? "" : `${duration(state.eta_seconds)} left`);
+        // countdown.js counts down from here
+        document.querySelectorAll("#status [data-deadline]").forEach(function(element) {
+            element.dataset.deadline = state.waiting_until;
+        });
+    }
+
+    function reload() {
+        if (reloading) {
+            return;
+        }
+        reloading = true;
+        htmx.ajax("GET", "/status", { target: "#status", swap: "innerHTML" }).finally(function() {
+            reloading = false;
+        });
+    }
+
+    function connect() {
+        // reconnects on its own when the server ends the stream, and gets all fields again
+        const source = new EventSource("/progress/stream");
+        source.onmessage = function(event) {
+            const delta = JSON.parse(event.data);
+            const shown = document.querySelector("#status [data-status]");
+            const statusChanged = "status" in delta && (shown
+                ? shown.dataset.status !== delta.status
+                : "status" in state && state.status !== delta.status);
+            const accountsChanged = "accounts" in delta && "accounts" in state
+                && JSON.stringify(delta.accounts) !== JSON.stringify(state.accounts);
+            Object.assign(state, delta);
+            if (statusChanged || accountsChanged) {
+                reload();
+            } else {
+                render();
+            }
+        };
+    }
+
+    document.addEventListener("DOMContentLoaded", connect);
+    // the progress card arrives after the first events
+    document.addEventListener("htmx:afterSwap", function() {
+        if ("photos_count" in state) {
+            render();
+        }
+    });
+})();
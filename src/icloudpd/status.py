@@ -1,6 +1,6 @@
 from enum import Enum
-from threading import Lock
-from typing import Optional
+from threading import Condition, RLock
+from typing import Any, Dict, Optional
 
 from icloudpd.config import Config
 from icloudpd.progress import Progress
@@ -21,11 +21,16 @@ class Status(Enum):
 
 class StatusExchange:
     def __init__(self) -> None:
-        self.lock = Lock()
+        self.lock = RLock()
+        # notified on every status and progress change, so waiting for input or for
+        # the next update does not poll
+        self._changed = Condition(self.lock)
         self._status = Status.NO_INPUT_NEEDED
         self._payload: Optional[str] = None
         self._config: Optional[Config] = None
-        self._progress = Progress()
+        self._progress = Progress(self._changed)
+        # runs, last exit code, start time and duration of accounts synced by the daemon
+        self._accounts: Dict[str, Dict[str, Any]] = {}
 
     def get_status(self) -> Status:
         with self.lock:
@@ -35,10 +40,20 @@ class StatusExchange:
         with self.lock:
             if self._status == expected_status:
                 self._status = new_status
+                self._progress.mark_changed()
                 return True
             else:
                 return False
 
+    def wait_for_status_change(
+        self, current_status: Status, timeout: Optional[float] = None
+    ) -> Status:
+        """Blocks while the status is `current_status`, at most `timeout` seconds;
+        returns the status then"""
+        with self.lock:
+            self._changed.wait_for(lambda: self._status != current_status, timeout)
+            return self._status
+
     def set_payload(self, payload: str) -> bool:
         with self.lock:
             if self._status != Status.NEED_MFA and self._status != Status.NEED_PASSWORD:
@@ -48,6 +63,7 @@ class StatusExchange:
             self._status = (
                 Status.SUPPLIED_MFA if self._status == Status.NEED_MFA else Status.SUPPLIED_PASSWORD
             )
+            self._progress.mark_changed()
             return True
 
     def get_payload(self) -> Optional[str]:
@@ -65,6 +81,7 @@ class StatusExchange:
     def set_config(self, config: Config) -> None:
         with self.lock:
             self._config = config
+            self._progress.mark_changed()
 
     def get_config(self) -> Optional[Config]:
         with self.lock:
@@ -73,3 +90,36 @@ class StatusExchange:
     def get_progress(self) -> Progress:
         with self.lock:
             return self._progress
+
+    def update_account(self, name: str, **state: Any) -> None:
+        """Merges `state` into the state of account `name`"""
+        with self.lock:
+            self._accounts.setdefault(name, {}).update(state)
+            self._progress.mark_changed()
+
+    def get_accounts(self) -> Dict[str, Dict[str, Any]]:
+        with self.lock:
+            return {name: dict(state) for name, state in self._accounts.items()}
+
+    @property
+    def version(self) -> int:
+        """Grows with every change of status, config or progress"""
+        with self.lock:
+            return self._progress.version
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Status and progress as of one moment, for the web UI"""
+        with self.lock:
+            return {
+                "version": self._progress.version,
+                "status": self._status.value,
+                "progress": self._progress.snapshot(),
+                "accounts": self.get_accounts(),
+            }
+
+    def wait_for_change(self, version: int, timeout: Optional[float] = None) -> int:
+        """Blocks while nothing changed since `version`, at most `timeout` seconds;
+        returns the version then"""
+        with self.lock:
+            self._changed.wait_for(lambda: self._progress.version != version, timeout)
+            return self._progress.version
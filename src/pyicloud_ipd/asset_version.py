@@ -1,12 +1,13 @@
-from typing import Union
+from typing import Optional, Union
 
 
 class AssetVersion:
-    def __init__(self, filename: str, size: int, url: str, type: str) -> None:
+    def __init__(self, filename: str, size: int, url: str, type: str, checksum: Optional[str] = None) -> None:
         self.filename = filename
         self.size = size
         self.url = url
         self.type = type
+        self.checksum = checksum
 
     def __eq__(self, other: object) -> bool: 
         if not isinstance(other, AssetVersion):
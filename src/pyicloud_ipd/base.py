@@ -4,6 +4,8 @@ import typing
 from uuid import uuid1
 import json
 import logging
+import os
+import time
 from tempfile import gettempdir
 from os import path, mkdir
 from re import match
@@ -12,6 +14,11 @@ import getpass
 
 from requests import PreparedRequest, Request, Response
 
+if typing.TYPE_CHECKING:
+    # services are imported when first used, most runs only need photos
+    from pyicloud_ipd.services.findmyiphone import AppleDevice
+    from pyicloud_ipd.services.photos import PhotosService
+
 from pyicloud_ipd.exceptions import (
     PyiCloudConnectionException,
     PyiCloudFailedLoginException,
@@ -20,13 +27,6 @@ from pyicloud_ipd.exceptions import (
 )
 from pyicloud_ipd.file_match import FileMatchPolicy
 from pyicloud_ipd.raw_policy import RawTreatmentPolicy
-from pyicloud_ipd.services.findmyiphone import AppleDevice, FindMyiPhoneServiceManager
-from pyicloud_ipd.services.calendar import CalendarService
-from pyicloud_ipd.services.ubiquity import UbiquityService
-from pyicloud_ipd.services.contacts import ContactsService
-from pyicloud_ipd.services.reminders import RemindersService
-from pyicloud_ipd.services.photos import PhotosService
-from pyicloud_ipd.services.account import AccountService
 from pyicloud_ipd.session import PyiCloudPasswordFilter, PyiCloudSession
 from pyicloud_ipd.sms import AuthenticatedSession, TrustedDevice, build_send_sms_code_request, build_trusted_phone_numbers_request, build_verify_sms_code_request, parse_trusted_phone_numbers_response
 
@@ -70,6 +70,7 @@ class PyiCloudService:
         file_match_policy: FileMatchPolicy,
         apple_id: str, password:str, cookie_directory:Optional[str]=None, verify:bool=True,
         client_id:Optional[str]=None, with_family:bool=True,
+        session_freshness:float=0,
     ):
         self.filename_cleaner = filename_cleaner
         self.lp_filename_generator = lp_filename_generator
@@ -80,6 +81,8 @@ class PyiCloudService:
         self.params: Dict[str, Any] = {}
         self.client_id: str = client_id or ("auth-%s" % str(uuid1()).lower())
         self.with_family = with_family
+        # seconds a successful validation is trusted by later instances
+        self.session_freshness = session_freshness
 
         self.password_filter = PyiCloudPasswordFilter(password)
         LOGGER.addFilter(self.password_filter)
@@ -154,9 +157,34 @@ class PyiCloudService:
             'clientId': self.client_id,
         }
 
-        self.authenticate()
+        if not self._authenticate_from_cache():
+            self.authenticate()
+
+        self._photos: Optional["PhotosService"] = None
 
-        self._photos: Optional[PhotosService] = None
+    def use_policies(
+            self,
+            filename_cleaner: Callable[[str], str],
+            lp_filename_generator: Callable[[str], str],
+            raw_policy: RawTreatmentPolicy,
+            file_match_policy: FileMatchPolicy) -> None:
+        """Applies naming policies of the next run to a service kept between runs.
+        Assets read them on access, so the photos catalog stays usable"""
+        self.filename_cleaner = filename_cleaner
+        self.lp_filename_generator = lp_filename_generator
+        self.raw_policy = raw_policy
+        self.file_match_policy = file_match_policy
+        if self._photos:
+            self._photos.filename_cleaner = filename_cleaner
+            self._photos.lp_filename_generator = lp_filename_generator
+            self._photos.raw_policy = raw_policy
+            self._photos.file_match_policy = file_match_policy
+
+    def refresh_photos(self) -> None:
+        """Makes a service kept between runs read albums, libraries and asset counts
+        again on the next run; the session and its connections are kept"""
+        if self._photos:
+            self._photos.refresh()
 
     def authenticate(self, force_refresh:bool=False, service:Optional[Any]=None) -> None:
         """
@@ -224,10 +252,58 @@ class PyiCloudService:
         self.params.update({'dsid': self.data['dsInfo']['dsid']})
 
         self._webservices = self.data["webservices"]
+        self.session.flush()
+        self._save_validation()
 
         LOGGER.info("Authentication completed successfully")
         LOGGER.debug(self.params)
 
+    def _authenticate_from_cache(self) -> bool:
+        """
+        Trusts account data of a validation done less than `session_freshness`
+        seconds ago with the same session token, instead of validating again.
+        Callers re-authenticate when a request fails with a session error.
+        """
+        if self.session_freshness <= 0 or not self.session_data.get("session_token"):
+            return False
+        try:
+            with open(self.validation_path, encoding="utf-8") as validation_f:
+                validation = json.load(validation_f)
+            age = time.time() - validation["validated_at"]
+            if (
+                validation["session_token"] != self.session_data["session_token"]
+                or not 0 <= age <= self.session_freshness
+            ):
+                return False
+            data = validation["data"]
+            webservices = data["webservices"]
+            dsid = data["dsInfo"]["dsid"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+
+        LOGGER.debug("Session was validated %d seconds ago, not validating again", age)
+        self.data = data
+        self.params.update({'dsid': dsid})
+        self._webservices = webservices
+        return True
+
+    def _save_validation(self) -> None:
+        """Remembers account data of a successful validation for `session_freshness`"""
+        if self.session_freshness <= 0 or self.requires_2sa or "webservices" not in self.data:
+            return
+        validation = {
+            "validated_at": time.time(),
+            "session_token": self.session_data.get("session_token"),
+            "data": self.data,
+        }
+        temp_path = self.validation_path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as validation_f:
+                json.dump(validation, validation_f)
+            os.replace(temp_path, self.validation_path)
+        except OSError as error:
+            LOGGER.warning("Failed to save session validation: %s", error)
+
     def _authenticate_with_token(self) -> None:
         """Authenticate using session token."""
         data = {
@@ -252,6 +328,9 @@ class PyiCloudService:
             msg = f'Apple insists on using {domain_to_use} for your request. Please use --domain parameter'
             raise PyiCloudConnectionException(msg)
 
+        self.session.flush()
+        self._save_validation()
+
     def _authenticate_with_credentials_service(self, service: str) -> None:
         """Authenticate to a specific service using credentials."""
         data = {
@@ -316,6 +395,15 @@ class PyiCloudService:
             + ".session",
         )
 
+    @property
+    def validation_path(self) -> str:
+        """Get path for the last successful session validation."""
+        return path.join(
+            self._cookie_directory,
+            "".join([c for c in self.user.get("accountName") if match(r"\w", c)]) # type: ignore[union-attr]
+            + ".validated",
+        )
+
     @property
     def requires_2sa(self) -> bool:
         """Returns True if two-step authentication is required."""
@@ -508,8 +596,9 @@ class PyiCloudService:
         return typing.cast(str, self._webservices[ws_key]["url"])
 
     @property
-    def devices(self) -> Sequence[AppleDevice]: 
+    def devices(self) -> Sequence["AppleDevice"]: 
         """ Return all devices."""
+        from pyicloud_ipd.services.findmyiphone import AppleDevice, FindMyiPhoneServiceManager
         service_root = self._get_webservice_url("findme")
         return typing.cast(Sequence[AppleDevice], FindMyiPhoneServiceManager(
             service_root,
@@ -519,6 +608,7 @@ class PyiCloudService:
 
     @property
     def account(self): # type: ignore
+        from pyicloud_ipd.services.account import AccountService
         service_root = self._gget_webservice_url("account") # type: ignore
         return AccountService( # type: ignore
             service_root,
@@ -533,6 +623,7 @@ class PyiCloudService:
     @property
     def files(self): # type: ignore
         if not hasattr(self, '_files'):
+            from pyicloud_ipd.services.ubiquity import UbiquityService
             service_root = self._get_webservice_url("ubiquity")
             self._files = UbiquityService( # type: ignore
                 service_root,
@@ -542,9 +633,10 @@ class PyiCloudService:
         return self._files
 
     @property
-    def photos(self) -> PhotosService:
+    def photos(self) -> "PhotosService":
         """Gets the 'Photo' service."""
         if not self._photos:
+            from pyicloud_ipd.services.photos import PhotosService
             service_root = self._get_webservice_url("ckdatabasews")
             self._photos = PhotosService(
                 service_root, 
@@ -559,16 +651,19 @@ class PyiCloudService:
 
     @property
     def calendar(self): # type: ignore
+        from pyicloud_ipd.services.calendar import CalendarService
         service_root = self._get_webservice_url("calendar")
         return CalendarService(service_root, self.session, self.params)# type: ignore
 
     @property
     def contacts(self): # type: ignore
+        from pyicloud_ipd.services.contacts import ContactsService
         service_root = self._get_webservice_url("contacts")
         return ContactsService(service_root, self.session, self.params)# type: ignore
 
     @property
     def reminders(self): # type: ignore
+        from pyicloud_ipd.services.reminders import RemindersService
         service_root = self._get_webservice_url("reminders")
         return RemindersService(service_root, self.session, self.params)# type: ignore
 
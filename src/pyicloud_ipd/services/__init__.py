@@ -1,7 +1,30 @@
-from pyicloud_ipd.services.calendar import CalendarService
-from pyicloud_ipd.services.findmyiphone import FindMyiPhoneServiceManager
-from pyicloud_ipd.services.ubiquity import UbiquityService
-from pyicloud_ipd.services.contacts import ContactsService
-from pyicloud_ipd.services.reminders import RemindersService
-from pyicloud_ipd.services.photos import PhotosService
-from pyicloud_ipd.services.account import AccountService
+import importlib
+import typing
+
+if typing.TYPE_CHECKING:
+    from pyicloud_ipd.services.account import AccountService
+    from pyicloud_ipd.services.calendar import CalendarService
+    from pyicloud_ipd.services.contacts import ContactsService
+    from pyicloud_ipd.services.findmyiphone import FindMyiPhoneServiceManager
+    from pyicloud_ipd.services.photos import PhotosService
+    from pyicloud_ipd.services.reminders import RemindersService
+    from pyicloud_ipd.services.ubiquity import UbiquityService
+
+# services are loaded on first access, so importing one does not import all of them
+_SERVICE_MODULES = {
+    "CalendarService": "calendar",
+    "FindMyiPhoneServiceManager": "findmyiphone",
+    "UbiquityService": "ubiquity",
+    "ContactsService": "contacts",
+    "RemindersService": "reminders",
+    "PhotosService": "photos",
+    "AccountService": "account",
+}
+
+
+def __getattr__(name: str) -> typing.Any:
+    module_name = _SERVICE_MODULES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(f"{__name__}.{module_name}")
+    return getattr(module, name)
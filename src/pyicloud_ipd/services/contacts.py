@@ -36,8 +36,8 @@ class ContactsService(object):
         self.response = req.json()
         params_refresh = dict(self.params)
         params_refresh.update({
-            'prefToken': req.json()["prefToken"],
-            'syncToken': req.json()["syncToken"],
+            'prefToken': self.response["prefToken"],
+            'syncToken': self.response["syncToken"],
         })
         self.session.post(self._contacts_changeset_url, params=params_refresh)
         req = self.session.get(
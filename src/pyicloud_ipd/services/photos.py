@@ -5,6 +5,7 @@ import json
 import logging
 import base64
 import re
+import threading
 
 from datetime import datetime
 from typing import Any, Callable, Dict, Generator, Optional, Sequence, Tuple, TypeVar, Union, cast
@@ -13,6 +14,8 @@ import typing
 from requests import Response
 from foundation import wrap_param_in_exception, bytes_decode
 from foundation.core import compose, identity
+from foundation.metrics import REGISTRY
+from foundation.phases import phase
 from pyicloud_ipd.asset_version import AssetVersion
 from pyicloud_ipd.exceptions import PyiCloudServiceNotActivatedException
 from pyicloud_ipd.exceptions import PyiCloudAPIResponseException
@@ -30,6 +33,11 @@ from pyicloud_ipd.version_size import AssetVersionSize, LivePhotoVersionSize, Ve
 
 logger = logging.getLogger(__name__)
 
+PAGE_SECONDS = REGISTRY.histogram(
+    "icloud_listing_page_duration_seconds", "Time to fetch and decode one page of an album listing"
+)
+ASSETS_LISTED = REGISTRY.counter("icloud_assets_listed_total", "Assets read from album listings")
+
 
 class PhotoLibrary(object):
     """Represents a library in the user's photos.
@@ -159,29 +167,39 @@ class PhotoLibrary(object):
         self.zone_id = zone_id
 
         self._albums: Optional[Dict[str, PhotoAlbum]] = None
+        # indexing state is checked on first use, see check_indexing_state
+        self._indexing_checked = False
+        self._indexing_lock = threading.Lock()
+
+    def check_indexing_state(self) -> None:
+        """Makes sure iCloud finished indexing the library. Asks only once per library"""
+        with self._indexing_lock:
+            if self._indexing_checked:
+                return
+            url = ('%s/records/query?%s' %
+                   (self.service._service_endpoint, urlencode(self.service.params)))
+            json_data = json.dumps({
+                "query": {"recordType":"CheckIndexingState"},
+                "zoneID": self.zone_id,
+            })
 
-        url = ('%s/records/query?%s' %
-               (self.service._service_endpoint, urlencode(self.service.params)))
-        json_data = json.dumps({
-            "query": {"recordType":"CheckIndexingState"},
-            "zoneID": self.zone_id,
-        })
-
-        request = self.service.session.post(
-            url,
-            data=json_data,
-            headers={'Content-type': 'text/plain'}
-        )
-        response = request.json()
-        indexing_state = response['records'][0]['fields']['state']['value']
-        if indexing_state != 'FINISHED':
-            raise PyiCloudServiceNotActivatedException(
-                ('iCloud Photo Library not finished indexing.  Please try '
-                 'again in a few minutes'), None)
+            request = self.service.session.post(
+                url,
+                data=json_data,
+                headers={'Content-type': 'text/plain'}
+            )
+            response = request.json()
+            indexing_state = response['records'][0]['fields']['state']['value']
+            if indexing_state != 'FINISHED':
+                raise PyiCloudServiceNotActivatedException(
+                    ('iCloud Photo Library not finished indexing.  Please try '
+                     'again in a few minutes'), None)
+            self._indexing_checked = True
 
     @property
     def albums(self) -> Dict[str, "PhotoAlbum"]:
         if not self._albums:
+            self.check_indexing_state()
             self._albums = {
                 name: PhotoAlbum(self.service, name, zone_id=self.zone_id, **props) # type: ignore[arg-type] # dynamically builing params 
                 for (name, props) in self.SMART_FOLDERS.items()
@@ -217,6 +235,13 @@ class PhotoLibrary(object):
 
         return self._albums
 
+    def refresh(self) -> None:
+        """Forgets albums and asset counts read so far, so albums created since are found
+        and counts are fetched again; the session is kept"""
+        for album in (self._albums or {}).values():
+            album._len = None
+        self._albums = None
+
     def _fetch_folders(self) -> Sequence[Dict[str, Any]]:
         url = ('%s/records/query?%s' %
                (self.service._service_endpoint, urlencode(self.service.params)))
@@ -283,6 +308,14 @@ class PhotosService(PhotoLibrary):
         super(PhotosService, self).__init__(
             service=self, zone_id={u'zoneName': u'PrimarySync'})
 
+    def refresh(self) -> None:
+        """Forgets libraries, albums and asset counts read so far, see `PhotoLibrary.refresh`"""
+        super(PhotosService, self).refresh()
+        for library in (self._libraries or {}).values():
+            if library is not self:
+                library.refresh()
+        self._libraries = None
+
     @property
     def libraries(self) -> Dict[str, PhotoLibrary]:
         if not self._libraries:
@@ -344,21 +377,47 @@ class PhotoAlbum(object):
 
     def __len__(self) -> int:
         if self._len is None:
-            url = ('%s/internal/records/query/batch?%s' %
-                   (self.service._service_endpoint,
-                    urlencode(self.service.params)))
-            request = self.service.session.post(
-                url,
-                data=json.dumps(self._count_query_gen(self.obj_type)),
-                headers={'Content-type': 'text/plain'}
-            )
-            response = request.json()
-
-            self._len = (response["batch"][0]["records"][0]["fields"]
-                         ["itemCount"]["value"])
+            self._len = self._fetch_count()
 
         return self._len
 
+    def _fetch_count(self) -> int:
+        url = ('%s/internal/records/query/batch?%s' %
+               (self.service._service_endpoint,
+                urlencode(self.service.params)))
+        request = self.service.session.post(
+            url,
+            data=json.dumps(self._count_query_gen(self.obj_type)),
+            headers={'Content-type': 'text/plain'}
+        )
+        response = request.json()
+
+        return typing.cast(int, response["batch"][0]["records"][0]["fields"]
+                           ["itemCount"]["value"])
+
+    def change_probe(self, newest: int) -> Tuple[int, Sequence[Tuple[str, str]]]:
+        """Cheap signature of the album: current item count and record names with
+        change tags of the `newest` assets listed first. Two small requests instead
+        of a full listing; when the signature is unchanged, so is the album, short of
+        edits to older assets"""
+        self._len = self._fetch_count()
+        query = self._list_query_gen(0, self.list_type, self.direction, self.query_filter)
+        # asset and master record per item
+        query['resultsLimit'] = newest * 2
+        query['desiredKeys'] = ['recordName', 'recordChangeTag', 'masterRef']
+        url = ('%s/records/query?' % self.service._service_endpoint) + \
+            urlencode(self.service.params)
+        response = self.service.session.post(
+            url,
+            data=json.dumps(query),
+            headers={'Content-type': 'text/plain'}
+        ).json()
+        tags = sorted(
+            (rec['recordName'], rec.get('recordChangeTag', ''))
+            for rec in response['records']
+        )
+        return (self._len, tags)
+
     # Perform the request in a separate method so that we
     # can mock it to test session errors.
     def photos_request(self, offset: int) -> Response:
@@ -384,7 +443,9 @@ class PhotoAlbum(object):
 
         while(True):
             try:
-                request = self.photos_request(offset)
+                with phase("list_page", PAGE_SECONDS):
+                    request = self.photos_request(offset)
+                    response = request.json()
             except PyiCloudAPIResponseException as ex:
                 if self.exception_handler:
                     exception_retries += 1
@@ -407,19 +468,19 @@ class PhotoAlbum(object):
 #                headers={'Content-type': 'text/plain'}
 #            )
 
-            response = request.json()
-
             asset_records = {}
             master_records = []
-            for rec in response['records']:
-                if rec['recordType'] == "CPLAsset":
-                    master_id = \
-                        rec['fields']['masterRef']['value']['recordName']
-                    asset_records[master_id] = rec
-                elif rec['recordType'] == "CPLMaster":
-                    master_records.append(rec)
+            with phase("list_parse"):
+                for rec in response['records']:
+                    if rec['recordType'] == "CPLAsset":
+                        master_id = \
+                            rec['fields']['masterRef']['value']['recordName']
+                        asset_records[master_id] = rec
+                    elif rec['recordType'] == "CPLMaster":
+                        master_records.append(rec)
 
             master_records_len = len(master_records)
+            ASSETS_LISTED.inc(amount=master_records_len)
             if master_records_len:
                 if self.direction == "DESCENDING":
                     offset = offset - master_records_len
@@ -763,6 +824,7 @@ class PhotoAsset(object):
                     if size_entry:
                         version['size'] = size_entry['value']['size']
                         version['url'] = size_entry['value']['downloadURL']
+                        version['checksum'] = size_entry['value'].get('fileChecksum')
                     else:
                         raise ValueError(f"Expected {prefix}Res, but missing it")
                         # version['size'] = None
@@ -789,7 +851,7 @@ class PhotoAsset(object):
                         _size_suffix = self.VERSION_FILENAME_SUFFIX_LOOKUP[key]
                         version["filename"] = add_suffix_to_filename(f"-{_size_suffix}", version["filename"])
 
-                    _versions[key] = AssetVersion(version["filename"], version['size'], version['url'], version['type'])
+                    _versions[key] = AssetVersion(version["filename"], version['size'], version['url'], version['type'], version['checksum'])
 
             # swap original & alternative according to swap_raw_policy
             if AssetVersionSize.ALTERNATIVE in _versions and (("raw" in _versions[AssetVersionSize.ALTERNATIVE].type and self._service.raw_policy == RawTreatmentPolicy.AS_ORIGINAL) or ("raw" in _versions[AssetVersionSize.ORIGINAL].type and self._service.raw_policy == RawTreatmentPolicy.AS_ALTERNATIVE)):
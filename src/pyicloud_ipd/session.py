@@ -1,11 +1,21 @@
-from typing import Any, Dict, NoReturn, Optional, Sequence
+from typing import Any, Dict, Iterable, List, NoReturn, Optional, Sequence, Tuple
 from typing_extensions import override
 import typing
-import inspect
+import atexit
+import itertools
 import json
 import logging
-from requests import Session
-
+import os
+import sys
+import threading
+import time
+import weakref
+from urllib.parse import urlparse
+from requests import Response, Session
+from requests.adapters import HTTPAdapter
+
+from foundation.metrics import REGISTRY
+from foundation.phases import phase
 from pyicloud_ipd.exceptions import (
     PyiCloudAPIResponseException,
     PyiCloud2SARequiredException,
@@ -14,6 +24,28 @@ from pyicloud_ipd.exceptions import (
 
 LOGGER = logging.getLogger(__name__)
 
+REQUEST_SECONDS = REGISTRY.histogram(
+    "icloud_request_duration_seconds",
+    "Time until iCloud response headers arrived, by endpoint",
+    ["endpoint"],
+)
+REQUEST_RETRIES = REGISTRY.counter(
+    "icloud_request_retries_total", "Requests repeated after an error response", ["endpoint"]
+)
+THROTTLED_RESPONSES = REGISTRY.counter(
+    "icloud_throttled_responses_total",
+    "Responses asking to slow down (429, 503 or ACCESS_DENIED)",
+    ["endpoint"],
+)
+
+
+def metrics_endpoint(url: str, stream: bool) -> str:
+    """Label for a request: host and path, only the host for downloads, whose paths are
+    unique per asset"""
+    parsed = urlparse(url)
+    host = parsed.hostname or ""
+    return host if stream else host + parsed.path
+
 HEADER_DATA = {
     "X-Apple-ID-Account-Country": "account_country",
     "X-Apple-ID-Session-Id": "session_id",
@@ -25,6 +57,91 @@ HEADER_DATA = {
     "scnt": "scnt",
 }
 
+try:
+    import orjson as _orjson
+except ImportError:  # optional, faster decoding of large listings
+    _orjson = None  # type: ignore[assignment]
+
+
+def decode_json(response: Response) -> Any:
+    """Parses the body with orjson when it is installed, with requests otherwise"""
+    if _orjson is not None:
+        try:
+            return _orjson.loads(response.content)
+        except ValueError:
+            # e.g. not UTF-8; let requests guess the encoding
+            pass
+    return response.json()
+
+
+def cache_json(response: Response, data: Any) -> None:
+    """Makes later response.json() calls return already decoded data"""
+    response.json = lambda **_kwargs: data  # type: ignore[method-assign]
+
+
+# Opt-in channel for HTTP bodies and headers, see WireLog
+WIRE_LOGGER = logging.getLogger("pyicloud_ipd.wire")
+# not enabled by a DEBUG root logger, only by WireLog.configure
+WIRE_LOGGER.setLevel(logging.INFO)
+
+
+class Truncated:
+    """Formats the value only when the log record is emitted, cut to `limit` characters"""
+
+    def __init__(self, value: Any, limit: int):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self) -> str:
+        if isinstance(self.value, bytes):
+            text = self.value[: self.limit * 4].decode("utf-8", "replace")
+        else:
+            text = str(self.value)
+        if len(text) <= self.limit:
+            return text
+        return f"{text[: self.limit]}... (truncated)"
+
+
+class WireLog:
+    """Logs request bodies, response headers and response bodies of every n-th request"""
+
+    def __init__(self) -> None:
+        self.sample_every = 1
+        self.limit = 2048
+        self._counter = itertools.count()
+
+    def configure(self, enabled: bool, sample_every: int = 1, limit: int = 2048) -> None:
+        WIRE_LOGGER.setLevel(logging.DEBUG if enabled else logging.INFO)
+        self.sample_every = sample_every
+        self.limit = limit
+        self._counter = itertools.count()
+
+    def sampled(self) -> bool:
+        """Whether the current request should be logged"""
+        return (
+            WIRE_LOGGER.isEnabledFor(logging.DEBUG)
+            and next(self._counter) % self.sample_every == 0
+        )
+
+    def request(self, method: str, url: str, data: Any) -> None:
+        WIRE_LOGGER.debug("> %s %s %s", method, url, Truncated(data, self.limit))
+
+    def response(self, response: Response) -> None:
+        WIRE_LOGGER.debug(
+            "< %s %s %s %s",
+            response.status_code,
+            response.url,
+            Truncated(response.headers, self.limit),
+            Truncated(response.content, self.limit),
+        )
+
+
+WIRE_LOG = WireLog()
+
+# Changes to session data and cookies are written at most this often;
+# pending changes are written on exit and after authentication
+SAVE_DELAY_SECONDS = 5.0
+
 
 class PyiCloudPasswordFilter(logging.Filter):
     def __init__(self, password: str):
@@ -40,35 +157,154 @@ class PyiCloudPasswordFilter(logging.Filter):
         return True
 
 
+def _flush_on_exit(session_ref: "weakref.ReferenceType[PyiCloudSession]") -> None:
+    session = session_ref()
+    if session is not None:
+        session.flush()
+
+
 class PyiCloudSession(Session):
     """iCloud session."""
 
-    def __init__(self, service: Any):
+    def __init__(self, service: Any, save_delay: float = SAVE_DELAY_SECONDS):
         self.service = service
+        self.save_delay = save_delay
+        self._save_lock = threading.Lock()
+        self._dirty_since: Optional[float] = None
+        self._saved_session_data: Optional[str] = None
+        self._saved_cookies: Optional[List[Tuple[Any, ...]]] = None
+        self._request_loggers: Dict[str, logging.Logger] = {}
+        self._warm_ups: List[threading.Thread] = []
         super().__init__()
+        if service.password_filter not in WIRE_LOGGER.filters:
+            WIRE_LOGGER.addFilter(service.password_filter)
+        atexit.register(_flush_on_exit, weakref.ref(self))
+
+    def _request_logger(self) -> logging.Logger:
+        """Logger of the module that called get/post/..., to charge logging to the right
+        service endpoint. Reads the frame directly, inspect.stack() would load source context"""
+        try:
+            module_name = sys._getframe(3).f_globals.get("__name__", __name__)
+        except ValueError:
+            module_name = __name__
+        request_logger = self._request_loggers.get(module_name)
+        if request_logger is None:
+            request_logger = logging.getLogger(module_name).getChild("http")
+            if self.service.password_filter not in request_logger.filters:
+                request_logger.addFilter(self.service.password_filter)
+            self._request_loggers[module_name] = request_logger
+        return request_logger
+
+    def warm_up(self, urls: Iterable[str]) -> None:
+        """Opens a pooled connection to each host of `urls` in the background, so requests
+        there find it in the pool instead of waiting for DNS, TCP and TLS. Requests never wait
+        for a warm-up: one sent while it still connects opens its own connection, as it would
+        without warm-up, and later requests reuse both. Connections that were dropped
+        meanwhile are replaced, live ones are left alone"""
+        hosts: Dict[str, str] = {}
+        for url in urls:
+            hosts.setdefault(urlparse(url).netloc, url)
+        for host, url in hosts.items():
+            thread = threading.Thread(
+                target=self._connect, args=(host, url), name=f"warm-up {host}", daemon=True
+            )
+            thread.start()
+            self._warm_ups.append(thread)
+
+    def join_warm_ups(self) -> None:
+        """Waits for warm-ups still connecting, so they do not pile up across cycles"""
+        while True:
+            try:
+                thread = self._warm_ups.pop()
+            except IndexError:
+                return
+            thread.join()
+
+    def _connect(self, host: str, url: str) -> None:
+        try:
+            adapter = self.get_adapter(url)
+            if not isinstance(adapter, HTTPAdapter):
+                return
+            pool = adapter.get_connection(url, self.proxies) # type: ignore[no-untyped-call]
+            # same certificate settings send() would apply to the pool
+            adapter.cert_verify(pool, url, self.verify, self.cert) # type: ignore[no-untyped-call]
+            conn = pool._get_conn()
+            try:
+                if conn.sock is None:
+                    conn.connect()
+                    LOGGER.debug("Connected to %s ahead of use", host)
+            finally:
+                pool._put_conn(conn)
+        except Exception as error:
+            # the request itself will connect and report problems
+            LOGGER.debug("Could not connect to %s ahead of use: %s", host, error)
+
+    def _cookie_state(self) -> List[Tuple[Any, ...]]:
+        return [(c.domain, c.path, c.name, c.value, c.expires) for c in self.cookies]
+
+    def _save_later(self) -> None:
+        """Writes session data and cookies if they changed and the save delay has passed"""
+        with self._save_lock:
+            if self._dirty_since is None:
+                if (
+                    json.dumps(self.service.session_data) == self._saved_session_data
+                    and self._cookie_state() == self._saved_cookies
+                ):
+                    return
+                self._dirty_since = time.monotonic()
+            if time.monotonic() - self._dirty_since < self.save_delay:
+                return
+        self.flush()
+
+    def flush(self) -> None:
+        """Writes changed session data and cookies now, replacing the files atomically"""
+        with self._save_lock:
+            self._dirty_since = None
+            session_data = json.dumps(self.service.session_data)
+            cookies = self._cookie_state()
+            try:
+                if session_data != self._saved_session_data:
+                    temp_path = self.service.session_path + ".tmp"
+                    with open(temp_path, "w", encoding="utf-8") as outfile:
+                        outfile.write(session_data)
+                    os.replace(temp_path, self.service.session_path)
+                    self._saved_session_data = session_data
+                    LOGGER.debug("Saved session data to file")
+
+                if cookies != self._saved_cookies:
+                    temp_path = self.service.cookiejar_path + ".tmp"
+                    self.cookies.save(filename=temp_path, ignore_discard=True, ignore_expires=True) # type: ignore[attr-defined]
+                    os.replace(temp_path, self.service.cookiejar_path)
+                    self._saved_cookies = cookies
+                    LOGGER.debug("Cookies saved to %s", self.service.cookiejar_path)
+            except OSError as error:
+                LOGGER.warning("Failed to save session: %s", error)
 
     @override
     # type: ignore 
     def request(self, method: str, url, **kwargs):  
 
-        # Charge logging to the right service endpoint
-        callee = inspect.stack()[2]
-        module = inspect.getmodule(callee[0])
-        request_logger = logging.getLogger(module.__name__).getChild("http") #type: ignore[union-attr]
-        if self.service.password_filter not in request_logger.filters:
-            request_logger.addFilter(self.service.password_filter)
+        request_logger = self._request_logger()
 
-        request_logger.debug("%s %s %s", method, url, kwargs.get("data", ""))
+        request_logger.debug("%s %s", method, url)
+        wire_sampled = WIRE_LOG.sampled()
+        if wire_sampled:
+            WIRE_LOG.request(method, url, kwargs.get("data", ""))
 
         has_retried = kwargs.get("retried")
         kwargs.pop("retried", None)
+        endpoint = metrics_endpoint(url, bool(kwargs.get("stream")))
+        started = time.monotonic()
         response = super().request(method, url, **kwargs)
+        REQUEST_SECONDS.observe(time.monotonic() - started, endpoint)
+        if response.status_code in (429, 503):
+            THROTTLED_RESPONSES.inc(endpoint)
+        if wire_sampled:
+            WIRE_LOG.response(response)
 
         content_type = response.headers.get("Content-Type", "").split(";")[0]
         json_mimetypes = ["application/json", "text/json"]
 
-        request_logger.debug(response.headers)
-
         for header, value in HEADER_DATA.items():
             if response.headers.get(header):
                 session_arg = value
@@ -76,14 +312,7 @@ class PyiCloudSession(Session):
                     {session_arg: response.headers.get(header)}
                 )
 
-        # Save session_data to file
-        with open(self.service.session_path, "w", encoding="utf-8") as outfile:
-            json.dump(self.service.session_data, outfile)
-            LOGGER.debug("Saved session data to file")
-
-        # Save cookies to file
-        self.cookies.save(ignore_discard=True, ignore_expires=True) # type: ignore[attr-defined]
-        LOGGER.debug("Cookies saved to %s", self.service.cookiejar_path)
+        self._save_later()
 
         if not response.ok and (
             content_type not in json_mimetypes
@@ -107,6 +336,7 @@ class PyiCloudSession(Session):
                     except PyiCloudAPIResponseException:
                         LOGGER.debug("Re-authentication failed")
                     kwargs["retried"] = True
+                    REQUEST_RETRIES.inc(endpoint)
                     return self.request(method, url, **kwargs)
             except Exception:
                 pass
@@ -117,6 +347,7 @@ class PyiCloudSession(Session):
                 )
                 request_logger.debug(api_error)
                 kwargs["retried"] = True
+                REQUEST_RETRIES.inc(endpoint)
                 return self.request(method, url, **kwargs)
 
             self._raise_error(str(response.status_code), response.reason)
@@ -129,13 +360,17 @@ class PyiCloudSession(Session):
 
             return response
 
-        try:
-            data = response.json() if response.status_code != 204 else {}
-        except:  
-            request_logger.warning("Failed to parse response with JSON mimetype")
-            return response
-
-        request_logger.debug(data)
+        if response.status_code == 204:
+            data = {}
+        else:
+            try:
+                with phase("json_decode"):
+                    data = decode_json(response)
+            except:  
+                request_logger.warning("Failed to parse response with JSON mimetype")
+                return response
+            # callers parse the same response again, decode only once
+            cache_json(response, data)
 
         if isinstance(data, dict):
             if data.get("hasError"):
@@ -147,6 +382,8 @@ class PyiCloudSession(Session):
                 if errors:
                     code = errors[0].get("code")
                     reason = errors[0].get("message")
+                if code == "ACCESS_DENIED":
+                    THROTTLED_RESPONSES.inc(endpoint)
                 self._raise_error(code or "Unknown", reason or "Unknown")
             elif not data.get("success"):
                 reason = data.get("errorMessage")
@@ -164,6 +401,8 @@ class PyiCloudSession(Session):
                     code = data.get("error")
 
                 if reason:
+                    if code == "ACCESS_DENIED":
+                        THROTTLED_RESPONSES.inc(endpoint)
                     self._raise_error(code or "Unknown", reason)
 
         return response
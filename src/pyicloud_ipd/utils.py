@@ -2,7 +2,6 @@ import copy
 import os
 from typing import Dict, Optional, Sequence
 import typing
-import keyring
 
 from pyicloud_ipd.asset_version import AssetVersion
 from pyicloud_ipd.version_size import AssetVersionSize, VersionSize
@@ -34,6 +33,7 @@ def password_exists_in_keyring(username:str) -> bool:
 
 
 def get_password_from_keyring(username:str) -> Optional[str]:
+    import keyring
     result = keyring.get_password(
         KEYRING_SYSTEM,
         username
@@ -55,6 +55,7 @@ def store_password_in_keyring(username: str, password:str) -> None:
     # if get_password_from_keyring(username) is not None:
     #     # Apple can save only into empty keyring
     #     return delete_password_in_keyring(username)
+    import keyring
     return keyring.set_password(
         KEYRING_SYSTEM,
         username,
@@ -63,6 +64,7 @@ def store_password_in_keyring(username: str, password:str) -> None:
 
 
 def delete_password_in_keyring(username:str) -> None:
+    import keyring
     return keyring.delete_password(
         KEYRING_SYSTEM,
         username,
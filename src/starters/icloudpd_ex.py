@@ -6,8 +6,16 @@ import foundation  # fmt: skip
 
 freeze_support()  # fmt: skip # fixing tqdm on macos
 
+import logging
+import sys
+from threading import Thread
+from typing import Optional, Tuple
+
 import click
+from icloudpd import constants
 from icloudpd.base import main as icloudpd_main
+from icloudpd.daemon import COMMANDS, Daemon, DaemonRunningError, load_accounts, send_command
+from icloudpd.server import serve_app
 from pyicloud_ipd.cmdline import main as icloud_main
 
 # goal0 -- allow experimental flow from cli
@@ -47,6 +55,67 @@ def commands() -> None:
     pass
 
 
+@commands.command()
+@click.option(
+    "--socket",
+    "socket_path",
+    help="Unix socket to listen on",
+    default=constants.DAEMON_SOCKET_PATH,
+    show_default=True,
+)
+@click.option(
+    "--accounts",
+    "accounts_path",
+    help="JSON list of accounts to sync on schedule, "
+    + '[{"name": "alice", "args": [icloudpd options]}, ...]',
+    type=click.Path(exists=True, dir_okay=False),
+)
+@click.option(
+    "--interval",
+    help="Seconds between syncs of all --accounts (default: sync once)",
+    type=click.IntRange(1),
+)
+@click.option(
+    "--web-ui",
+    help="Serve the state of --accounts on the web UI (status.json); "
+    + "runs must not use --mfa-provider webui then, it needs the same port",
+    is_flag=True,
+)
+def daemon(
+    socket_path: str, accounts_path: Optional[str], interval: Optional[int], web_ui: bool
+) -> None:
+    """Keep iCloud sessions authenticated and run icloudpd for `client` commands
+    and for --accounts, one run at a time"""
+    try:
+        accounts = [] if accounts_path is None else load_accounts(accounts_path)
+    except ValueError as error:
+        raise click.BadParameter(str(error), param_hint="--accounts") from error
+    logger = logging.getLogger("icloudpd.daemon")
+    logger.setLevel(logging.INFO)
+    runner = Daemon(logger, icloudpd_main, socket_path, accounts, interval)
+    if web_ui:
+        Thread(target=serve_app, daemon=True, args=[logger, runner.status_exchange]).start()
+    try:
+        runner.serve_forever()
+    except DaemonRunningError as error:
+        raise click.ClickException(str(error)) from error
+
+
+@commands.command(context_settings={"ignore_unknown_options": True})
+@click.option(
+    "--socket",
+    "socket_path",
+    help="Unix socket of the daemon",
+    default=constants.DAEMON_SOCKET_PATH,
+    show_default=True,
+)
+@click.argument("command", type=click.Choice(COMMANDS))
+@click.argument("args", nargs=-1, type=click.UNPROCESSED)
+def client(socket_path: str, command: str, args: Tuple[str, ...]) -> None:
+    """Send a command to the daemon: sync and list take icloudpd options"""
+    sys.exit(send_command(socket_path, command, list(args), click.echo))
+
+
 # @commands.command()
 # @click.option("--username", default="", help="Apple ID to Use")
 # @click.option(
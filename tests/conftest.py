@@ -0,0 +1,18 @@
+from typing import Iterator
+from unittest import mock
+
+import pytest
+from pyicloud_ipd.session import PyiCloudSession
+
+
+@pytest.fixture(autouse=True)
+def no_warm_up_connections(request: pytest.FixtureRequest) -> Iterator[None]:
+    """Keeps warm-ups from connecting while cassettes are replayed: VCR puts the real
+    connection classes back for everyone while it creates a connection, so a warm-up
+    connecting next to the first download can hand that download a real connection.
+    test_session checks warm-ups against a local server instead"""
+    if request.module.__name__ == "tests.test_session":
+        yield
+        return
+    with mock.patch.object(PyiCloudSession, "_connect"):
+        yield
@@ -0,0 +1,158 @@
+import datetime
+import inspect
+import logging
+import os
+from unittest import TestCase, mock
+
+import pytest
+from icloudpd.audit import MirrorAudit
+from pyicloud_ipd.asset_version import AssetVersion
+from pyicloud_ipd.file_match import FileMatchPolicy
+from pyicloud_ipd.item_type import AssetItemType
+from pyicloud_ipd.version_size import AssetVersionSize, LivePhotoVersionSize
+
+from tests.helpers import path_from_project_root, recreate_path, run_icloudpd_test
+
+
+class AuditTestCase(TestCase):
+    @pytest.fixture(autouse=True)
+    def inject_fixtures(self, caplog: pytest.LogCaptureFixture) -> None:
+        self._caplog = caplog
+        self.root_path = path_from_project_root(__file__)
+        self.fixtures_path = os.path.join(self.root_path, "fixtures")
+        self.vcr_path = os.path.join(self.root_path, "vcr_cassettes")
+
+    def test_audit_reports_missing_and_unfinished(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+
+        files_to_create = [
+            ("2018/07/30", "IMG_7408.JPG", 1151066),
+            ("2018/07/30", "IMG_7407.JPG", 10),
+            ("2018/07/31", "IMG_7409.JPG.part", 10),
+        ]
+
+        data_dir, result = run_icloudpd_test(
+            self.assertEqual,
+            self.vcr_path,
+            base_dir,
+            "listing_photos.yml",
+            files_to_create,
+            [],
+            [
+                "--username",
+                "jdoe@gmail.com",
+                "--password",
+                "password1",
+                "--recent",
+                "5",
+                "--skip-videos",
+                "--skip-live-photos",
+                "--no-progress-bar",
+                "--audit",
+            ],
+        )
+
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn(
+            f"WARNING  Missing {os.path.join(data_dir, os.path.normpath('2018/07/31/IMG_7409.JPG'))}",
+            self._caplog.text,
+        )
+        self.assertIn(
+            f"WARNING  Missing {os.path.join(data_dir, os.path.normpath('2018/07/30/IMG_7407-656257.JPG'))}",
+            self._caplog.text,
+        )
+        self.assertIn(
+            f"WARNING  Unfinished download {os.path.join(data_dir, os.path.normpath('2018/07/31/IMG_7409.JPG.part'))}",
+            self._caplog.text,
+        )
+        self.assertNotIn("IMG_7408.JPG", self._caplog.text)
+        self.assertIn(
+            "INFO     Audited 3 files: 2 missing, 1 unfinished, 0 wrong size, 0 changed, 0 not in iCloud",
+            self._caplog.text,
+        )
+
+    def test_audit_hashes_resume_and_detect_changed_content(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+        recreate_path(base_dir)
+        paths = [os.path.join(base_dir, f"IMG_{_i}.JPG") for _i in range(3)]
+        for path in paths:
+            with open(path, "wb") as file_obj:
+                file_obj.write(b"original")
+
+        def audit() -> MirrorAudit:
+            result = MirrorAudit(
+                logging.getLogger("icloudpd"),
+                base_dir,
+                "none",
+                [AssetVersionSize.ORIGINAL],
+                False,
+                False,
+                False,
+                LivePhotoVersionSize.ORIGINAL,
+                FileMatchPolicy.NAME_SIZE_DEDUP_WITH_SUFFIX,
+                None,
+            )
+            result.present.update(paths)
+            return result
+
+        self.assertEqual(sorted(audit().files), paths)
+
+        audit().verify_hashes(None)
+
+        # same size and time, different content
+        stat = os.stat(paths[1])
+        with open(paths[1], "wb") as file_obj:
+            file_obj.write(b"damaged!")
+        os.utime(paths[1], ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        second = audit()
+        second.verify_hashes(1024 * 1024)
+        self.assertEqual(second.corrupted, [paths[1]])
+        self.assertEqual(second.report(False), 1)
+
+        # an unfinished pass is resumed instead of started over
+        state = second.load_state()
+        state["complete"] = False
+        state["files"].pop("IMG_0.JPG")
+        second.save_state(state)
+        with self._caplog.at_level(logging.INFO):
+            audit().verify_hashes(None)
+        self.assertIn("Resuming hash verification, 1 of 3 files left", self._caplog.text)
+
+    def test_audit_files_of_other_options_are_no_orphans(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+        recreate_path(base_dir)
+        names = ["IMG_7409.JPG", "IMG_7409-medium.JPG", "IMG_7409.MOV", "IMG_0001.JPG"]
+        for name in names:
+            with open(os.path.join(base_dir, name), "wb") as file_obj:
+                file_obj.write(b"content")
+
+        photo = mock.MagicMock()
+        photo.filename = "IMG_7409.JPG"
+        photo.item_type = AssetItemType.IMAGE
+        photo.created = datetime.datetime(2018, 7, 31, tzinfo=datetime.timezone.utc)
+        photo.versions = {
+            AssetVersionSize.ORIGINAL: AssetVersion("IMG_7409.JPG", 7, "url1", "public.jpeg"),
+            AssetVersionSize.MEDIUM: AssetVersion("IMG_7409-medium.JPG", 7, "url2", "public.jpeg"),
+            LivePhotoVersionSize.ORIGINAL: AssetVersion(
+                "IMG_7409.MOV", 7, "url3", "com.apple.quicktime-movie"
+            ),
+        }
+
+        # downloaded earlier with --size medium and live photos, audited with neither
+        audit = MirrorAudit(
+            logging.getLogger("icloudpd"),
+            base_dir,
+            "none",
+            [AssetVersionSize.ORIGINAL],
+            False,
+            False,
+            True,
+            LivePhotoVersionSize.ORIGINAL,
+            FileMatchPolicy.NAME_SIZE_DEDUP_WITH_SUFFIX,
+            None,
+        )
+        audit.check_photo(photo)
+
+        self.assertEqual(audit.missing, [])
+        self.assertEqual(audit.orphans(), [os.path.join(base_dir, "IMG_0001.JPG")])
@@ -1,4 +1,5 @@
 import inspect
+import json
 import os
 from typing import NamedTuple
 from unittest import TestCase
@@ -167,6 +168,69 @@ class AuthenticationTestCase(TestCase):
             self.assertIn("INFO     Authentication completed successfully", self._caplog.text)
             assert result.exit_code == 0
 
+    def test_session_saved_after_authentication(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+        cookie_dir = os.path.join(base_dir, "cookie")
+
+        for dir in [base_dir, cookie_dir]:
+            recreate_path(dir)
+
+        with vcr.use_cassette(os.path.join(self.vcr_path, "2sa_flow_valid_code.yml")):
+            runner = CliRunner(env={"CLIENT_ID": "DE309E26-942E-11E8-92F5-14109FE0B321"})
+            result = runner.invoke(
+                main,
+                [
+                    "--username",
+                    "jdoe@gmail.com",
+                    "--password",
+                    "password1",
+                    "--no-progress-bar",
+                    "--cookie-directory",
+                    cookie_dir,
+                    "--auth-only",
+                ],
+                input="0\n654321\n",
+            )
+            assert result.exit_code == 0
+
+        # written without waiting for exit, atomically
+        self.assertEqual(sorted(os.listdir(cookie_dir)), ["jdoegmailcom", "jdoegmailcom.session"])
+        with open(os.path.join(cookie_dir, "jdoegmailcom.session"), encoding="utf-8") as session:
+            self.assertIn("session_token", json.load(session))
+
+    def test_fresh_session_not_validated_again(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+        cookie_dir = os.path.join(base_dir, "cookie")
+
+        for dir in [base_dir, cookie_dir]:
+            recreate_path(dir)
+
+        params = [
+            "--username",
+            "jdoe@gmail.com",
+            "--password",
+            "password1",
+            "--no-progress-bar",
+            "--cookie-directory",
+            cookie_dir,
+            "--auth-only",
+            "--session-freshness",
+            "600",
+        ]
+        with vcr.use_cassette(os.path.join(self.vcr_path, "2sa_flow_valid_code.yml")):
+            runner = CliRunner(env={"CLIENT_ID": "DE309E26-942E-11E8-92F5-14109FE0B321"})
+            result = runner.invoke(main, params, input="0\n654321\n")
+            assert result.exit_code == 0
+
+        self._caplog.clear()
+
+        # no recorded requests: any request would fail
+        with vcr.use_cassette(os.path.join(self.vcr_path, "no_requests.yml")):
+            runner = CliRunner(env={"CLIENT_ID": "DE309E26-942E-11E8-92F5-14109FE0B321"})
+            result = runner.invoke(main, params)
+            self.assertIn("INFO     Authentication completed successfully", self._caplog.text)
+            assert result.exit_code == 0
+
     def test_password_prompt_2sa(self) -> None:
         base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
         cookie_dir = os.path.join(base_dir, "cookie")
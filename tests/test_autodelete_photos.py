@@ -3,13 +3,14 @@ import glob
 import inspect
 import logging
 import os
-from typing import Any, NoReturn, Optional
+from typing import Any, NoReturn, Optional, Sequence
 from unittest import TestCase, mock
 
 import pytest
 import pytz
 from click.testing import CliRunner
 from icloudpd import constants
+from icloudpd.autodelete import prune_content_store, prune_empty_dirs
 from icloudpd.base import main
 from pyicloud_ipd.base import PyiCloudService
 from pyicloud_ipd.exceptions import PyiCloudAPIResponseException
@@ -366,14 +367,17 @@ class AutodeletePhotosTestCase(TestCase):
         with vcr.use_cassette(os.path.join(self.vcr_path, "download_autodelete_photos.yml")):
 
             def mock_raise_response_error(
-                a1_: logging.Logger, a2_: PhotosService, a3_: PhotoLibrary, a4_: PhotoAsset
+                a1_: logging.Logger,
+                a2_: PhotosService,
+                a3_: PhotoLibrary,
+                a4_: Sequence[PhotoAsset],
             ) -> None:
                 if not hasattr(self, f"already_raised_session_exception{inspect.stack()[0][3]}"):
                     setattr(self, f"already_raised_session_exception{inspect.stack()[0][3]}", True)  # noqa: B010
                     raise PyiCloudAPIResponseException("Invalid global session", "100")
 
             with mock.patch("time.sleep") as sleep_mock:  # noqa: SIM117
-                with mock.patch("icloudpd.base.delete_photo") as pa_delete:
+                with mock.patch("icloudpd.base.delete_photos") as pa_delete:
                     pa_delete.side_effect = mock_raise_response_error
 
                     # Let the initial authenticate() call succeed,
@@ -460,12 +464,15 @@ class AutodeletePhotosTestCase(TestCase):
         with vcr.use_cassette(os.path.join(self.vcr_path, "download_autodelete_photos.yml")):
 
             def mock_raise_response_error(
-                a1_: logging.Logger, a2_: PhotosService, a3_: PhotoLibrary, a4_: PhotoAsset
+                a1_: logging.Logger,
+                a2_: PhotosService,
+                a3_: PhotoLibrary,
+                a4_: Sequence[PhotoAsset],
             ) -> None:
                 raise PyiCloudAPIResponseException("Invalid global session", "100")
 
             with mock.patch("time.sleep") as sleep_mock:  # noqa: SIM117
-                with mock.patch("icloudpd.base.delete_photo") as pa_delete:
+                with mock.patch("icloudpd.base.delete_photos") as pa_delete:
                     pa_delete.side_effect = mock_raise_response_error
 
                     # Let the initial authenticate() call succeed,
@@ -556,14 +563,17 @@ class AutodeletePhotosTestCase(TestCase):
         with vcr.use_cassette(os.path.join(self.vcr_path, "download_autodelete_photos.yml")):
 
             def mock_raise_response_error(
-                a1_: logging.Logger, a2_: PhotosService, a3_: PhotoLibrary, a4_: PhotoAsset
+                a1_: logging.Logger,
+                a2_: PhotosService,
+                a3_: PhotoLibrary,
+                a4_: Sequence[PhotoAsset],
             ) -> None:
                 if not hasattr(self, f"already_raised_session_exception{inspect.stack()[0][3]}"):
                     setattr(self, f"already_raised_session_exception{inspect.stack()[0][3]}", True)  # noqa: B010
                     raise PyiCloudAPIResponseException("INTERNAL_ERROR", "INTERNAL_ERROR")
 
             with mock.patch("time.sleep") as sleep_mock:  # noqa: SIM117
-                with mock.patch("icloudpd.base.delete_photo") as pa_delete:
+                with mock.patch("icloudpd.base.delete_photos") as pa_delete:
                     pa_delete.side_effect = mock_raise_response_error
 
                     # Pass fixed client ID via environment variable
@@ -636,12 +646,15 @@ class AutodeletePhotosTestCase(TestCase):
         with vcr.use_cassette(os.path.join(self.vcr_path, "download_autodelete_photos.yml")):
 
             def mock_raise_response_error(
-                a1_: logging.Logger, a2_: PhotosService, a3_: PhotoLibrary, a4_: PhotoAsset
+                a1_: logging.Logger,
+                a2_: PhotosService,
+                a3_: PhotoLibrary,
+                a4_: Sequence[PhotoAsset],
             ) -> None:
                 raise PyiCloudAPIResponseException("INTERNAL_ERROR", "INTERNAL_ERROR")
 
             with mock.patch("time.sleep") as sleep_mock:  # noqa: SIM117
-                with mock.patch("icloudpd.base.delete_photo") as pa_delete:
+                with mock.patch("icloudpd.base.delete_photos") as pa_delete:
                     pa_delete.side_effect = mock_raise_response_error
 
                     # Pass fixed client ID via environment variable
@@ -1100,3 +1113,39 @@ class AutodeletePhotosTestCase(TestCase):
             assert not os.path.exists(
                 os.path.join(data_dir, file_name)
             ), f"{file_name} not expected, but present"
+
+    def test_prune_empty_dirs(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+        recreate_path(base_dir)
+
+        deleted = os.path.join(base_dir, "2018", "07", "30", "IMG_7406.MOV")
+        kept = os.path.join(base_dir, "2018", "07", "31", "IMG_7407.JPG")
+        for path in [deleted, kept]:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(kept, "a").close()
+
+        pruned = prune_empty_dirs(logging.getLogger(__name__), base_dir, [deleted])
+
+        self.assertEqual(pruned, 1, "Pruned folder count")
+        assert not os.path.exists(os.path.dirname(deleted))
+        assert os.path.exists(kept)
+        assert os.path.exists(base_dir)
+
+    def test_prune_content_store(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+        recreate_path(base_dir)
+
+        unlinked = os.path.join(base_dir, "store", "ab", "unlinked.JPG")
+        linked = os.path.join(base_dir, "store", "cd", "linked.JPG")
+        for path in [unlinked, linked]:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, "a").close()
+        # still in a folder of another album
+        os.link(linked, os.path.join(base_dir, "IMG_7407.JPG"))
+        missing = os.path.join(base_dir, "store", "ef", "missing.JPG")
+
+        removed = prune_content_store(logging.getLogger(__name__), [unlinked, linked, missing])
+
+        self.assertEqual(removed, [unlinked])
+        assert not os.path.exists(unlinked)
+        assert os.path.exists(linked)
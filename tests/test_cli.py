@@ -74,6 +74,41 @@ class CliTestCase(TestCase):
 
         assert sum(1 for _ in files_in_result) == 0
 
+    def test_log_http(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+        cookie_dir = os.path.join(base_dir, "cookie")
+        data_dir = os.path.join(base_dir, "data")
+
+        for sample, expected_count in [(None, 0), ("1", 6), ("2", 3)]:
+            for dir in [base_dir, cookie_dir, data_dir]:
+                recreate_path(dir)
+            self._caplog.clear()
+            with vcr.use_cassette(os.path.join(self.vcr_path, "listing_photos.yml")):
+                # Pass fixed client ID via environment variable
+                runner = CliRunner(env={"CLIENT_ID": "DE309E26-942E-11E8-92F5-14109FE0B321"})
+                result = runner.invoke(
+                    main,
+                    [
+                        "--username",
+                        "jdoe@gmail.com",
+                        "--password",
+                        "password1",
+                        "--recent",
+                        "0",
+                        "-d",
+                        data_dir,
+                        "--cookie-directory",
+                        cookie_dir,
+                    ]
+                    + ([] if sample is None else ["--log-http", "--log-http-sample", sample]),
+                )
+                assert result.exit_code == 0
+            requests = [r for r in self._caplog.records if r.name == "pyicloud_ipd.wire"]
+            self.assertEqual(
+                sum(1 for r in requests if r.getMessage().startswith("> ")), expected_count
+            )
+            self.assertNotIn("password1", self._caplog.text)
+
     def test_tqdm(self) -> None:
         base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
         cookie_dir = os.path.join(base_dir, "cookie")
@@ -0,0 +1,155 @@
+import inspect
+import io
+import logging
+import os
+import socket
+import threading
+from typing import List
+from unittest import TestCase, mock
+
+import pytest
+from icloudpd.base import main
+from icloudpd.daemon import Account, Daemon, DaemonRunningError, send_command
+from pyicloud_ipd.services.photos import PhotoLibrary
+from vcr import VCR
+
+from tests.helpers import path_from_project_root, recreate_path
+
+vcr = VCR(decode_compressed_response=True, record_mode="none")
+
+
+class DaemonTestCase(TestCase):
+    @pytest.fixture(autouse=True)
+    def inject_fixtures(self, caplog: pytest.LogCaptureFixture) -> None:
+        self._caplog = caplog
+        self.root_path = path_from_project_root(__file__)
+        self.fixtures_path = os.path.join(self.root_path, "fixtures")
+        self.vcr_path = os.path.join(self.root_path, "vcr_cassettes")
+
+    def test_daemon_reuses_session_between_runs(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+        cookie_dir = os.path.join(base_dir, "cookie")
+        socket_path = os.path.join(base_dir, "d.sock")
+
+        for dir in [base_dir, cookie_dir]:
+            recreate_path(dir)
+
+        daemon = Daemon(logging.getLogger("icloudpd.daemon"), main, socket_path)
+        args = [
+            "--username",
+            "jdoe@gmail.com",
+            "--password",
+            "password1",
+            "--no-progress-bar",
+            "--cookie-directory",
+            cookie_dir,
+        ]
+
+        # the second run reads libraries and albums again
+        with vcr.use_cassette(
+            os.path.join(self.vcr_path, "listing_albums.yml"), allow_playback_repeats=True
+        ), mock.patch.dict(
+            os.environ, {"CLIENT_ID": "DE309E26-942E-11E8-92F5-14109FE0B321"}
+        ), mock.patch.object(PhotoLibrary, "_fetch_folders", return_value=[]) as fetch_folders:
+            server_thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+            server_thread.start()
+            for _ in range(100):
+                if os.path.exists(socket_path):
+                    break
+                server_thread.join(0.05)
+            # only the owner may connect
+            self.assertEqual(os.stat(socket_path).st_mode & 0o777, 0o600)
+
+            outputs: List[List[str]] = []
+            for _ in range(2):
+                output: List[str] = []
+                self.assertEqual(send_command(socket_path, "list", args, output.append), 0)
+                outputs.append(output)
+
+            status: List[str] = []
+            self.assertEqual(send_command(socket_path, "status", [], status.append), 0)
+            self.assertEqual(send_command(socket_path, "stop", [], lambda _s: None), 0)
+            server_thread.join(5)
+
+        for output in outputs:
+            self.assertIn("All Photos", output)
+        # albums are read again on every run, so new ones are found
+        self.assertEqual(fetch_folders.call_count, 2)
+        # the second run reuses the authenticated service
+        self.assertIn("Authenticating...", " ".join(outputs[0]))
+        self.assertNotIn("Authenticating...", " ".join(outputs[1]))
+        self.assertIn('"runs": 2', status[0])
+        self.assertIn('"jdoe@gmail.com"', status[0])
+        self.assertFalse(server_thread.is_alive())
+        self.assertFalse(os.path.exists(socket_path))
+
+    def test_daemon_syncs_accounts_in_turn(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+        recreate_path(base_dir)
+
+        accounts = [
+            Account(
+                name,
+                [
+                    "--username",
+                    "jdoe@gmail.com",
+                    "--password",
+                    "password1",
+                    "--auth-only",
+                    "--no-progress-bar",
+                    "--cookie-directory",
+                    os.path.join(base_dir, name),
+                ],
+            )
+            for name in ["first", "second"]
+        ]
+        daemon = Daemon(
+            logging.getLogger("icloudpd.daemon"), main, os.path.join(base_dir, "d.sock"), accounts
+        )
+        daemon.console = io.StringIO()
+
+        with vcr.use_cassette(
+            os.path.join(self.vcr_path, "listing_albums.yml"), allow_playback_repeats=True
+        ), mock.patch.dict(os.environ, {"CLIENT_ID": "DE309E26-942E-11E8-92F5-14109FE0B321"}):
+            daemon.run_scheduled()
+
+        output = daemon.console.getvalue()
+        self.assertIn("first: ", output)
+        self.assertIn("second: ", output)
+        self.assertEqual(output.count("Authentication completed successfully"), 2)
+        self.assertEqual(
+            [
+                (status["runs"], status["last_exit"], status["running"])
+                for status in daemon.status_exchange.snapshot()["accounts"].values()
+            ],
+            [(1, 0, False), (1, 0, False)],
+        )
+        # separate cookie directories, separate sessions
+        self.assertEqual(len(daemon.services), 2)
+
+    def test_daemon_keeps_socket_of_running_daemon(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+        socket_path = os.path.join(base_dir, "d.sock")
+        recreate_path(base_dir)
+
+        # left over from a daemon that did not stop cleanly
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stale:
+            stale.bind(socket_path)
+        first = Daemon(logging.getLogger("icloudpd.daemon"), main, socket_path)
+        server_thread = threading.Thread(target=first.serve_forever, daemon=True)
+        server_thread.start()
+        for _ in range(100):
+            if first.server is not None:
+                break
+            server_thread.join(0.05)
+
+        second = Daemon(logging.getLogger("icloudpd.daemon"), main, socket_path)
+        with self.assertRaises(DaemonRunningError):
+            second.serve_forever()
+
+        # the first daemon still has its socket
+        status: List[str] = []
+        self.assertEqual(send_command(socket_path, "status", [], status.append), 0)
+        self.assertEqual(send_command(socket_path, "stop", [], lambda _s: None), 0)
+        server_thread.join(5)
+        self.assertFalse(server_thread.is_alive())
@@ -0,0 +1,69 @@
+from typing import List, Sequence
+from unittest import TestCase, mock
+
+from icloudpd.deletion_queue import DeletionQueue
+from pyicloud_ipd.services.photos import PhotoAsset
+
+
+class DeletionQueueTestCase(TestCase):
+    def test_flush_by_size(self) -> None:
+        batches: List[Sequence[PhotoAsset]] = []
+        queue = DeletionQueue(batches.append, batch_size=2, max_age_seconds=3600)
+        photos = [mock.MagicMock(spec=PhotoAsset) for _ in range(5)]
+        for photo in photos:
+            queue.add(photo)
+        self.assertEqual([len(b) for b in batches], [2, 2])
+        self.assertEqual(len(queue), 1)
+        queue.flush()
+        self.assertEqual([len(b) for b in batches], [2, 2, 1])
+        self.assertEqual(len(queue), 0)
+
+    def test_flush_by_age(self) -> None:
+        batches: List[Sequence[PhotoAsset]] = []
+        queue = DeletionQueue(batches.append, batch_size=100, max_age_seconds=10)
+        with mock.patch("time.monotonic") as monotonic_mock:
+            monotonic_mock.return_value = 100.0
+            queue.add(mock.MagicMock(spec=PhotoAsset))
+            self.assertEqual(len(batches), 0)
+            monotonic_mock.return_value = 111.0
+            queue.add(mock.MagicMock(spec=PhotoAsset))
+        self.assertEqual([len(b) for b in batches], [2])
+
+    def test_flush_by_age_without_new_assets(self) -> None:
+        batches: List[Sequence[PhotoAsset]] = []
+        queue = DeletionQueue(batches.append, batch_size=100, max_age_seconds=10)
+        with mock.patch("time.monotonic") as monotonic_mock:
+            monotonic_mock.return_value = 100.0
+            queue.add(mock.MagicMock(spec=PhotoAsset))
+            queue.flush_if_due()
+            self.assertEqual(len(batches), 0)
+            monotonic_mock.return_value = 111.0
+            queue.flush_if_due()
+        self.assertEqual([len(b) for b in batches], [1])
+
+    def test_flush_error_does_not_mask_loop_error(self) -> None:
+        logger = mock.MagicMock()
+        flusher = mock.MagicMock(side_effect=RuntimeError("delete failed"))
+        with self.assertRaises(ValueError), DeletionQueue(
+            flusher, batch_size=100, max_age_seconds=3600, logger=logger
+        ) as queue:
+            queue.add(mock.MagicMock(spec=PhotoAsset))
+            raise ValueError("listing failed")
+        flusher.assert_called_once()
+        logger.error.assert_called_once()
+
+    def test_flush_on_exit(self) -> None:
+        batches: List[Sequence[PhotoAsset]] = []
+        with DeletionQueue(batches.append, batch_size=100, max_age_seconds=3600) as queue:
+            queue.add(mock.MagicMock(spec=PhotoAsset))
+            self.assertEqual(len(batches), 0)
+        self.assertEqual([len(b) for b in batches], [1])
+
+    def test_no_flush_on_interrupt(self) -> None:
+        batches: List[Sequence[PhotoAsset]] = []
+        with self.assertRaises(KeyboardInterrupt), DeletionQueue(
+            batches.append, batch_size=100, max_age_seconds=3600
+        ) as queue:
+            queue.add(mock.MagicMock(spec=PhotoAsset))
+            raise KeyboardInterrupt()
+        self.assertEqual(len(batches), 0)
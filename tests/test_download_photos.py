@@ -3,6 +3,7 @@ import glob
 import inspect
 import logging
 import os
+import stat
 import sys
 from typing import Any, List, NoReturn, Optional, Sequence, Tuple
 from unittest import TestCase, mock
@@ -11,8 +12,8 @@ from unittest.mock import ANY, PropertyMock, call
 import piexif
 import pytest
 from click.testing import CliRunner
-from icloudpd import constants
-from icloudpd.base import main
+from icloudpd import constants, download
+from icloudpd.base import UNCONFIRMED_DELETES, delete_photos, main
 from piexif._exceptions import InvalidImageDataError
 from pyicloud_ipd.asset_version import AssetVersion
 from pyicloud_ipd.base import PyiCloudService
@@ -551,6 +552,8 @@ class DownloadPhotoTestCase(TestCase):
         def mock_raise_response_error(_arg: Any) -> NoReturn:
             raise ConnectionError("Connection Error")
 
+        failures_before = download.FAILURES.value()
+
         with mock.patch.object(PhotoAsset, "download") as pa_download:
             pa_download.side_effect = mock_raise_response_error
 
@@ -599,6 +602,10 @@ class DownloadPhotoTestCase(TestCase):
                         "ERROR    Could not download IMG_7409.JPG. Please try again later.",
                         self._caplog.text,
                     )
+                    # counted, so a watch cycle tries the file again
+                    self.assertEqual(download.FAILURES.value(), failures_before + 1)
+                    # given up, so its size is no longer expected
+                    self.assertEqual(download.TRANSFER.snapshot().bytes_remaining, 0)
                     assert result.exit_code == 0
 
     def test_handle_albums_error(self) -> None:
@@ -781,8 +788,8 @@ class DownloadPhotoTestCase(TestCase):
 
             with mock.patch.object(PhotoAsset, "versions", new_callable=PropertyMock) as pa:
                 pa.return_value = {
-                    AssetVersionSize.ORIGINAL: {"filename": "IMG1.JPG"},
-                    AssetVersionSize.MEDIUM: {"filename": "IMG_1.JPG"},
+                    AssetVersionSize.ORIGINAL: AssetVersion("IMG1.JPG", 1, "https://a.b/o", "jpeg"),
+                    AssetVersionSize.MEDIUM: AssetVersion("IMG_1.JPG", 1, "https://a.b/m", "jpeg"),
                 }
 
                 data_dir, result = run_icloudpd_test(
@@ -1425,6 +1432,57 @@ class DownloadPhotoTestCase(TestCase):
         # TODO assert cass.all_played
         assert result.exit_code == 0
 
+    def test_delete_photos_unconfirmed(self) -> None:
+        photos = []
+        for name in ["IMG_7409.JPG", "IMG_7408.JPG"]:
+            photo = mock.MagicMock()
+            photo.filename = name
+            photo.id = name
+            photo._asset_record = {"recordName": name, "recordChangeTag": "1"}
+            photos.append(photo)
+        photo_service = mock.MagicMock()
+        photo_service._service_endpoint = "https://example.com"
+        photo_service.params = {}
+        library = mock.MagicMock()
+        library.zone_id = {"zoneName": "PrimarySync"}
+        logger = logging.getLogger("icloudpd")
+        self._caplog.set_level(logging.INFO)
+
+        # one record is confirmed, the other is rejected
+        photo_service.session.post.return_value.json.return_value = {
+            "records": [
+                {"recordName": "IMG_7409.JPG", "fields": {"isDeleted": {"value": 1}}},
+                {"recordName": "IMG_7408.JPG", "serverErrorCode": "CONFLICT", "reason": "stale"},
+            ]
+        }
+        failures_before = download.FAILURES.value()
+        delete_photos(logger, photo_service, library, photos)
+        self.assertIn("INFO     Deleted IMG_7409.JPG in iCloud", self._caplog.text)
+        self.assertIn(
+            "ERROR    Could not delete IMG_7408.JPG in iCloud: CONFLICT stale", self._caplog.text
+        )
+        self.assertEqual(download.FAILURES.value(), failures_before + 1)
+        # queued again in the next cycle although it is downloaded already
+        self.assertIn("IMG_7408.JPG", UNCONFIRMED_DELETES)
+        self.assertNotIn("IMG_7409.JPG", UNCONFIRMED_DELETES)
+
+        # a body that is not JSON deletes nothing
+        self._caplog.clear()
+        photo_service.session.post.return_value.json.side_effect = ValueError("not json")
+        delete_photos(logger, photo_service, library, photos)
+        self.assertNotIn("Deleted", self._caplog.text)
+        self.assertIn(
+            "ERROR    Could not delete IMG_7409.JPG in iCloud: unreadable response",
+            self._caplog.text,
+        )
+        self.assertIn(
+            "ERROR    Could not delete IMG_7408.JPG in iCloud: unreadable response",
+            self._caplog.text,
+        )
+        self.assertEqual(download.FAILURES.value(), failures_before + 3)
+        self.assertIn("IMG_7409.JPG", UNCONFIRMED_DELETES)
+        UNCONFIRMED_DELETES.clear()
+
     def test_download_over_old_original_photos(self) -> None:
         base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
 
@@ -1801,13 +1859,13 @@ class DownloadPhotoTestCase(TestCase):
         def raise_response_error(
             a0_: logging.Logger, a1_: PyiCloudService, a2_: PhotoAsset
         ) -> NoReturn:
-            raise Exception("Unexpected call to delete_photo")
+            raise Exception("Unexpected call to delete_photos")
 
         with mock.patch.object(piexif, "insert") as piexif_patched:
             piexif_patched.side_effect = InvalidImageDataError
             with mock.patch("icloudpd.exif_datetime.get_photo_exif") as get_exif_patched:
                 get_exif_patched.return_value = False
-                with mock.patch("icloudpd.base.delete_photo") as df_patched:
+                with mock.patch("icloudpd.base.delete_photos") as df_patched:
                     df_patched.side_effect = raise_response_error
 
                     data_dir, result = run_icloudpd_test(
@@ -2249,3 +2307,175 @@ class DownloadPhotoTestCase(TestCase):
         print_result_exception(result)
 
         self.assertEqual(result.exit_code, 0)
+
+    def test_clone_media_links_existing_content(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+        recreate_path(base_dir)
+
+        source_path = os.path.join(base_dir, "2018/07/31", "IMG_7409.JPG")
+        target_path = os.path.join(base_dir, "2018/08/01", "IMG_7409-adjusted.JPG")
+        os.makedirs(os.path.dirname(source_path))
+        with open(source_path, "wb") as f:
+            f.write(b"content")
+
+        with mock.patch("icloudpd.download.reflink_file") as reflink_mock:
+            reflink_mock.return_value = False
+            result = download.clone_media(
+                logging.getLogger(__name__), False, source_path, target_path, True
+            )
+
+        self.assertTrue(result)
+        self.assertEqual(os.stat(source_path).st_ino, os.stat(target_path).st_ino)
+
+        # the copy gets written to afterwards, so it must not share the inode
+        copy_path = os.path.join(base_dir, "2018/08/01", "IMG_7409-copy.JPG")
+        with mock.patch("icloudpd.download.reflink_file") as reflink_mock:
+            reflink_mock.return_value = False
+            result = download.clone_media(
+                logging.getLogger(__name__), False, source_path, copy_path, False
+            )
+
+        self.assertTrue(result)
+        self.assertNotEqual(os.stat(source_path).st_ino, os.stat(copy_path).st_ino)
+        with open(copy_path, "rb") as f:
+            self.assertEqual(f.read(), b"content")
+
+        # nothing to link to
+        self.assertFalse(
+            download.clone_media(
+                logging.getLogger(__name__),
+                False,
+                os.path.join(base_dir, "missing.JPG"),
+                os.path.join(base_dir, "other.JPG"),
+                True,
+            )
+        )
+
+    def test_download_same_content_of_an_asset_once(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+
+        files_to_download = [
+            ("2018/07/31", "IMG_7409.JPG"),
+            ("2018/07/31", "IMG_7409-adjusted.JPG"),
+        ]
+
+        def write_media(
+            _logger: logging.Logger,
+            _dry_run: bool,
+            _icloud: PyiCloudService,
+            _photo: PhotoAsset,
+            download_path: str,
+            _version: AssetVersion,
+            _size: AssetVersionSize,
+        ) -> bool:
+            os.makedirs(os.path.dirname(download_path), exist_ok=True)
+            with open(download_path, "wb") as f:
+                f.write(b"content")
+            return True
+
+        with mock.patch.object(PhotoAsset, "versions", new_callable=PropertyMock) as pa, mock.patch(
+            "icloudpd.download.download_media"
+        ) as download_mock, mock.patch("icloudpd.download.reflink_file") as reflink_mock:
+            # the adjusted version of an unedited photo is the original
+            pa.return_value = {
+                AssetVersionSize.ORIGINAL: AssetVersion(
+                    "IMG_7409.JPG", 7, "https://example.com/a", "public.jpeg", "checksum"
+                ),
+                AssetVersionSize.ADJUSTED: AssetVersion(
+                    "IMG_7409.JPG", 7, "https://example.com/a", "public.jpeg", "checksum"
+                ),
+            }
+            download_mock.side_effect = write_media
+            reflink_mock.return_value = False
+
+            data_dir, result = run_icloudpd_test(
+                self.assertEqual,
+                self.vcr_path,
+                base_dir,
+                "listing_photos.yml",
+                [],
+                files_to_download,
+                [
+                    "--username",
+                    "jdoe@gmail.com",
+                    "--password",
+                    "password1",
+                    "--recent",
+                    "1",
+                    "--size",
+                    "original",
+                    "--size",
+                    "adjusted",
+                    "--skip-videos",
+                    "--skip-live-photos",
+                    "--no-progress-bar",
+                    "--threads-num",
+                    "1",
+                ],
+            )
+
+        assert result.exit_code == 0
+        self.assertEqual(download_mock.call_count, 1)
+        # file times are set from the same created date, so both can share the inode
+        self.assertEqual(
+            os.stat(os.path.join(data_dir, os.path.normpath("2018/07/31/IMG_7409.JPG"))).st_ino,
+            os.stat(
+                os.path.join(data_dir, os.path.normpath("2018/07/31/IMG_7409-adjusted.JPG"))
+            ).st_ino,
+        )
+
+    def test_download_photos_into_content_store(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+        store_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3] + "_store")
+        recreate_path(store_dir)
+
+        files_to_download = [("2018/07/31", "IMG_7409.JPG")]
+
+        data_dir, result = run_icloudpd_test(
+            self.assertEqual,
+            self.vcr_path,
+            base_dir,
+            "listing_photos.yml",
+            [],
+            files_to_download,
+            [
+                "--username",
+                "jdoe@gmail.com",
+                "--password",
+                "password1",
+                "--recent",
+                "1",
+                "--skip-videos",
+                "--skip-live-photos",
+                "--no-progress-bar",
+                "--content-store",
+                store_dir,
+            ],
+        )
+
+        assert result.exit_code == 0
+
+        store_files = glob.glob(os.path.join(store_dir, "**/*.*"), recursive=True)
+        self.assertEqual(len(store_files), 1, "Store file count")
+        self.assertTrue(store_files[0].endswith(".JPG"))
+        # linked folders share the stored file, so it must not be written to
+        self.assertFalse(os.stat(store_files[0]).st_mode & stat.S_IWUSR)
+        self.assertEqual(
+            os.stat(store_files[0]).st_ino,
+            os.stat(os.path.join(data_dir, os.path.normpath("2018/07/31/IMG_7409.JPG"))).st_ino,
+        )
+        self.assertIn("INFO     All photos have been downloaded", self._caplog.text)
+
+    def test_seal_stored_file_windows(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+        recreate_path(base_dir)
+        store_path = os.path.join(base_dir, "stored.JPG")
+        open(store_path, "a").close()
+
+        # Windows could not delete the file with --auto-delete any more
+        with mock.patch("os.name", "nt"):
+            self.assertTrue(download.seal_stored_file(logging.getLogger(__name__), store_path))
+        self.assertTrue(os.stat(store_path).st_mode & stat.S_IWUSR)
+
+        self.assertTrue(download.seal_stored_file(logging.getLogger(__name__), store_path))
+        self.assertFalse(os.stat(store_path).st_mode & stat.S_IWUSR)
@@ -794,8 +794,8 @@ class DownloadPhotoNameIDTestCase(TestCase):
 
             with mock.patch.object(PhotoAsset, "versions", new_callable=PropertyMock) as pa:
                 pa.return_value = {
-                    AssetVersionSize.ORIGINAL: {"filename": "IMG1.JPG"},
-                    AssetVersionSize.MEDIUM: {"filename": "IMG_1.JPG"},
+                    AssetVersionSize.ORIGINAL: AssetVersion("IMG1.JPG", 1, "https://a.b/o", "jpeg"),
+                    AssetVersionSize.MEDIUM: AssetVersion("IMG_1.JPG", 1, "https://a.b/m", "jpeg"),
                 }
 
                 data_dir, result = run_icloudpd_test(
@@ -1721,13 +1721,13 @@ class DownloadPhotoNameIDTestCase(TestCase):
         def raise_response_error(
             a0_: logging.Logger, a1_: PyiCloudService, a2_: PhotoAsset
         ) -> NoReturn:
-            raise Exception("Unexpected call to delete_photo")
+            raise Exception("Unexpected call to delete_photos")
 
         with mock.patch.object(piexif, "insert") as piexif_patched:
             piexif_patched.side_effect = InvalidImageDataError
             with mock.patch("icloudpd.exif_datetime.get_photo_exif") as get_exif_patched:
                 get_exif_patched.return_value = False
-                with mock.patch("icloudpd.base.delete_photo") as df_patched:
+                with mock.patch("icloudpd.base.delete_photos") as df_patched:
                     df_patched.side_effect = raise_response_error
 
                     data_dir, result = run_icloudpd_test(
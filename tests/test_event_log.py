@@ -0,0 +1,86 @@
+import inspect
+import json
+import logging
+import os
+from unittest import TestCase
+
+import pytest
+from icloudpd.event_log import EventLog
+
+from tests.helpers import path_from_project_root, recreate_path, run_icloudpd_test
+
+
+class EventLogTestCase(TestCase):
+    @pytest.fixture(autouse=True)
+    def inject_fixtures(self) -> None:
+        self.root_path = path_from_project_root(__file__)
+        self.fixtures_path = os.path.join(self.root_path, "fixtures")
+        self.vcr_path = os.path.join(self.root_path, "vcr_cassettes")
+
+    def test_events_appended_after_close(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+        recreate_path(base_dir)
+        log_path = os.path.join(base_dir, "events.jsonl")
+        event_log = EventLog()
+
+        # dropped, nothing is open
+        event_log.emit("deleted", path="a")
+        for run in range(2):
+            with event_log.recording(logging.getLogger(), log_path, run=run):
+                for index in range(3):
+                    event_log.emit("deleted", path=f"{run}/{index}")
+
+        with open(log_path, encoding="utf-8") as log_file:
+            events = [json.loads(line) for line in log_file]
+        self.assertEqual(
+            [(event["event"], event["run"], event["path"]) for event in events],
+            [("deleted", run, f"{run}/{index}") for run in range(2) for index in range(3)],
+        )
+        self.assertTrue(events[0]["time"].endswith("+00:00"))
+
+    def test_download_events(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+        log_path = os.path.join(base_dir, "events.jsonl")
+
+        data_dir, result = run_icloudpd_test(
+            self.assertEqual,
+            self.vcr_path,
+            base_dir,
+            "listing_photos.yml",
+            [("2018/07/30", "IMG_7408.JPG", 1151066), ("2018/07/30", "IMG_7407.JPG", 656257)],
+            [("2018/07/31", "IMG_7409.JPG")],
+            [
+                "--username",
+                "jdoe@gmail.com",
+                "--password",
+                "password1",
+                "--recent",
+                "5",
+                "--skip-videos",
+                "--skip-live-photos",
+                "--no-progress-bar",
+                "--event-log",
+                log_path,
+            ],
+        )
+        self.assertEqual(result.exit_code, 0)
+
+        with open(log_path, encoding="utf-8") as log_file:
+            events = [json.loads(line) for line in log_file]
+        self.assertEqual(
+            [(event["event"], event["filename"]) for event in events],
+            [
+                ("downloaded", "IMG_7409.JPG"),
+                ("skipped_existing", "IMG_7408.JPG"),
+                ("skipped_existing", "IMG_7407.JPG"),
+            ],
+        )
+        downloaded = events[0]
+        self.assertEqual(
+            downloaded["path"], os.path.join(data_dir, os.path.normpath("2018/07/31/IMG_7409.JPG"))
+        )
+        self.assertEqual(downloaded["size"], "original")
+        self.assertEqual(downloaded["bytes"], 1884695)
+        self.assertEqual(downloaded["retries"], 0)
+        self.assertFalse(downloaded["dry_run"])
+        self.assertGreaterEqual(downloaded["seconds"], 0)
@@ -60,3 +60,36 @@ class ListingAlbumsTestCase(TestCase):
         files_in_result = glob.glob(os.path.join(data_dir, "**/*.*"), recursive=True)
 
         assert sum(1 for _ in files_in_result) == 0
+
+    def test_unknown_album(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+        cookie_dir = os.path.join(base_dir, "cookie")
+        data_dir = os.path.join(base_dir, "data")
+
+        for dir in [base_dir, cookie_dir, data_dir]:
+            recreate_path(dir)
+
+        with vcr.use_cassette(os.path.join(self.vcr_path, "listing_albums.yml")):
+            # Pass fixed client ID via environment variable
+            runner = CliRunner(env={"CLIENT_ID": "DE309E26-942E-11E8-92F5-14109FE0B321"})
+            result = runner.invoke(
+                main,
+                [
+                    "--username",
+                    "jdoe@gmail.com",
+                    "--password",
+                    "password1",
+                    "--album",
+                    "doesnotexist",
+                    "--no-progress-bar",
+                    "-d",
+                    data_dir,
+                    "--cookie-directory",
+                    cookie_dir,
+                ],
+            )
+
+            print_result_exception(result)
+
+            self.assertIn("ERROR    Unknown album: doesnotexist", self._caplog.text)
+            assert result.exit_code == 1
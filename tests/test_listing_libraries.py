@@ -27,7 +27,7 @@ class ListingLibraryTestCase(TestCase):
         for dir in [base_dir, cookie_dir]:
             recreate_path(dir)
 
-        with vcr.use_cassette(os.path.join(self.vcr_path, "listing_albums.yml")):
+        with vcr.use_cassette(os.path.join(self.vcr_path, "listing_albums.yml")) as cass:
             # Pass fixed client ID via environment variable
             runner = CliRunner(env={"CLIENT_ID": "DE309E26-942E-11E8-92F5-14109FE0B321"})
             result = runner.invoke(
@@ -52,6 +52,14 @@ class ListingLibraryTestCase(TestCase):
 
             assert result.exit_code == 0
 
+            # listing does not check indexing state of the libraries
+            played = [
+                request.body
+                for index, request in enumerate(cass.requests)
+                if cass.play_counts[index] > 0
+            ]
+            self.assertFalse([body for body in played if body and b"CheckIndexingState" in body])
+
     def test_listing_library_error(self) -> None:
         base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
         cookie_dir = os.path.join(base_dir, "cookie")
@@ -256,10 +256,10 @@ Include a link to the Gist in your issue, so that we can see what went wrong.
                     mock_open.assert_called_once_with(
                         file="icloudpd-photo-error.json", mode="w", encoding="utf8"
                     )
-                    # Multiple JSON "dumps" occur with the new pyicloud 1.0.0 implementation
+                    # Session data is no longer dumped on every request, the photo record is last
                     # mock_json.assert_called_once()
                     # Check a few keys in the dict
-                    first_arg = mock_json.call_args_list[8][0][0]
+                    first_arg = mock_json.call_args_list[-1][0][0]
                     self.assertEqual(
                         first_arg["master_record"]["recordName"], "AY6c+BsE0jjaXx9tmVGJM1D2VcEO"
                     )
@@ -0,0 +1,166 @@
+import inspect
+import os
+from unittest import TestCase, mock
+
+import pytest
+from foundation.metrics import REGISTRY, Registry
+from icloudpd import download
+from icloudpd.base import EXISTENCE_CHECK_SECONDS, LAST_SUCCESSFUL_SYNC
+from pyicloud_ipd.services.photos import ASSETS_LISTED, PAGE_SECONDS, PhotoAsset
+from pyicloud_ipd.session import REQUEST_SECONDS
+
+from tests.helpers import path_from_project_root, run_icloudpd_test
+
+
+class MetricsTestCase(TestCase):
+    @pytest.fixture(autouse=True)
+    def inject_fixtures(self) -> None:
+        self.root_path = path_from_project_root(__file__)
+        self.fixtures_path = os.path.join(self.root_path, "fixtures")
+        self.vcr_path = os.path.join(self.root_path, "vcr_cassettes")
+
+    def test_histogram_exposition(self) -> None:
+        registry = Registry()
+        latency = registry.histogram("latency_seconds", "Latency", ["endpoint"], [0.1, 1])
+        latency.observe(0.05, 'a"b')
+        latency.observe(0.5, 'a"b')
+        latency.observe(5, 'a"b')
+        gauge = registry.gauge("depth", "Depth")
+        gauge.set(3)
+        gauge.dec()
+
+        self.assertEqual(
+            registry.exposition().splitlines(),
+            [
+                "# HELP depth Depth",
+                "# TYPE depth gauge",
+                "depth 2.0",
+                "# HELP latency_seconds Latency",
+                "# TYPE latency_seconds histogram",
+                'latency_seconds_bucket{endpoint="a\\"b",le="0.1"} 1.0',
+                'latency_seconds_bucket{endpoint="a\\"b",le="1.0"} 2.0',
+                'latency_seconds_bucket{endpoint="a\\"b",le="+Inf"} 3.0',
+                'latency_seconds_sum{endpoint="a\\"b"} 5.55',
+                'latency_seconds_count{endpoint="a\\"b"} 3.0',
+            ],
+        )
+        # registering again returns the same metric, a conflicting one is refused
+        self.assertIs(registry.gauge("depth", "Depth"), gauge)
+        with self.assertRaises(ValueError):
+            registry.counter("depth", "Depth")
+        with self.assertRaises(ValueError):
+            latency.observe(1)
+
+    def test_sync_updates_metrics(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+        endpoint = "p61-ckdatabasews.icloud.com/database/1/com.apple.photos.cloud/production/private/records/query"
+        before = (
+            ASSETS_LISTED.value(),
+            PAGE_SECONDS.count(),
+            REQUEST_SECONDS.count(endpoint),
+            EXISTENCE_CHECK_SECONDS.count(),
+            download.ASSETS_DOWNLOADED.value(),
+            download.BYTES_DOWNLOADED.value(),
+        )
+
+        _, result = run_icloudpd_test(
+            self.assertEqual,
+            self.vcr_path,
+            base_dir,
+            "listing_photos.yml",
+            [("2018/07/30", "IMG_7408.JPG", 1151066), ("2018/07/30", "IMG_7407.JPG", 656257)],
+            [("2018/07/31", "IMG_7409.JPG")],
+            [
+                "--username",
+                "jdoe@gmail.com",
+                "--password",
+                "password1",
+                "--recent",
+                "5",
+                "--skip-videos",
+                "--skip-live-photos",
+                "--no-progress-bar",
+            ],
+        )
+        self.assertEqual(result.exit_code, 0)
+
+        after = (
+            ASSETS_LISTED.value(),
+            PAGE_SECONDS.count(),
+            REQUEST_SECONDS.count(endpoint),
+            EXISTENCE_CHECK_SECONDS.count(),
+            download.ASSETS_DOWNLOADED.value(),
+            download.BYTES_DOWNLOADED.value(),
+        )
+        listed, pages, queries, checks, downloaded, written = (
+            later - earlier for later, earlier in zip(after, before)
+        )
+        self.assertGreaterEqual(listed, 5)
+        self.assertGreaterEqual(pages, 1)
+        self.assertGreaterEqual(queries, pages)
+        # three photos are checked, the two videos are skipped first
+        self.assertEqual(checks, 3)
+        self.assertEqual(downloaded, 1)
+        self.assertGreater(written, 0)
+        self.assertGreater(LAST_SUCCESSFUL_SYNC.value(), 0)
+
+        exposition = REGISTRY.exposition()
+        self.assertIn("# TYPE icloud_request_duration_seconds histogram", exposition)
+        self.assertIn("icloudpd_downloads_in_flight 0.0", exposition)
+
+    def test_failed_download_is_no_successful_sync(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+        LAST_SUCCESSFUL_SYNC.set(0)
+        failures_before = download.FAILURES.value()
+
+        with mock.patch.object(PhotoAsset, "download") as pa_download, mock.patch(
+            "icloudpd.constants.WAIT_SECONDS", 0
+        ):
+            pa_download.side_effect = ConnectionError("Connection Error")
+            _, result = run_icloudpd_test(
+                self.assertEqual,
+                self.vcr_path,
+                base_dir,
+                "listing_photos.yml",
+                [],
+                [],
+                [
+                    "--username",
+                    "jdoe@gmail.com",
+                    "--password",
+                    "password1",
+                    "--recent",
+                    "1",
+                    "--skip-videos",
+                    "--skip-live-photos",
+                    "--no-progress-bar",
+                ],
+            )
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(download.FAILURES.value(), failures_before + 1)
+        self.assertEqual(LAST_SUCCESSFUL_SYNC.value(), 0)
+
+    def test_web_ui_without_webui_mfa(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+
+        with mock.patch("icloudpd.server.serve_app") as serve_app:
+            _, result = run_icloudpd_test(
+                self.assertEqual,
+                self.vcr_path,
+                base_dir,
+                "listing_photos.yml",
+                [],
+                [],
+                [
+                    "--username",
+                    "jdoe@gmail.com",
+                    "--password",
+                    "password1",
+                    "--auth-only",
+                    "--no-progress-bar",
+                    "--web-ui",
+                ],
+            )
+        self.assertEqual(result.exit_code, 0)
+        # /metrics is served with console MFA too
+        serve_app.assert_called_once()
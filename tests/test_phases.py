@@ -0,0 +1,84 @@
+import inspect
+import json
+import os
+from unittest import TestCase
+
+import pytest
+from foundation.phases import PHASE_SECONDS, phase, phase_stats, snapshot
+
+from tests.helpers import path_from_project_root, run_icloudpd_test
+
+
+class PhasesTestCase(TestCase):
+    @pytest.fixture(autouse=True)
+    def inject_fixtures(self, caplog: pytest.LogCaptureFixture) -> None:
+        self._caplog = caplog
+        self.root_path = path_from_project_root(__file__)
+        self.fixtures_path = os.path.join(self.root_path, "fixtures")
+        self.vcr_path = os.path.join(self.root_path, "vcr_cassettes")
+
+    def test_phase_stats_since_snapshot(self) -> None:
+        with phase("test_before"):
+            pass
+        since = snapshot()
+        for _ in range(19):
+            PHASE_SECONDS.observe(0.002, "test_phase")
+        PHASE_SECONDS.observe(20, "test_phase")
+        with self.assertRaises(ValueError), phase("test_failing"):
+            raise ValueError()
+
+        stats = {entry.phase: entry for entry in phase_stats(since)}
+        self.assertNotIn("test_before", stats)
+        self.assertEqual(stats["test_failing"].calls, 1)
+        self.assertEqual(stats["test_phase"].calls, 20)
+        self.assertAlmostEqual(stats["test_phase"].total, 20.038)
+        self.assertAlmostEqual(stats["test_phase"].mean, 1.0019)
+        # the 19th of 20 observations lies in the (0.001, 0.0025] bucket
+        self.assertTrue(0.001 < stats["test_phase"].p95 <= 0.0025)
+
+    def test_timing_report(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+        report_path = os.path.join(base_dir, "timing.json")
+
+        _, result = run_icloudpd_test(
+            self.assertEqual,
+            self.vcr_path,
+            base_dir,
+            "listing_photos.yml",
+            [("2018/07/30", "IMG_7408.JPG", 1151066), ("2018/07/30", "IMG_7407.JPG", 656257)],
+            [("2018/07/31", "IMG_7409.JPG")],
+            [
+                "--username",
+                "jdoe@gmail.com",
+                "--password",
+                "password1",
+                "--recent",
+                "5",
+                "--skip-videos",
+                "--skip-live-photos",
+                "--set-exif-datetime",
+                "--no-progress-bar",
+                "--timing-report",
+                report_path,
+            ],
+        )
+        self.assertEqual(result.exit_code, 0)
+
+        with open(report_path, encoding="utf-8") as report_file:
+            report = json.load(report_file)
+        phases = {entry["phase"]: entry for entry in report["phases"]}
+        for name in [
+            "authenticate",
+            "list_page",
+            "list_parse",
+            "json_decode",
+            "existence_check",
+            "transfer",
+            "exif",
+            "set_utime",
+        ]:
+            self.assertIn(name, phases)
+        self.assertEqual(phases["existence_check"]["count"], 3)
+        self.assertEqual(phases["transfer"]["count"], 1)
+        self.assertGreater(report["wall_seconds"], 0)
+        self.assertIn("Time per phase in", self._caplog.text)
@@ -0,0 +1,128 @@
+import inspect
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from typing import Callable, Optional
+from unittest import TestCase
+
+import pytest
+from icloudpd.profiling import StackSampler, collapse_stack, profiled, write_profile
+
+from tests.helpers import path_from_project_root, recreate_path, run_icloudpd_test
+
+
+def sampler_thread() -> Optional[threading.Thread]:
+    return next(
+        (thread for thread in threading.enumerate() if thread.name == "profile-sampler"), None
+    )
+
+
+def waited(condition: Callable[[], bool], seconds: float = 10) -> bool:
+    """Whether `condition` became true within `seconds`; a busy machine only makes it slower"""
+    deadline = time.monotonic() + seconds
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class ProfilingTestCase(TestCase):
+    @pytest.fixture(autouse=True)
+    def inject_fixtures(self) -> None:
+        self.root_path = path_from_project_root(__file__)
+        self.fixtures_path = os.path.join(self.root_path, "fixtures")
+        self.vcr_path = os.path.join(self.root_path, "vcr_cassettes")
+
+    def test_collapse_stack(self) -> None:
+        stack = collapse_stack(sys._getframe())
+        self.assertTrue(stack.endswith(";tests.test_profiling:test_collapse_stack"))
+        self.assertNotIn(" ", stack)
+
+    def test_sampler_stops_at_time_limit(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+        recreate_path(base_dir)
+        profile_path = os.path.join(base_dir, "profile.txt")
+
+        with profiled(logging.getLogger(), profile_path, "collapsed", None, 0.05):
+            sampler = sampler_thread()
+            if sampler is not None:
+                sampler.join(10)
+            # stopped while the block runs on
+            self.assertIsNone(sampler_thread())
+        self.assertTrue(os.path.exists(profile_path))
+
+    def test_sampler_counts_identical_stacks(self) -> None:
+        release = threading.Event()
+        parked = threading.Thread(target=release.wait)
+        parked.start()
+        sampler = StackSampler(parked.ident or 0, 0.001)
+        sampler.start()
+        try:
+            # once parked, the thread is always in the same place
+            self.assertTrue(waited(lambda: max(dict(sampler.stacks).values(), default=0) >= 3))
+        finally:
+            sampler.stop()
+            release.set()
+            parked.join()
+        self.assertGreater(sum(sampler.stacks.values()), len(sampler.stacks))
+
+    def test_write_profile_while_profiling(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+        recreate_path(base_dir)
+        profile_path = os.path.join(base_dir, "run.prof")
+
+        with profiled(logging.getLogger(), profile_path, "pstats", None, None):
+            collapse_stack(sys._getframe())
+            write_profile()
+            functions = {name for _, _, name in pstats.Stats(profile_path).stats}  # type: ignore[attr-defined]
+            self.assertIn("collapse_stack", functions)
+            self.assertNotIn("waited", functions)
+            # profiling goes on after the write
+            waited(lambda: True)
+        self.assertEqual(os.listdir(base_dir), ["run.prof"])
+        functions = {name for _, _, name in pstats.Stats(profile_path).stats}  # type: ignore[attr-defined]
+        self.assertIn("waited", functions)
+
+    def test_profile_run(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+        profile_path = os.path.join(base_dir, "run.prof")
+        memory_path = os.path.join(base_dir, "memory.txt")
+
+        _, result = run_icloudpd_test(
+            self.assertEqual,
+            self.vcr_path,
+            base_dir,
+            "listing_photos.yml",
+            [("2018/07/30", "IMG_7408.JPG", 1151066), ("2018/07/30", "IMG_7407.JPG", 656257)],
+            [("2018/07/31", "IMG_7409.JPG")],
+            [
+                "--username",
+                "jdoe@gmail.com",
+                "--password",
+                "password1",
+                "--recent",
+                "5",
+                "--skip-videos",
+                "--skip-live-photos",
+                "--no-progress-bar",
+                "--profile",
+                profile_path,
+                "--profile-memory",
+                memory_path,
+            ],
+        )
+        self.assertEqual(result.exit_code, 0)
+
+        functions = {name for _, _, name in pstats.Stats(profile_path).stats}  # type: ignore[attr-defined]
+        self.assertIn("core", functions)
+        self.assertIn("download_media", functions)
+
+        with open(memory_path, encoding="utf-8") as memory_file:
+            lines = memory_file.read().splitlines()
+        self.assertTrue(lines[0].startswith("Peak traced memory"))
+        self.assertGreater(len(lines), 1)
+        self.assertIn(" KiB ", lines[1])
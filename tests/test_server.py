@@ -0,0 +1,162 @@
+import http.client
+import json
+import logging
+import threading
+from itertools import islice
+from typing import Any, Dict, List
+from unittest import TestCase, mock
+
+from icloudpd.config import Config
+from icloudpd.server import make_app, make_server, progress_events
+from icloudpd.status import Status, StatusExchange
+from waitress.server import BaseWSGIServer
+
+
+def stream_data(events: List[str]) -> List[Dict[str, Any]]:
+    return [json.loads(event.split("data: ", 1)[1]) for event in events if event.startswith("id: ")]
+
+
+class ServerTestCase(TestCase):
+    def setUp(self) -> None:
+        self.status_exchange = StatusExchange()
+        self.status_exchange.set_config(mock.create_autospec(Config, instance=True))
+        app = make_app(logging.getLogger("test"), self.status_exchange)
+        self.client = app.test_client()
+
+    def test_status_json_uses_etag(self) -> None:
+        progress = self.status_exchange.get_progress()
+        progress.photos_count = 4
+        progress.photos_counter = 1
+        progress.current_file = "IMG_0001.JPG"
+
+        first = self.client.get("/status.json")
+        self.assertEqual(first.status_code, 200)
+        body = first.get_json()
+        self.assertEqual(body["status"], "no_input_needed")
+        self.assertEqual(body["progress"]["photos_percent"], 25)
+        self.assertEqual(body["progress"]["current_file"], "IMG_0001.JPG")
+        etag = first.headers["ETag"]
+
+        unchanged = self.client.get("/status.json", headers={"If-None-Match": etag})
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertEqual(unchanged.data, b"")
+
+        progress.photos_counter = 2
+        changed = self.client.get("/status.json", headers={"If-None-Match": etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers["ETag"], etag)
+
+        # the HTML status follows the same version
+        page = self.client.get("/status")
+        self.assertIn(b'data-field="photos_counter">2<', page.data)
+        self.assertIn(b'data-field="photos_count">4<', page.data)
+        # updated from /progress/stream, not by polling
+        self.assertNotIn(b"hx-trigger", page.data)
+        self.assertEqual(
+            self.client.get("/status", headers={"If-None-Match": page.headers["ETag"]}).status_code,
+            304,
+        )
+
+    def test_status_reports_accounts(self) -> None:
+        # as served by the daemon: account state, no run config
+        status_exchange = StatusExchange()
+        status_exchange.update_account("alice", running=True, runs=0, last_exit=None)
+        status_exchange.update_account("bob", running=False, runs=2, last_exit=1, duration=3.5)
+        client = make_app(logging.getLogger("test"), status_exchange).test_client()
+
+        body = client.get("/status.json").get_json()
+        self.assertEqual(body["accounts"]["alice"], {"running": True, "runs": 0, "last_exit": None})
+        self.assertEqual(body["accounts"]["bob"]["last_exit"], 1)
+
+        page = client.get("/status")
+        self.assertEqual(page.status_code, 200)
+        self.assertIn(b"Syncing", page.data)
+        self.assertIn(b"Failed (exit code 1)", page.data)
+
+    def test_progress_stream_sends_deltas(self) -> None:
+        progress = self.status_exchange.get_progress()
+        progress.photos_count = 2
+
+        with mock.patch("icloudpd.constants.PROGRESS_STREAM_INTERVAL_SECONDS", 0):
+            events = progress_events(self.status_exchange)
+            first = stream_data(list(islice(events, 1)))
+            progress.photos_counter = 1
+            progress.current_file = "IMG_0002.JPG"
+            second = stream_data(list(islice(events, 1)))
+            self.assertTrue(
+                self.status_exchange.replace_status(Status.NO_INPUT_NEEDED, Status.NEED_MFA)
+            )
+            third = stream_data(list(islice(events, 1)))
+            self.status_exchange.update_account("alice", running=True)
+            fourth = stream_data(list(islice(events, 1)))
+
+        self.assertEqual(first[0]["photos_count"], 2)
+        self.assertEqual(first[0]["status"], "no_input_needed")
+        self.assertEqual(first[0]["accounts"], {})
+        self.assertEqual(
+            {key: second[0][key] for key in ["photos_counter", "photos_percent", "current_file"]},
+            {"photos_counter": 1, "photos_percent": 50, "current_file": "IMG_0002.JPG"},
+        )
+        self.assertNotIn("photos_count", second[0])
+        self.assertEqual(third[0]["status"], "need_mfa")
+        # the page renders /status again for these
+        self.assertEqual(fourth[0], {"accounts": {"alice": {"running": True}}})
+
+        response = self.client.get("/progress/stream")
+        self.assertEqual(response.mimetype, "text/event-stream")
+        response.close()
+
+    def test_progress_stream_ends(self) -> None:
+        with mock.patch("icloudpd.constants.PROGRESS_STREAM_MAX_SECONDS", 0), mock.patch(
+            "icloudpd.constants.PROGRESS_STREAM_INTERVAL_SECONDS", 0
+        ):
+            events = list(progress_events(self.status_exchange))
+
+        # all fields once, then the browser has to reconnect
+        self.assertEqual(len(stream_data(events)), 1)
+
+    def test_open_streams_do_not_block_code(self) -> None:
+        server = make_server(logging.getLogger("test"), self.status_exchange, "127.0.0.1", 0)
+        assert isinstance(server, BaseWSGIServer)
+        port = int(server.getsockname()[1])
+        stopped = threading.Event()
+
+        def serve() -> None:
+            # server.run() cannot be stopped from another thread
+            while not stopped.is_set():
+                server.asyncore.loop(timeout=0.05, map=server._map, count=1)  # type: ignore[attr-defined]
+
+        serving = threading.Thread(target=serve, daemon=True)
+        serving.start()
+        # the responses own the connections, a stream ends when its response is collected
+        streams: List[http.client.HTTPResponse] = []
+        with mock.patch("icloudpd.constants.PROGRESS_STREAM_KEEPALIVE_SECONDS", 0.1):
+            try:
+                # as many as waitress has threads by default
+                for _ in range(4):
+                    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+                    connection.request("GET", "/progress/stream")
+                    streams.append(connection.getresponse())
+                    self.assertTrue(streams[-1].readline().startswith(b"id: "))
+                self.assertTrue(
+                    self.status_exchange.replace_status(Status.NO_INPUT_NEEDED, Status.NEED_MFA)
+                )
+
+                form = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+                form.request(
+                    "POST",
+                    "/code",
+                    "code=654321",
+                    {"Content-Type": "application/x-www-form-urlencoded"},
+                )
+                self.assertEqual(form.getresponse().status, 200)
+                form.close()
+                self.assertEqual(self.status_exchange.get_payload(), "654321")
+            finally:
+                for stream in streams:
+                    stream.close()
+                # streams notice their closed connection at the next keep-alive
+                server.task_dispatcher.shutdown()
+                stopped.set()
+                serving.join(5)
+                server.close()
@@ -0,0 +1,166 @@
+import http.cookiejar as cookielib
+import http.server
+import inspect
+import os
+import socket
+import threading
+from typing import Any, Dict
+from unittest import TestCase, mock
+
+from pyicloud_ipd import session
+from pyicloud_ipd.session import PyiCloudPasswordFilter, PyiCloudSession
+from requests import PreparedRequest, Response
+from requests.adapters import BaseAdapter, HTTPAdapter
+
+from tests.helpers import path_from_project_root, recreate_path
+
+
+class CannedAdapter(BaseAdapter):
+    def __init__(self, body: bytes) -> None:
+        super().__init__()
+        self.body = body
+
+    def send(self, request: PreparedRequest, **_kwargs: Any) -> Response:  # type: ignore[override]
+        response = Response()
+        response.status_code = 200
+        response.headers["Content-Type"] = "application/json"
+        response._content = self.body
+        response.url = request.url or ""
+        response.request = request
+        return response
+
+    def close(self) -> None:
+        pass
+
+
+class Service:
+    def __init__(self, directory: str) -> None:
+        self.password_filter = PyiCloudPasswordFilter("password1")
+        self.session_data: Dict[str, Any] = {}
+        self.session_path = os.path.join(directory, "session")
+        self.cookiejar_path = os.path.join(directory, "cookies")
+        self.requires_2sa = False
+
+
+class SessionTestCase(TestCase):
+    def setUp(self) -> None:
+        self.fixtures_path = os.path.join(path_from_project_root(__file__), "fixtures")
+
+    def build_session(self, directory: str, body: bytes, save_delay: float) -> PyiCloudSession:
+        recreate_path(directory)
+        service = Service(directory)
+        result = PyiCloudSession(service, save_delay)
+        result.cookies = cookielib.LWPCookieJar(filename=service.cookiejar_path)  # type: ignore[assignment]
+        result.mount("https://", CannedAdapter(body))
+        return result
+
+    def test_json_decoded_once(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+        icloud_session = self.build_session(base_dir, b'{"success": true, "items": [1]}', 0)
+
+        with mock.patch.object(session, "decode_json", wraps=session.decode_json) as decode_json:
+            response = icloud_session.get("https://example.com/items")
+            self.assertEqual(response.json(), {"success": True, "items": [1]})
+            self.assertIs(response.json(), response.json())
+            decode_json.assert_called_once()
+
+    def test_session_saved_only_when_changed(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+        icloud_session = self.build_session(base_dir, b'{"success": true}', 3600)
+
+        icloud_session.get("https://example.com/items")
+        # changes wait for the save delay
+        self.assertFalse(os.path.exists(icloud_session.service.session_path))
+
+        icloud_session.flush()
+        self.assertTrue(os.path.exists(icloud_session.service.session_path))
+        self.assertTrue(os.path.exists(icloud_session.service.cookiejar_path))
+        modified = os.stat(icloud_session.service.session_path).st_mtime_ns
+
+        os.remove(icloud_session.service.session_path)
+        icloud_session.get("https://example.com/items")
+        icloud_session.flush()
+        # nothing changed, nothing written
+        self.assertFalse(os.path.exists(icloud_session.service.session_path))
+
+        icloud_session.service.session_data["session_token"] = "token"
+        icloud_session.flush()
+        self.assertNotEqual(os.stat(icloud_session.service.session_path).st_mtime_ns, modified)
+        self.assertEqual(sorted(os.listdir(base_dir)), ["cookies", "session"])
+
+    def test_warm_up_connects_once_per_host(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+        icloud_session = self.build_session(base_dir, b"{}", 0)
+        icloud_session.mount("http://", HTTPAdapter())
+
+        with socket.socket() as listener:
+            listener.bind(("127.0.0.1", 0))
+            listener.listen(2)
+            listener.settimeout(5)
+            port = listener.getsockname()[1]
+            url = f"http://127.0.0.1:{port}"
+
+            icloud_session.warm_up([f"{url}/a", f"{url}/b"])
+            icloud_session.join_warm_ups()
+
+            accepted, _ = listener.accept()
+            accepted.close()
+            pool = icloud_session.get_adapter(url).get_connection(url)  # type: ignore[attr-defined]
+            self.assertEqual(pool.num_connections, 1)
+
+    def test_request_reuses_warmed_up_connection(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+        icloud_session = self.build_session(base_dir, b"{}", 0)
+        icloud_session.mount("http://", HTTPAdapter())
+        clients = []
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:  # noqa: N802
+                clients.append(self.client_address)
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *_args: Any) -> None:
+                pass
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        serving = threading.Thread(target=server.serve_forever, daemon=True)
+        serving.start()
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}"
+            icloud_session.warm_up([f"{url}/a"])
+            icloud_session.join_warm_ups()
+            icloud_session.get(f"{url}/a")
+            icloud_session.get(f"{url}/b")
+            pool = icloud_session.get_adapter(url).get_connection(url)  # type: ignore[attr-defined]
+        finally:
+            icloud_session.close()
+            server.shutdown()
+            server.server_close()
+
+        # both requests went over the connection opened ahead of use
+        self.assertEqual(len(clients), 2)
+        self.assertEqual(len(set(clients)), 1)
+        self.assertEqual(pool.num_connections, 1)
+
+    def test_request_does_not_wait_for_warm_up(self) -> None:
+        base_dir = os.path.join(self.fixtures_path, inspect.stack()[0][3])
+        icloud_session = self.build_session(base_dir, b"{}", 0)
+        connecting = threading.Event()
+        events = []
+
+        def slow_connect(_host: str, _url: str) -> None:
+            connecting.wait(5)
+            events.append("connected")
+
+        with mock.patch.object(icloud_session, "_connect", side_effect=slow_connect):
+            icloud_session.warm_up(["https://cvws.icloud-content.com/a"])
+            icloud_session.get("https://example.com/items")
+            events.append("requested")
+            connecting.set()
+            icloud_session.join_warm_ups()
+
+        self.assertEqual(events, ["requested", "connected"])
@@ -0,0 +1,125 @@
+import logging
+import threading
+import time
+from typing import List, Optional
+from unittest import TestCase, mock
+
+from icloudpd.base import get_password_from_webui
+from icloudpd.progress import TransferProgress, TransferSnapshot
+from icloudpd.status import Status, StatusExchange
+
+
+class StatusExchangeTestCase(TestCase):
+    def test_password_wait_ends_on_submission(self) -> None:
+        status_exchange = StatusExchange()
+        passwords: List[Optional[str]] = []
+        waiting = threading.Thread(
+            target=lambda: passwords.append(
+                get_password_from_webui(logging.getLogger("test"), status_exchange)("jdoe")
+            )
+        )
+        waiting.start()
+        self.assertEqual(
+            status_exchange.wait_for_status_change(Status.NO_INPUT_NEEDED, 5), Status.NEED_PASSWORD
+        )
+
+        submitted = time.monotonic()
+        self.assertTrue(status_exchange.set_payload("password1"))
+        waiting.join(5)
+
+        self.assertEqual(passwords, ["password1"])
+        self.assertEqual(status_exchange.get_status(), Status.CHECKING_PASSWORD)
+        # woken by the submission, not by the next poll
+        self.assertLess(time.monotonic() - submitted, 0.5)
+
+    def test_wait_for_status_change_times_out(self) -> None:
+        status_exchange = StatusExchange()
+        self.assertEqual(
+            status_exchange.wait_for_status_change(Status.NO_INPUT_NEEDED, 0.01),
+            Status.NO_INPUT_NEEDED,
+        )
+
+    def test_resume_wakes_waiting_thread(self) -> None:
+        progress = StatusExchange().get_progress()
+        self.assertFalse(progress.wait_for_resume(0.01))
+
+        timer = threading.Timer(0.05, lambda: setattr(progress, "resume", True))
+        started = time.monotonic()
+        timer.start()
+        self.assertTrue(progress.wait_for_resume(5))
+        self.assertLess(time.monotonic() - started, 1)
+
+        progress.reset()
+        self.assertFalse(progress.resume)
+        self.assertFalse(progress.cancel)
+
+    def test_waiting_is_published_once_as_deadline(self) -> None:
+        status_exchange = StatusExchange()
+        progress = status_exchange.get_progress()
+        clock = [1000.0]
+        with mock.patch("icloudpd.progress.time.time", lambda: clock[0]):
+            progress.waiting = 3700
+            version = status_exchange.version
+            self.assertEqual(status_exchange.snapshot()["progress"]["waiting_until"], 4700.0)
+
+            # the time left is computed, nothing is published while time passes
+            clock[0] += 100
+            snapshot = status_exchange.snapshot()["progress"]
+            self.assertEqual(snapshot["waiting"], 3600)
+            self.assertEqual(snapshot["waiting_readable"], "1:00:00")
+            self.assertEqual(status_exchange.version, version)
+
+            clock[0] += 3600
+            self.assertEqual(progress.waiting, 0)
+            self.assertEqual(progress.waiting_readable, "")
+
+    def test_transfer_estimates_remaining_bytes(self) -> None:
+        clock = [100.0]
+        snapshots: List[TransferSnapshot] = []
+        with mock.patch("icloudpd.progress.time.monotonic", lambda: clock[0]):
+            transfer = TransferProgress(window=10, notify_interval=1)
+            transfer.start(4)
+            transfer.listener = snapshots.append
+            self.assertEqual(transfer.snapshot(), TransferSnapshot(0, 0, 0.0, None))
+
+            # a 4 MB video, then an existing file
+            transfer.plan(4_000_000)
+            for _ in range(4):
+                clock[0] += 1
+                transfer.add(1_000_000)
+            transfer.asset_done()
+            transfer.asset_done()
+            transfer.notify()
+            # 2 MB planned per asset seen, for two more assets
+            self.assertEqual(transfer.snapshot(), TransferSnapshot(4_000_000, 4_000_000, 1e6, 4))
+            self.assertEqual(len(snapshots), 5)
+
+            # rate covers the window only
+            clock[0] += 30
+            self.assertEqual(transfer.snapshot().bytes_per_second, 0)
+            self.assertIsNone(transfer.snapshot().eta_seconds)
+
+        progress = StatusExchange().get_progress()
+        progress.transfer = snapshots[-1]
+        self.assertEqual(progress.snapshot()["bytes_remaining"], 4_000_000)
+        self.assertEqual(progress.snapshot()["eta_seconds"], 4)
+
+    def test_transfer_takes_back_failed_downloads(self) -> None:
+        clock = [100.0]
+        with mock.patch("icloudpd.progress.time.monotonic", lambda: clock[0]):
+            transfer = TransferProgress(window=10, notify_interval=1)
+            transfer.start(None)
+            transfer.plan(3_000_000)
+            transfer.plan(1_000_000)
+
+            # the first download broke off after 2 MB and was retried in full
+            clock[0] += 1
+            transfer.add(2_000_000)
+            transfer.undo(2_000_000)
+            clock[0] += 1
+            transfer.add(3_000_000)
+            # the second was given up
+            transfer.unplan(1_000_000)
+
+            # the rate still counts the bytes of the failed attempt
+            self.assertEqual(transfer.snapshot(), TransferSnapshot(3_000_000, 0, 2.5e6, 0))
@@ -0,0 +1,55 @@
+import json
+from typing import Any, Dict, List, Tuple
+from unittest import TestCase, mock
+
+from pyicloud_ipd.services.photos import PhotoAlbum, PhotoLibrary
+
+
+def count_response(count: int) -> Dict[str, Any]:
+    return {"batch": [{"records": [{"fields": {"itemCount": {"value": count}}}]}]}
+
+
+def records_response(tags: List[str]) -> Dict[str, Any]:
+    return {
+        "records": [
+            {"recordName": f"record{index}", "recordChangeTag": tag}
+            for index, tag in enumerate(tags)
+        ]
+    }
+
+
+class WatchProbeTestCase(TestCase):
+    def build_album(self, responses: List[Dict[str, Any]]) -> Tuple[PhotoAlbum, mock.MagicMock]:
+        service = mock.MagicMock()
+        service._service_endpoint = "https://example.com/database"
+        service.params = {"dsid": "1"}
+        service.session.post.side_effect = [
+            mock.Mock(**{"json.return_value": response}) for response in responses
+        ]
+        props = PhotoLibrary.SMART_FOLDERS["All Photos"]
+        return (PhotoAlbum(service, "All Photos", **props), service.session.post)  # type: ignore[arg-type]
+
+    def test_change_probe_signature(self) -> None:
+        album, session_post = self.build_album(
+            [
+                count_response(3),
+                records_response(["a", "b"]),
+                count_response(3),
+                records_response(["a", "b"]),
+                count_response(3),
+                records_response(["a", "c"]),
+            ]
+        )
+
+        first = album.change_probe(1)
+        self.assertEqual(first, (3, [("record0", "a"), ("record1", "b")]))
+        self.assertEqual(album.change_probe(1), first)
+        # an edit to a recent asset changes its tag
+        self.assertNotEqual(album.change_probe(1), first)
+        # the refreshed count is used for the listing
+        self.assertEqual(len(album), 3)
+
+        self.assertEqual(session_post.call_count, 6)
+        query = json.loads(session_post.call_args_list[1].kwargs["data"])
+        self.assertEqual(query["resultsLimit"], 2)
+        self.assertIn("recordChangeTag", query["desiredKeys"])